@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Запуск (нужны пакеты uvicorn и uvicorn-worker):
+    uvicorn DjangoProject1.asgi:application --host 0.0.0.0 --port 8000
+    gunicorn DjangoProject1.asgi:application -k uvicorn_worker.UvicornWorker
+Отчеты и чеки (асинхронные представления) в одном процессе обслуживаются
+параллельно, пока запросы ждут БД; PDF формируется в пуле потоков
+(PDF_RENDER_THREADS). Сравнение с WSGI: python manage.py bench_async_views
 """
 
 import os
@@ -12,5 +19,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject1.settings')
+# Под ASGI запросы обращаются к БД из разных потоков, и постоянные соединения
+# копились бы по одному на поток: соединение закрывается после запроса,
+# для повторного использования соединений - пул (DB_POOL=1)
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
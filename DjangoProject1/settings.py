@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 from urllib.parse import urlparse, parse_qsl
 from pathlib import Path
@@ -52,22 +54,55 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounting.request_timing.RequestTimingMiddleware',  # Server-Timing и статистика запросов
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # Добавляем поддержку языков
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'accounting.static_files.StaticFilesMiddleware',  # WhiteNoise, в т.ч. под ASGI
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounting.db_routing.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'DjangoProject1.urls'
 
+# Замер времени запросов (accounting/request_timing.py): заголовок Server-Timing,
+# строка журнала на каждый запрос и страница performance/ с процентилями
+# за последние REQUEST_TIMING_WINDOW секунд
+REQUEST_TIMING = os.getenv('REQUEST_TIMING', '1').lower() in ('1', 'true', 'yes')
+REQUEST_TIMING_WINDOW = int(os.getenv('REQUEST_TIMING_WINDOW', 15 * 60))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Журнал приложения: ошибки фоновых потоков (синхронизация с центральной БД и т.п.)
+        'accounting': {
+            'handlers': ['console'],
+            'level': os.getenv('ACCOUNTING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'accounting.request_timing': {
+            'handlers': ['console'],
+            # WARNING - без строки на каждый запрос
+            'level': os.getenv('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки (accounting/request_timing.py)
+        'BACKEND': 'accounting.request_timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -87,17 +122,141 @@ WSGI_APPLICATION = 'DjangoProject1.wsgi.application'
 
 
 SECRET_KEY = os.getenv('SECRET_KEY')
-tmpPostgres = urlparse(os.getenv("DATABASE_URL"))
-DATABASES = {
-    'default': {
+
+
+def _postgres_from_url(url):
+    tmpPostgres = urlparse(url)
+    return {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': tmpPostgres.path.replace('/', ''),
         'USER': tmpPostgres.username,
         'PASSWORD': tmpPostgres.password,
         'HOST': tmpPostgres.hostname,
-        'PORT': 5432,
+        'PORT': tmpPostgres.port or 5432,
         'OPTIONS': dict(parse_qsl(tmpPostgres.query)),
     }
+
+
+def _sqlite_database(path):
+    # WAL: чтение не ждет записи, а запись - только дописывание в журнал;
+    # synchronous=NORMAL в режиме WAL не теряет согласованность при сбое питания.
+    # IMMEDIATE: транзакция сразу берет блокировку записи, а не падает с
+    # "database is locked" при попытке записи после чтения.
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+
+
+def _database_from_url(url):
+    """postgresql://... или sqlite:///путь (для проверки синхронизации на двух локальных базах)"""
+    if url.startswith('sqlite:'):
+        # sqlite:///name.sqlite3 - относительный путь, sqlite:////tmp/name.sqlite3 - абсолютный
+        return _sqlite_database(urlparse(url).path[1:])
+    return _postgres_from_url(url)
+
+
+# Локальная база настольной версии (run_app.py): FLEKS_LOCAL_DB - путь к файлу SQLite
+# или 1 (файл в папке FleksControlPanel домашнего каталога). Операции проводятся
+# в локальной базе и без интернета, а DATABASE_URL становится центральной БД ('central'),
+# куда фоновый поток отправляет их пачками (accounting/sync.py).
+FLEKS_LOCAL_DB = os.getenv('FLEKS_LOCAL_DB', '')
+if FLEKS_LOCAL_DB.lower() in ('1', 'true', 'yes'):
+    FLEKS_LOCAL_DB = str(Path.home() / 'FleksControlPanel' / 'fleks_local.sqlite3')
+
+if FLEKS_LOCAL_DB:
+    Path(FLEKS_LOCAL_DB).parent.mkdir(parents=True, exist_ok=True)
+    DATABASES = {
+        'default': _sqlite_database(FLEKS_LOCAL_DB),
+    }
+    if os.getenv('DATABASE_URL'):
+        DATABASES['central'] = _database_from_url(os.getenv('DATABASE_URL'))
+        if DATABASES['central']['ENGINE'] == 'django.db.backends.postgresql':
+            # Без интернета проверка связи не должна висеть минутами
+            DATABASES['central']['OPTIONS'].setdefault('connect_timeout', 5)
+else:
+    DATABASES = {
+        'default': _postgres_from_url(os.getenv("DATABASE_URL")),
+    }
+
+# Как часто (секунд) фоновый поток отправляет операции в центральную БД и сколько за раз
+LEDGER_SYNC_INTERVAL = int(os.getenv('LEDGER_SYNC_INTERVAL', '60'))
+LEDGER_SYNC_BATCH_SIZE = int(os.getenv('LEDGER_SYNC_BATCH_SIZE', '100'))
+
+# Реплика только для чтения (необязательно). Представления, помеченные
+# @replica_reads (accounting/db_routing.py), читают с нее; после записи
+# браузер сотрудника DATABASE_REPLICA_PIN_SECONDS секунд читает с основной БД.
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = {
+        **_postgres_from_url(os.getenv('DATABASE_REPLICA_URL')),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['accounting.db_routing.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '10'))
+
+# Повторное использование соединений с БД. Без него каждый запрос заново открывает
+# TLS-соединение с Postgres, что часто занимает большую часть времени ответа.
+# DB_CONN_MAX_AGE - сколько секунд держать соединение (0 - закрывать после запроса);
+# перед повторным использованием соединение проверяется (CONN_HEALTH_CHECKS).
+# DB_POOL=1 - вместо этого пул соединений psycopg 3 (нужен пакет "psycopg[pool]"):
+# размер пула DB_POOL_MIN_SIZE..DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT - сколько секунд
+# ждать свободного соединения.
+def _configure_connections(database):
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        return
+    if os.getenv('DB_POOL', '').lower() in ('1', 'true', 'yes'):
+        # Пул есть только у драйвера psycopg 3 (в requirements.txt - psycopg2): без него
+        # запуск прерывается сразу, а не ошибкой при первом запросе к БД
+        try:
+            import psycopg  # noqa: F401
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured(
+                'DB_POOL требует psycopg 3 с пулом соединений: pip install "psycopg[binary,pool]"'
+            )
+        database['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        }
+        # Пул сам держит соединения открытыми; Django не допускает пул вместе с CONN_MAX_AGE
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+        database['CONN_HEALTH_CHECKS'] = True
+
+
+for database in DATABASES.values():
+    _configure_connections(database)
+
+# Кэш готовых PDF-чеков (accounting/receipt_cache.py): файлы на диске,
+# при превышении MAX_ENTRIES удаляется четверть записей
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'receipts': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('RECEIPT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fleks_receipt_cache')),
+        'TIMEOUT': 60 * 60 * 24 * 30,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    # Справочники (accounting/reference.py): файловый кэш общий для воркеров gunicorn,
+    # поэтому сброс по сигналу в одном процессе виден всем; TIMEOUT - страховка
+    # на случай изменений в обход Django
+    'reference': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('REFERENCE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fleks_reference_cache')),
+        'TIMEOUT': 60 * 10,
+    },
 }
 
 
@@ -143,6 +302,16 @@ LOGIN_REDIRECT_URL = '/api/v1/dashboard/'
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Настольная версия (run_app.py) отдает статику через WhiteNoise прямо из папок
+# приложений (collectstatic в сборке не выполняется); список файлов
+# составляется один раз при запуске, а не на каждый запрос, как при DEBUG
+if os.getenv('FLEKS_DESKTOP'):
+    WHITENOISE_USE_FINDERS = True
+    WHITENOISE_AUTOREFRESH = False
+# ReportLab, шрифты и стили чеков загружаются при запуске (AccountingConfig.ready),
+# чтобы первый отчет или чек не ждал их. Настольная версия без этого быстрее
+# открывается: run_app.py загружает их в фоне, когда сервер уже ответил
+PDF_PRELOAD = not os.getenv('FLEKS_DESKTOP')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 STATIC_URL = 'static/'
 
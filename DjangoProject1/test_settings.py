@@ -0,0 +1,57 @@
+"""
+Настройки для тестов: python manage.py test --settings=DjangoProject1.test_settings
+
+Только локальные базы SQLite во временной папке: переменные окружения
+задаются до импорта settings, поэтому DATABASE_URL из .env не используется
+(load_dotenv не перезаписывает уже заданные переменные).
+Кроме 'default' есть реплика ('replica') и центральная БД ('central') -
+для тестов маршрутизации чтения и синхронизации; тестовые классы
+перечисляют нужные им базы в databases.
+"""
+import os
+import tempfile
+
+os.environ['SECRET_KEY'] = 'fleks-tests'
+os.environ['DATABASE_URL'] = 'sqlite:///fleks_tests.sqlite3'
+os.environ['FLEKS_LOCAL_DB'] = ''
+os.environ['DATABASE_REPLICA_URL'] = ''
+os.environ['DB_POOL'] = ''
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import _sqlite_database  # noqa: E402
+
+TEST_DB_DIR = os.path.join(tempfile.gettempdir(), 'fleks_tests')
+os.makedirs(TEST_DB_DIR, exist_ok=True)
+
+
+def _test_database(alias):
+    # Файл, а не база в памяти: тесты с потоками работают с одной базой
+    path = os.path.join(TEST_DB_DIR, f'{alias}.sqlite3')
+    database = _sqlite_database(path)
+    database['TEST'] = {'NAME': os.path.join(TEST_DB_DIR, f'test_{alias}.sqlite3')}
+    return database
+
+
+DATABASES = {
+    'default': _test_database('default'),
+    'replica': _test_database('replica'),
+    'central': _test_database('central'),
+}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'receipts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'receipts'},
+    'reference': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'reference'},
+}
+
+# Фоновые потоки печати и синхронизации в тестах не запускаются
+PRINT_QUEUE_WORKER_THREAD = False
+LEDGER_SYNC_WORKER_THREAD = False
+
+PDF_PRELOAD = False
+# Без строки журнала на каждый запрос и без предупреждений об ожидаемых 403/404
+LOGGING['loggers']['accounting.request_timing']['level'] = 'WARNING'
+LOGGING['loggers']['django.request'] = {'level': 'ERROR'}
+SESSION_COOKIE_SECURE = False
+CSRF_COOKIE_SECURE = False
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
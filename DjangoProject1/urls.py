@@ -19,8 +19,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.i18n import i18n_patterns
 
+from accounting.views import ready
+
 urlpatterns = [
     path('i18n/setlang/', include('django.conf.urls.i18n')),  # Переключение языка
+    path('ready/', ready, name='ready'),  # Проверка готовности (run_app.py)
 ]
 
 urlpatterns += i18n_patterns(
@@ -1,9 +1,29 @@
 from django.contrib import admin
-from .models import Client, Worker, Transaction, ClientDeposit, ClientBalanceAdjustment
+from django.utils import timezone
+
+from .models import (
+    Client, Worker, Transaction, ClientDeposit, ClientBalanceAdjustment, DailyLedgerSummary, LedgerSyncItem, PrintJob,
+)
+from .print_queue import wake_worker
+from . import sync
+
+
+class LedgerRecordAdmin(admin.ModelAdmin):
+    """
+    Операции проводятся только через accounting/ledger.py: вместе с записью
+    меняются баланс, дневные итоги и итоги клиента. В админке их можно только
+    просматривать - добавление и удаление здесь разошлись бы с итогами.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LedgerRecordAdmin):
     list_display = ('date_time', 'client', 'worker', 'amount', 'lessons_count', 'receipt_printed')
 
     list_filter = ('worker', 'date_time', 'receipt_printed')
@@ -31,14 +51,60 @@ class WorkerAdmin(admin.ModelAdmin):
 
     get_username.short_description = 'Пользователь (Логин)'
 @admin.register(ClientDeposit)
-class ClientDepositAdmin(admin.ModelAdmin):
+class ClientDepositAdmin(LedgerRecordAdmin):
     list_display = ('date_time', 'client', 'amount', 'lessons_added')
     list_filter = ('date_time',)
     search_fields = ('client__full_name',)
 
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(ClientBalanceAdjustment)
-class ClientBalanceAdjustmentAdmin(admin.ModelAdmin):
+class ClientBalanceAdjustmentAdmin(LedgerRecordAdmin):
     list_display = ('date_time', 'client', 'amount_removed', 'lessons_removed')
     list_filter = ('date_time',)
     search_fields = ('client__full_name',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyLedgerSummary)
+class DailyLedgerSummaryAdmin(LedgerRecordAdmin):
+    """Итоги отчетов: меняются только вместе с операциями, пересчет - rebuild_ledger_summary"""
+    list_display = ('date', 'worker', 'client_type', 'sessions_amount', 'deposits_amount', 'adjustments_amount')
+    list_filter = ('date', 'client_type', 'worker')
+    readonly_fields = (
+        'date', 'worker', 'client_type',
+        'sessions_count', 'sessions_amount', 'sessions_lessons',
+        'deposits_count', 'deposits_amount',
+        'adjustments_count', 'adjustments_amount',
+    )
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'object_id', 'status', 'attempts', 'printed_at', 'last_error')
+    list_filter = ('status', 'kind')
+    actions = ('retry_jobs',)
+
+    @admin.action(description="Повторить печать")
+    def retry_jobs(self, request, queryset):
+        queryset.update(status=PrintJob.STATUS_PENDING, attempts=0, available_at=timezone.now())
+        wake_worker()
+
+
+@admin.register(LedgerSyncItem)
+class LedgerSyncItemAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'object_id', 'balance_delta', 'status', 'attempts', 'synced_at', 'last_error')
+    list_filter = ('status', 'kind')
+    actions = ('retry_items',)
+
+    @admin.action(description="Отправить повторно")
+    def retry_items(self, request, queryset):
+        queryset.filter(status=LedgerSyncItem.STATUS_FAILED).update(status=LedgerSyncItem.STATUS_PENDING, attempts=0)
+        sync.wake_worker()
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 
 class AccountingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounting'
+
+    def ready(self):
+        from .receipt_engine import preload_pdf
+        from .reference import connect_signals
+        from .request_timing import connect_signals as connect_timing_signals
+        from .schema import refresh_after_migrate
+
+        post_migrate.connect(refresh_after_migrate, sender=self)
+        # Сброс кэша справочников при изменении сотрудников и клиентов
+        connect_signals()
+        # Подсчет SQL-запросов для замера времени запросов (REQUEST_TIMING)
+        connect_timing_signals()
+        # ReportLab и шрифты для PDF загружаются при запуске, а не при первом
+        # отчете/чеке (кроме настольной версии, см. PDF_PRELOAD)
+        if getattr(settings, 'PDF_PRELOAD', True):
+            preload_pdf()
@@ -0,0 +1,79 @@
+"""
+Помощники для асинхронных представлений (ASGI, см. DjangoProject1/asgi.py).
+
+Запросы к БД в асинхронных представлениях идут через асинхронный ORM
+(aget, afirst, aaggregate, aiterator), который выполняет их в потоке,
+закрепленном за текущим запросом. Формирование PDF (ReportLab) занимает
+процессор на десятки миллисекунд и выполняется в отдельном пуле потоков,
+чтобы не останавливать цикл событий, обслуживающий остальные запросы.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.shortcuts import render
+
+
+PDF_RENDER_THREADS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _render_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PDF_RENDER_THREADS', PDF_RENDER_THREADS),
+                    thread_name_prefix='pdf-render',
+                )
+    return _executor
+
+
+async def run_in_render_pool(func, *args, **kwargs):
+    """
+    Выполняет func (формирование PDF) в пуле потоков PDF_RENDER_THREADS.
+    func не должна обращаться к БД: все данные загружаются до вызова.
+    """
+    return await sync_to_async(func, thread_sensitive=False, executor=_render_executor())(*args, **kwargs)
+
+
+async def arender(request, template_name, context=None):
+    """
+    render() для асинхронного представления. Шаблоны обращаются к request.user
+    и сессии (context processors), поэтому рендеринг идет в потоке запроса.
+    """
+    if hasattr(request, 'auser'):
+        # Пользователь уже загружен проверкой доступа (login_required): без этого
+        # шаблон загрузил бы его заново через синхронный request.user
+        request.user = await request.auser()
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def is_asgi(request):
+    return isinstance(request, ASGIRequest)
+
+
+async def aiter_sync(iterable):
+    """
+    Отдает синхронный генератор (потоковая выгрузка) асинхронно, по одной части.
+    Все шаги выполняются в одном потоке запроса: генератор держит транзакцию
+    и серверный курсор, привязанные к соединению этого потока.
+    """
+    iterator = iter(iterable)
+    sentinel = object()
+    step = sync_to_async(next)
+    try:
+        while True:
+            chunk = await step(iterator, sentinel)
+            if chunk is sentinel:
+                return
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
@@ -0,0 +1,175 @@
+"""
+Список клиентов: сортировки, фильтры и постраничный вывод.
+
+Страницы листаются keyset-курсором по (колонка сортировки, id), поэтому
+стоимость страницы не зависит от ее номера; для каждой сортировки есть
+индекс (колонка, id) в Client.Meta.indexes. Клиенты без значения
+(например, ни разу не приходившие при сортировке по последнему визиту)
+идут в конце: сначала листаются строки со значением, затем строки с NULL.
+
+Общее количество на больших таблицах PostgreSQL берется из оценки
+планировщика, а не из COUNT(*) по всей таблице.
+"""
+import json
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext_lazy as _
+
+from .names import normalize_name
+
+
+CLIENTS_PAGE_SIZE = 50
+
+# Выше этого значения точный COUNT(*) заменяется оценкой планировщика PostgreSQL
+EXACT_COUNT_LIMIT = 10000
+
+# Порог "низкого баланса" для клиентов без шаблонной суммы сеанса
+DEFAULT_LOW_BALANCE_THRESHOLD = Decimal('10.00')
+
+_CURSOR_SEPARATOR = '~'
+# Метка курсора в части списка, где значение сортировки пустое (NULL)
+_NULL_MARK = 'n'
+_VALUE_MARK = 'v'
+
+# descending - от больших значений к меньшим; parse - разбор значения из курсора
+ClientSort = namedtuple('ClientSort', ['field', 'descending', 'nullable', 'parse', 'label'])
+
+SORT_NAME = 'name'
+SORT_BALANCE = 'balance'
+SORT_LAST_VISIT = 'last_visit'
+SORT_CREATED = 'created'
+
+CLIENT_SORTS = {
+    SORT_NAME: ClientSort('full_name', False, False, str, _('Full name')),
+    SORT_BALANCE: ClientSort('balance', True, False, Decimal, _('Balance')),
+    SORT_LAST_VISIT: ClientSort('last_visit_at', True, True, datetime.fromisoformat, _('Last visit')),
+    SORT_CREATED: ClientSort('created_at', True, True, datetime.fromisoformat, _('Created at')),
+}
+DEFAULT_SORT = SORT_NAME
+
+
+def low_balance_threshold():
+    return Decimal(str(getattr(settings, 'CLIENT_LOW_BALANCE_THRESHOLD', DEFAULT_LOW_BALANCE_THRESHOLD)))
+
+
+def filter_clients(queryset, query='', client_type='', low_balance=False):
+    """
+    Фильтры списка: поиск по имени/телефону, тип клиента и низкий баланс
+    (меньше шаблонной суммы сеанса клиента, а если она не задана - меньше порога из настроек).
+    """
+    if query:
+        name_filter = Q(phone__icontains=query)
+        search_key = normalize_name(query)
+        if search_key:
+            name_filter |= Q(search_name__contains=search_key)
+        queryset = queryset.filter(name_filter)
+    if client_type:
+        queryset = queryset.filter(client_type=client_type)
+    if low_balance:
+        queryset = queryset.filter(balance__lt=Coalesce(F('default_session_amount'), low_balance_threshold()))
+    return queryset
+
+
+def encode_cursor(sort, client):
+    value = getattr(client, CLIENT_SORTS[sort].field)
+    if value is None:
+        return _CURSOR_SEPARATOR.join([_NULL_MARK, str(client.id)])
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return _CURSOR_SEPARATOR.join([_VALUE_MARK, str(value), str(client.id)])
+
+
+def decode_cursor(sort, value):
+    """
+    Разбирает курсор из GET-параметра. Возвращает (is_null, значение, id) или None.
+    """
+    if not value:
+        return None
+    spec = CLIENT_SORTS[sort]
+    mark, _sep, rest = value.partition(_CURSOR_SEPARATOR)
+    try:
+        if mark == _NULL_MARK and spec.nullable:
+            return True, None, int(rest)
+        if mark != _VALUE_MARK:
+            return None
+        raw_value, client_id = rest.rsplit(_CURSOR_SEPARATOR, 1)
+        parsed = spec.parse(raw_value)
+        client_id = int(client_id)
+    except (ValueError, InvalidOperation):
+        return None
+    if isinstance(parsed, datetime) and parsed.tzinfo is None:
+        return None
+    return False, parsed, client_id
+
+
+def _after(field, descending, value, client_id):
+    """Условие "строка после (value, client_id)" в порядке сортировки"""
+    if descending:
+        return Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': client_id})
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': client_id})
+
+
+def _ordered(queryset, field, descending):
+    if descending:
+        return queryset.order_by(f'-{field}', '-id')
+    return queryset.order_by(field, 'id')
+
+
+def clients_page(queryset, sort=DEFAULT_SORT, cursor=None, limit=CLIENTS_PAGE_SIZE):
+    """
+    Одна страница списка. Возвращает (clients, next_cursor);
+    next_cursor равен None, если страница последняя.
+    """
+    spec = CLIENT_SORTS[sort]
+    field = spec.field
+    clients = []
+
+    in_null_part = cursor is not None and cursor[0]
+    if not in_null_part:
+        rows = queryset.filter(**{f'{field}__isnull': False}) if spec.nullable else queryset
+        if cursor is not None:
+            rows = rows.filter(_after(field, spec.descending, cursor[1], cursor[2]))
+        clients = list(_ordered(rows, field, spec.descending)[:limit + 1])
+
+    if spec.nullable and len(clients) <= limit:
+        rows = queryset.filter(**{f'{field}__isnull': True})
+        if in_null_part:
+            rows = rows.filter(id__lt=cursor[2])
+        clients += list(rows.order_by('-id')[:limit + 1 - len(clients)])
+
+    next_cursor = None
+    if len(clients) > limit:
+        clients = clients[:limit]
+        next_cursor = encode_cursor(sort, clients[-1])
+    return clients, next_cursor
+
+
+def _planner_estimate(queryset):
+    """Оценка числа строк из EXPLAIN PostgreSQL (без выполнения запроса)"""
+    # База, из которой QuerySet читал бы строки (на @replica_reads - реплика)
+    sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset):
+    """
+    Количество клиентов для заголовка списка. Возвращает (count, is_estimate).
+    На PostgreSQL при большом результате берется оценка планировщика,
+    иначе - обычный COUNT(*).
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        estimate = _planner_estimate(queryset.order_by())
+        if estimate > EXACT_COUNT_LIMIT:
+            return estimate, True
+    return queryset.count(), False
@@ -0,0 +1,128 @@
+"""
+Чтение с реплики БД (DATABASES['replica'], включается DATABASE_REPLICA_URL).
+
+Представления, помеченные @replica_reads, выполняют запросы на чтение на
+реплике; все остальное (записи, транзакции, фоновые потоки, команды)
+работает с основной БД. Реплика отстает от основной БД, поэтому после
+записи (любой POST или запись через ORM) браузер получает cookie, и
+DATABASE_REPLICA_PIN_SECONDS секунд его запросы читают с основной БД:
+сотрудник сразу видит свою операцию и ее чек.
+
+Без настроенной реплики роутер ничего не меняет.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'fleks_db_pin'
+DEFAULT_PIN_SECONDS = 10
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Сессии и пользователи всегда читаются с основной БД: только что созданная
+# сессия может еще не дойти до реплики, и сотрудника "разлогинит"
+PRIMARY_ONLY_APPS = ('sessions', 'auth', 'contenttypes')
+
+
+class _RoutingState:
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+# Состояние текущего запроса; вне запроса (команды, фоновые потоки) - None
+_state = ContextVar('fleks_db_routing', default=None)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def replica_reads(view_func):
+    """Помечает представление, которое только читает данные: чтение идет с реплики"""
+    view_func.replica_reads = True
+    return view_func
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        # Внутри транзакции на основной БД читаем оттуда же
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной БД: связи между объектами из обеих допустимы
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение с реплики для @replica_reads и закрепляет браузер за основной БД после записи"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Под ASGI middleware работает в цикле событий, без перехода в поток
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _state.set(_RoutingState())
+        try:
+            response = self.get_response(request)
+            wrote = _state.get().wrote
+        finally:
+            _state.reset(token)
+        return self._pin(request, response, wrote)
+
+    async def __acall__(self, request):
+        token = _state.set(_RoutingState())
+        try:
+            response = await self.get_response(request)
+            wrote = _state.get().wrote
+        finally:
+            _state.reset(token)
+        return self._pin(request, response, wrote)
+
+    def _pin(self, request, response, wrote):
+        if replica_configured() and (wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS),
+                secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            getattr(view_func, 'replica_reads', False)
+            and replica_configured()
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            _state.get().use_replica = True
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        # Асинхронная версия: Django не переносит ее вызов в поток
+        return ReplicaRoutingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
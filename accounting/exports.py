@@ -0,0 +1,265 @@
+"""
+Потоковая выгрузка журнала операций в CSV и XLSX.
+
+Строки читаются из БД серверным курсором (.iterator()) и сразу отдаются
+клиенту через StreamingHttpResponse, поэтому память не растет с размером
+периода, а первый байт уходит сразу.
+"""
+import csv
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.translation import gettext
+
+from .async_support import aiter_sync
+from .operations import KIND_ADJUSTMENT, KIND_DEPOSIT, Operation
+
+
+# Сколько строк забирать с сервера за один FETCH
+EXPORT_CHUNK_SIZE = 2000
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+def _export_labels():
+    """
+    Переводы вычисляем до начала стриминга: генератор может работать
+    уже после того, как middleware сменит активный язык.
+    """
+    return {
+        'header': [
+            gettext('Date and time'),
+            gettext('Operation type'),
+            gettext('Operation #'),
+            gettext('Client'),
+            gettext('Worker'),
+            gettext('Amount'),
+            gettext('Lessons'),
+        ],
+        'kinds': {
+            KIND_DEPOSIT: gettext('Top-up'),
+            KIND_ADJUSTMENT: gettext('Top-up cancellation'),
+        },
+        'session': gettext('Session (Income)'),
+    }
+
+
+def _iter_operations(operations_qs):
+    # Серверный курсор PostgreSQL живет только внутри транзакции
+    # (в т.ч. за пулером соединений в режиме transaction pooling) -
+    # транзакции на той базе, из которой читается QuerySet
+    with transaction.atomic(using=operations_qs.db):
+        for row in operations_qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield Operation._make(row)
+
+
+def _export_rows(operations_qs, labels):
+    """
+    Строки выгрузки: (дата, тип, номер, клиент, сотрудник, сумма со знаком, уроки)
+    """
+    for op in _iter_operations(operations_qs):
+        amount = -op.amount if op.kind == KIND_ADJUSTMENT else op.amount
+        yield (
+            timezone.localtime(op.date_time),
+            labels['kinds'].get(op.kind, labels['session']),
+            op.id,
+            op.client_name,
+            op.worker_name or '',
+            amount,
+            op.lessons,
+        )
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку вместо буферизации"""
+
+    def write(self, value):
+        return value
+
+
+def _stream_csv(operations_qs, labels):
+    writer = csv.writer(_Echo())
+    # BOM, чтобы Excel сразу открыл файл в UTF-8
+    yield '\ufeff' + writer.writerow(labels['header'])
+    for date_time, *rest in _export_rows(operations_qs, labels):
+        yield writer.writerow([date_time.strftime('%Y-%m-%d %H:%M:%S'), *rest])
+
+
+class _ChunkBuffer:
+    """
+    Не поддерживающий seek поток для zipfile: накапливает записанные байты,
+    которые генератор забирает и отдает клиенту.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Стили ячеек: 0 - обычный, 1 - дата/время, 2 - сумма, 3 - заголовок
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="dd.mm.yyyy hh:mm"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<cols><col min="1" max="1" width="18" customWidth="1"/>'
+    '<col min="2" max="2" width="22" customWidth="1"/>'
+    '<col min="4" max="5" width="30" customWidth="1"/></cols>'
+    '<sheetData>'
+)
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _xlsx_text_cell(value, style=0):
+    style_attr = f' s="{style}"' if style else ''
+    return f'<c t="inlineStr"{style_attr}><is><t>{escape(str(value))}</t></is></c>'
+
+
+def _xlsx_number_cell(value, style=0):
+    style_attr = f' s="{style}"' if style else ''
+    return f'<c{style_attr}><v>{value}</v></c>'
+
+
+def _xlsx_row(date_time, kind_label, op_id, client_name, worker_name, amount, lessons):
+    serial = (date_time.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+    return ''.join([
+        '<row>',
+        _xlsx_number_cell(f'{serial:.8f}', style=1),
+        _xlsx_text_cell(kind_label),
+        _xlsx_number_cell(op_id),
+        _xlsx_text_cell(client_name),
+        _xlsx_text_cell(worker_name),
+        _xlsx_number_cell(amount, style=2),
+        _xlsx_number_cell(lessons),
+        '</row>',
+    ])
+
+
+def _stream_xlsx(operations_qs, labels, rows_per_flush=500):
+    """
+    Минимальная книга XLSX (один лист, inline-строки), которая пишется
+    в zip-архив без seek и отдается частями по мере чтения строк.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _XLSX_STYLES)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            header = ''.join(_xlsx_text_cell(title, style=3) for title in labels['header'])
+            sheet.write(f'{_XLSX_SHEET_HEAD}<row>{header}</row>'.encode('utf-8'))
+            pending = []
+            for row in _export_rows(operations_qs, labels):
+                pending.append(_xlsx_row(*row))
+                if len(pending) >= rows_per_flush:
+                    sheet.write(''.join(pending).encode('utf-8'))
+                    pending = []
+                    chunk = buffer.drain()
+                    if chunk:
+                        yield chunk
+            sheet.write((''.join(pending) + _XLSX_SHEET_TAIL).encode('utf-8'))
+    yield buffer.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': (_stream_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (_stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def stream_operations_export(operations_qs, export_format, filename='financial_report', asynchronous=False):
+    """
+    Возвращает StreamingHttpResponse с журналом операций в формате csv или xlsx.
+    operations_qs - QuerySet из operations.operations_union().
+    asynchronous - ответ для ASGI-сервера: иначе Django собрал бы весь файл в памяти.
+    """
+    stream, content_type = EXPORT_FORMATS[export_format]
+    # Генератор читает строки уже после выхода из ReplicaRoutingMiddleware, когда
+    # роутер не знает о @replica_reads: базу выбираем сейчас и закрепляем за QuerySet'ом
+    operations_qs = operations_qs.using(operations_qs.db)
+    content = stream(operations_qs, _export_labels())
+    if asynchronous:
+        content = aiter_sync(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,415 @@
+"""
+Денормализованные итоги по операциям: дневные итоги (DailyLedgerSummary)
+и итоги клиента за все время (поля total_* и last_visit_at модели Client).
+
+Функции record_* вызываются внутри того же transaction.atomic(),
+в котором создается запись сеанса/пополнения/отмены пополнения.
+
+Проведение операций (post_session, post_deposit, post_adjustment) меняет
+баланс одним условным UPDATE ... RETURNING без предварительного чтения
+и SELECT FOR UPDATE: строка клиента блокируется только самим UPDATE и
+только до конца короткой транзакции операции.
+"""
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import (
+    Client, ClientBalanceAdjustment, ClientDeposit, DailyLedgerSummary, LedgerSyncItem, Transaction,
+)
+
+
+def _bump_daily_summary(day, worker_id, client_type, using=DEFAULT_DB_ALIAS, **deltas):
+    """
+    Прибавляет значения к строке дневных итогов, создавая ее при необходимости.
+    """
+    summaries = DailyLedgerSummary.objects.using(using)
+    lookup = {'date': day, 'worker_id': worker_id, 'client_type': client_type}
+    increments = {field: F(field) + value for field, value in deltas.items()}
+
+    if summaries.filter(**lookup).update(**increments):
+        return
+    try:
+        # Точка сохранения: параллельный запрос мог уже создать эту строку
+        with transaction.atomic(using=using):
+            summaries.create(**lookup, **deltas)
+    except IntegrityError:
+        summaries.filter(**lookup).update(**increments)
+
+
+def _bump_client_totals(client_id, using=DEFAULT_DB_ALIAS, **changes):
+    """
+    Прибавляет значения к итогам клиента одним UPDATE (без чтения строки).
+    last_visit_at передается готовым выражением и записывается как есть.
+    """
+    values = {
+        field: value if field == 'last_visit_at' else F(field) + value
+        for field, value in changes.items()
+    }
+    Client.objects.using(using).filter(pk=client_id).update(**values)
+
+
+def record_session(transaction_record, using=DEFAULT_DB_ALIAS):
+    """Учитывает сеанс (Transaction) в дневных итогах и итогах клиента"""
+    _bump_client_totals(
+        transaction_record.client_id,
+        using=using,
+        total_spent=transaction_record.amount,
+        total_sessions=1,
+        last_visit_at=Greatest(
+            Coalesce('last_visit_at', Value(transaction_record.date_time)),
+            Value(transaction_record.date_time),
+        ),
+    )
+    _bump_daily_summary(
+        timezone.localdate(transaction_record.date_time),
+        transaction_record.worker_id,
+        transaction_record.client.client_type,
+        using=using,
+        sessions_count=1,
+        sessions_amount=transaction_record.amount,
+        sessions_lessons=transaction_record.lessons_count,
+    )
+
+
+def record_deposit(deposit, using=DEFAULT_DB_ALIAS):
+    """Учитывает пополнение (ClientDeposit) в дневных итогах и итогах клиента"""
+    _bump_client_totals(deposit.client_id, using=using, total_deposited=deposit.amount)
+    _bump_daily_summary(
+        timezone.localdate(deposit.date_time),
+        None,
+        deposit.client.client_type,
+        using=using,
+        deposits_count=1,
+        deposits_amount=deposit.amount,
+    )
+
+
+def record_adjustment(adjustment, using=DEFAULT_DB_ALIAS):
+    """Учитывает отмену пополнения (ClientBalanceAdjustment) в дневных итогах и итогах клиента"""
+    _bump_client_totals(adjustment.client_id, using=using, total_adjusted=adjustment.amount_removed)
+    _bump_daily_summary(
+        timezone.localdate(adjustment.date_time),
+        None,
+        adjustment.client.client_type,
+        using=using,
+        adjustments_count=1,
+        adjustments_amount=adjustment.amount_removed,
+    )
+
+
+class InsufficientFunds(Exception):
+    """На балансе клиента меньше списываемой суммы"""
+
+
+_CENTS = Decimal('0.01')
+
+
+def _can_return_from_update(connection):
+    """
+    Поддерживает ли база UPDATE ... RETURNING: PostgreSQL и SQLite 3.35+.
+    features.can_return_columns_from_insert сам по себе не подходит: это флаг
+    INSERT ... RETURNING, а MariaDB поддерживает его, но не UPDATE ... RETURNING.
+    У SQLite оба вида RETURNING появились в 3.35, поэтому там флаг означает версию.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+def _update_balance(client_id, delta, minimum=None, using=DEFAULT_DB_ALIAS):
+    """
+    balance = balance + delta одним UPDATE; при minimum - только если balance >= minimum.
+    Возвращает (balance, lessons_balance) после изменения или None,
+    если клиента нет или условие не выполнено.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(Client._meta.db_table)
+    condition = f" AND {qn('balance')} >= %s" if minimum is not None else ""
+    params = [delta, timezone.now(), client_id] + ([minimum] if minimum is not None else [])
+    sql = (
+        f"UPDATE {table} SET {qn('balance')} = {qn('balance')} + %s, {qn('updated_at')} = %s "
+        f"WHERE {qn('id')} = %s{condition}"
+    )
+    with connection.cursor() as cursor:
+        if _can_return_from_update(connection):
+            cursor.execute(f"{sql} RETURNING {qn('balance')}, {qn('lessons_balance')}", params)
+            row = cursor.fetchone()
+        else:
+            cursor.execute(sql, params)
+            row = None
+            if cursor.rowcount:
+                # UPDATE уже держит блокировку строки до конца транзакции
+                cursor.execute(
+                    f"SELECT {qn('balance')}, {qn('lessons_balance')} FROM {table} WHERE {qn('id')} = %s",
+                    [client_id],
+                )
+                row = cursor.fetchone()
+    if row is None:
+        return None
+    # SQLite хранит DecimalField как число, а не как decimal
+    return Decimal(str(row[0])).quantize(_CENTS), row[1]
+
+
+def credit_balance(client_id, amount, using=DEFAULT_DB_ALIAS):
+    """Зачисляет amount на баланс. Возвращает (balance, lessons_balance)"""
+    result = _update_balance(client_id, amount, using=using)
+    if result is None:
+        raise Client.DoesNotExist(f"Client {client_id} does not exist")
+    return result
+
+
+def debit_balance(client_id, amount, using=DEFAULT_DB_ALIAS, allow_overdraft=False):
+    """
+    Списывает amount, если на балансе достаточно средств.
+    Возвращает (balance, lessons_balance); иначе InsufficientFunds.
+    allow_overdraft - списать в любом случае (операция уже проведена в другой базе).
+    """
+    result = _update_balance(client_id, -amount, minimum=None if allow_overdraft else amount, using=using)
+    if result is None:
+        if not Client.objects.using(using).filter(pk=client_id).exists():
+            raise Client.DoesNotExist(f"Client {client_id} does not exist")
+        raise InsufficientFunds(client_id)
+    return result
+
+
+def _queue_sync(kind, object_id, client_id, balance_delta):
+    """В локальной базе настольной версии - ставит операцию в очередь отправки в центральную БД"""
+    from .sync import queue_sync
+
+    queue_sync(kind, object_id, client_id, balance_delta)
+
+
+@transaction.atomic
+def post_session(client, worker, amount, lessons_count):
+    """
+    Сеанс: списание с баланса, запись Transaction со снимком баланса и итоги.
+    client - экземпляр Client (используются id и client_type; строка заново не читается).
+    """
+    balance, lessons_balance = debit_balance(client.pk, amount)
+    transaction_record = Transaction.objects.create(
+        client=client,
+        worker=worker,
+        amount=amount,
+        receipt_printed=False,
+        lessons_count=lessons_count,
+        balance_after=balance,
+        lessons_balance_after=lessons_balance,
+    )
+    record_session(transaction_record)
+    _queue_sync(LedgerSyncItem.KIND_SESSION, transaction_record.id, client.pk, -amount)
+    return transaction_record
+
+
+@transaction.atomic
+def post_deposit(client, amount):
+    """Пополнение: зачисление на баланс, запись ClientDeposit со снимком баланса и итоги"""
+    balance, lessons_balance = credit_balance(client.pk, amount)
+    deposit = ClientDeposit.objects.create(
+        client=client,
+        amount=amount,
+        lessons_added=0,
+        balance_after=balance,
+        lessons_balance_after=lessons_balance,
+    )
+    record_deposit(deposit)
+    _queue_sync(LedgerSyncItem.KIND_DEPOSIT, deposit.id, client.pk, amount)
+    return deposit
+
+
+@transaction.atomic
+def post_adjustment(client, amount):
+    """Отмена пополнения: списание с баланса, запись ClientBalanceAdjustment и итоги"""
+    balance, lessons_balance = debit_balance(client.pk, amount)
+    adjustment = ClientBalanceAdjustment.objects.create(
+        client=client,
+        amount_removed=amount,
+        lessons_removed=0,
+        balance_after=balance,
+        lessons_balance_after=lessons_balance,
+    )
+    record_adjustment(adjustment)
+    _queue_sync(LedgerSyncItem.KIND_ADJUSTMENT, adjustment.id, client.pk, -amount)
+    return adjustment
+
+
+def _summary_queryset(start_date=None, end_date=None, worker_id=None):
+    qs = DailyLedgerSummary.objects.all()
+    if start_date:
+        qs = qs.filter(date__gte=start_date)
+    if end_date:
+        qs = qs.filter(date__lte=end_date)
+    if worker_id is not None:
+        # Строки пополнений без сотрудника при этом отсекаются
+        qs = qs.filter(worker_id=worker_id)
+    return qs
+
+
+_SUMMARY_AGGREGATES = {
+    'income': Sum('sessions_amount'),
+    'deposits': Sum('deposits_amount'),
+    'adjustments': Sum('adjustments_amount'),
+}
+
+
+def _summary_result(totals):
+    return (
+        totals['income'] or Decimal('0.00'),
+        totals['deposits'] or Decimal('0.00'),
+        totals['adjustments'] or Decimal('0.00'),
+    )
+
+
+def summary_totals(start_date=None, end_date=None, worker_id=None):
+    """
+    Итоги за период (даты включительно) по таблице дневных итогов.
+    Возвращает (total_income, total_deposits, total_adjustments).
+    """
+    qs = _summary_queryset(start_date, end_date, worker_id)
+    return _summary_result(qs.aggregate(**_SUMMARY_AGGREGATES))
+
+
+async def asummary_totals(start_date=None, end_date=None, worker_id=None):
+    """summary_totals() для асинхронных представлений"""
+    qs = _summary_queryset(start_date, end_date, worker_id)
+    return _summary_result(await qs.aaggregate(**_SUMMARY_AGGREGATES))
+
+
+@transaction.atomic
+def rebuild_daily_summary(apps=global_apps, batch_size=1000):
+    """
+    Полностью пересчитывает дневные итоги по сырым таблицам.
+    Тип клиента берется текущий (тип на момент операции нигде не хранится).
+    Возвращает количество созданных строк.
+    """
+    Summary = apps.get_model('accounting', 'DailyLedgerSummary')
+    Transaction = apps.get_model('accounting', 'Transaction')
+    ClientDeposit = apps.get_model('accounting', 'ClientDeposit')
+    ClientBalanceAdjustment = apps.get_model('accounting', 'ClientBalanceAdjustment')
+
+    rows = {}
+
+    def row_for(day, worker_id, client_type):
+        key = (day, worker_id, client_type)
+        if key not in rows:
+            rows[key] = Summary(date=day, worker_id=worker_id, client_type=client_type)
+        return rows[key]
+
+    # TruncDate считает дату в текущем часовом поясе (TIME_ZONE = Asia/Baku)
+    sessions = Transaction.objects.annotate(day=TruncDate('date_time')).values(
+        'day', 'worker_id', 'client__client_type',
+    ).annotate(count=Count('id'), amount=Sum('amount'), lessons=Sum('lessons_count')).order_by()
+    for item in sessions:
+        row = row_for(item['day'], item['worker_id'], item['client__client_type'])
+        row.sessions_count = item['count']
+        row.sessions_amount = item['amount'] or Decimal('0.00')
+        row.sessions_lessons = item['lessons'] or 0
+
+    deposits = ClientDeposit.objects.annotate(day=TruncDate('date_time')).values(
+        'day', 'client__client_type',
+    ).annotate(count=Count('id'), amount=Sum('amount')).order_by()
+    for item in deposits:
+        row = row_for(item['day'], None, item['client__client_type'])
+        row.deposits_count = item['count']
+        row.deposits_amount = item['amount'] or Decimal('0.00')
+
+    adjustments = ClientBalanceAdjustment.objects.annotate(day=TruncDate('date_time')).values(
+        'day', 'client__client_type',
+    ).annotate(count=Count('id'), amount=Sum('amount_removed')).order_by()
+    for item in adjustments:
+        row = row_for(item['day'], None, item['client__client_type'])
+        row.adjustments_count = item['count']
+        row.adjustments_amount = item['amount'] or Decimal('0.00')
+
+    Summary.objects.all().delete()
+    Summary.objects.bulk_create(rows.values(), batch_size=batch_size)
+    return len(rows)
+
+
+# Итоги клиента без операций
+EMPTY_CLIENT_TOTALS = {
+    'total_spent': Decimal('0.00'),
+    'total_deposited': Decimal('0.00'),
+    'total_adjusted': Decimal('0.00'),
+    'total_sessions': 0,
+    'last_visit_at': None,
+}
+
+
+def _client_totals_from_ledger(apps):
+    """Итоги клиентов по сырым таблицам: {client_id: {поле: значение}}"""
+    Transaction = apps.get_model('accounting', 'Transaction')
+    ClientDeposit = apps.get_model('accounting', 'ClientDeposit')
+    ClientBalanceAdjustment = apps.get_model('accounting', 'ClientBalanceAdjustment')
+
+    totals = {}
+
+    def totals_for(client_id):
+        if client_id not in totals:
+            totals[client_id] = dict(EMPTY_CLIENT_TOTALS)
+        return totals[client_id]
+
+    sessions = Transaction.objects.values('client_id').annotate(
+        count=Count('id'), amount=Sum('amount'), last_visit=Max('date_time'),
+    ).order_by()
+    for item in sessions:
+        row = totals_for(item['client_id'])
+        row['total_spent'] = item['amount'] or Decimal('0.00')
+        row['total_sessions'] = item['count']
+        row['last_visit_at'] = item['last_visit']
+
+    deposits = ClientDeposit.objects.values('client_id').annotate(amount=Sum('amount')).order_by()
+    for item in deposits:
+        totals_for(item['client_id'])['total_deposited'] = item['amount'] or Decimal('0.00')
+
+    adjustments = ClientBalanceAdjustment.objects.values('client_id').annotate(
+        amount=Sum('amount_removed'),
+    ).order_by()
+    for item in adjustments:
+        totals_for(item['client_id'])['total_adjusted'] = item['amount'] or Decimal('0.00')
+
+    return totals
+
+
+def check_client_totals(apps=global_apps):
+    """
+    Сравнивает итоги клиентов с сырыми таблицами, ничего не меняя.
+    Возвращает список (client_id, поле, сохранено, по операциям) для расхождений.
+    """
+    Client = apps.get_model('accounting', 'Client')
+    totals = _client_totals_from_ledger(apps)
+    mismatches = []
+    for client in Client.objects.only('id', *EMPTY_CLIENT_TOTALS).order_by('id').iterator():
+        expected = totals.get(client.id, EMPTY_CLIENT_TOTALS)
+        for field, value in expected.items():
+            stored = getattr(client, field)
+            if stored != value:
+                mismatches.append((client.id, field, stored, value))
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_client_totals(apps=global_apps, batch_size=500):
+    """
+    Пересчитывает итоги всех клиентов по сырым таблицам.
+    Строки клиентов блокируются, чтобы не потерять параллельно проведенную операцию.
+    Возвращает количество клиентов, у которых итоги изменились.
+    """
+    Client = apps.get_model('accounting', 'Client')
+    clients = list(Client.objects.select_for_update().only('id', *EMPTY_CLIENT_TOTALS).order_by('id'))
+    totals = _client_totals_from_ledger(apps)
+
+    changed = []
+    for client in clients:
+        expected = totals.get(client.id, EMPTY_CLIENT_TOTALS)
+        if any(getattr(client, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(client, field, value)
+            changed.append(client)
+    Client.objects.bulk_update(changed, list(EMPTY_CLIENT_TOTALS), batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,204 @@
+import asyncio
+import io
+import statistics
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client as TestClient
+
+from accounting.models import Client, Transaction
+
+
+MODE_WSGI = 'wsgi'
+MODE_ASGI = 'asgi'
+MODES = (MODE_WSGI, MODE_ASGI)
+
+
+def _latency_wrapper(delay):
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def _default_paths():
+    paths = ['/reports/', '/reports/?preset=month']
+    client_id = Client.objects.order_by('-id').values_list('id', flat=True).first()
+    if client_id:
+        paths.append(f'/clients/{client_id}/')
+    transaction_id = Transaction.objects.order_by('-id').values_list('id', flat=True).first()
+    if transaction_id:
+        paths.append(f'/transactions/{transaction_id}/view-receipt/')
+        paths.append(f'/transactions/{transaction_id}/view-receipt/pdf/')
+    return paths
+
+
+def _wsgi_get(application, host, path, cookie):
+    url = urlsplit(path)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'HTTP_COOKIE': cookie,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'https',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    status = []
+    body = application(environ, lambda value, headers, exc_info=None: status.append(value))
+    try:
+        for _chunk in body:
+            pass
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(status[0].split()[0])
+
+
+async def _asgi_get(application, host, path, cookie):
+    url = urlsplit(path)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'https',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', host.encode()), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (host, 443),
+    }
+    requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    disconnected.set()
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочная проверка отчетов и чеков в одном процессе: синхронный WSGI-воркер "
+        "(запросы по одному) и ASGI (--concurrency запросов одновременно в одном цикле событий). "
+        "--db-latency-ms добавляет задержку к каждому SQL-запросу, как у удаленной БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Запросов на каждый способ")
+        parser.add_argument('--concurrency', type=int, default=20, help="Одновременных запросов для ASGI")
+        parser.add_argument('--path', action='append', help="Проверяемый адрес (по умолчанию отчеты, клиент и чек)")
+        parser.add_argument(
+            '--db-latency-ms', type=float, default=5.0,
+            help="Задержка каждого SQL-запроса в мс (сеть до PostgreSQL)",
+        )
+        parser.add_argument('--host', default='localhost', help="Значение Host (из ALLOWED_HOSTS)")
+        parser.add_argument('--mode', choices=MODES, action='append', help="Проверяемый способ (по умолчанию оба)")
+
+    def _run_wsgi(self, paths, count, host, cookie):
+        application = get_wsgi_application()
+        timings, statuses = [], []
+        started = time.perf_counter()
+        for index in range(count):
+            request_started = time.perf_counter()
+            statuses.append(_wsgi_get(application, host, paths[index % len(paths)], cookie))
+            timings.append(time.perf_counter() - request_started)
+        return timings, statuses, time.perf_counter() - started
+
+    def _run_asgi(self, paths, count, concurrency, host, cookie):
+        application = get_asgi_application()
+        timings, statuses = [], []
+
+        async def one(index, semaphore):
+            async with semaphore:
+                request_started = time.perf_counter()
+                statuses.append(await _asgi_get(application, host, paths[index % len(paths)], cookie))
+                timings.append(time.perf_counter() - request_started)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(concurrency)
+            await asyncio.gather(*(one(index, semaphore) for index in range(count)))
+
+        started = time.perf_counter()
+        asyncio.run(run_all())
+        return timings, statuses, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        paths = options['path'] or _default_paths()
+        if options['requests'] < 1:
+            raise CommandError("--requests должно быть больше нуля")
+        modes = options['mode'] or list(MODES)
+
+        # Временный сотрудник с сессией: представления доступны только персоналу
+        user = get_user_model().objects.create_user(
+            username=f'bench-{uuid.uuid4().hex[:8]}', is_staff=True,
+        )
+        login = TestClient()
+        login.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={login.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        latency = options['db_latency_ms'] / 1000
+        latency_wrapper = _latency_wrapper(latency)
+
+        def add_latency(sender, connection, **kwargs):
+            # Объект соединения потока переиспользуется после закрытия: обертка добавляется один раз
+            if latency_wrapper not in connection.execute_wrappers:
+                connection.execute_wrappers.append(latency_wrapper)
+
+        if latency:
+            connection_created.connect(add_latency)
+            # Уже открытые соединения откроются заново - с задержкой
+            connections.close_all()
+        self.stdout.write(f"Адреса: {', '.join(paths)}")
+        self.stdout.write(
+            f"{'способ':<8}{'запросов/с':>12}{'медиана, мс':>14}{'p95, мс':>10}{'ошибок':>8}"
+        )
+        try:
+            for mode in modes:
+                if mode == MODE_WSGI:
+                    timings, statuses, elapsed = self._run_wsgi(paths, options['requests'], options['host'], cookie)
+                else:
+                    timings, statuses, elapsed = self._run_asgi(
+                        paths, options['requests'], options['concurrency'], options['host'], cookie,
+                    )
+                timings = [value * 1000 for value in timings]
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                errors = sum(1 for status in statuses if status != 200)
+                self.stdout.write(
+                    f"{mode:<8}{len(timings) / elapsed:>12.1f}{statistics.median(timings):>14.2f}"
+                    f"{p95:>10.2f}{errors:>8}"
+                )
+        finally:
+            connection_created.disconnect(add_latency)
+            login.logout()
+            user.delete()
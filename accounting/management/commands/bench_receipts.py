@@ -0,0 +1,71 @@
+import statistics
+import time
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+from accounting.receipt_engine import (
+    KIND_ADJUSTMENT, KIND_DEPOSIT, KIND_SESSION, receipt_data, render_escpos, render_pdf,
+)
+
+
+def _sample_records():
+    """Операции в памяти: замер не зависит от БД"""
+    client = SimpleNamespace(full_name="Şəhla Çələbi", balance=Decimal('120.00'))
+    user = SimpleNamespace(username='leyla', get_full_name=lambda: "Leyla Həsənova")
+    date_time = datetime(2026, 1, 15, 14, 30)
+    return {
+        KIND_SESSION: SimpleNamespace(
+            id=1024, date_time=date_time, client=client, worker=SimpleNamespace(user=user),
+            amount=Decimal('25.00'), lessons_count=1, balance_after=Decimal('95.00'),
+        ),
+        KIND_DEPOSIT: SimpleNamespace(
+            id=512, date_time=date_time, client=client, amount=Decimal('100.00'),
+            balance_after=Decimal('220.00'),
+        ),
+        KIND_ADJUSTMENT: SimpleNamespace(
+            id=64, date_time=date_time, client=client, amount_removed=Decimal('10.00'),
+            lessons_removed=0, balance_after=Decimal('110.00'),
+        ),
+    }
+
+
+def _legacy_style_setup():
+    # Что раньше выполнялось при каждом вызове generate_pdf_receipt
+    styles = getSampleStyleSheet()
+    for name, parent in (('T', 'Heading1'), ('N', 'Normal'), ('C', 'Normal')):
+        ParagraphStyle(name, parent=styles[parent], fontSize=10)
+
+
+class Command(BaseCommand):
+    help = "Микро-бенчмарк движка чеков: стоимость одного чека в PDF и ESC/POS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="Чеков каждого типа")
+
+    def _measure(self, func, iterations):
+        func()  # прогрев
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), statistics.mean(timings)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(f"{'чек':<12}{'формат':<8}{'медиана, мс':>14}{'среднее, мс':>14}{'байт':>8}")
+        for kind, record in _sample_records().items():
+            data = receipt_data(kind, record)
+            for label, render in (('pdf', render_pdf), ('escpos', render_escpos)):
+                size = len(render(kind, data))
+                median, mean = self._measure(lambda: render(kind, data), iterations)
+                self.stdout.write(f"{kind:<12}{label:<8}{median:>14.3f}{mean:>14.3f}{size:>8}")
+
+        median, mean = self._measure(_legacy_style_setup, iterations)
+        self.stdout.write(
+            f"Создание стилей при каждом вызове (как было раньше): медиана {median:.3f} мс, среднее {mean:.3f} мс"
+        )
@@ -0,0 +1,153 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Тяжелые зависимости, которые настольная версия загружает только при первом чеке/отчете
+LAZY_MODULES = ('reportlab', 'escpos', 'PIL')
+
+# Граница между запуском и первым запросом в выводе -X importtime
+_MARKER = '--- bench_startup: ready ---'
+
+# Дочерний процесс: запуск Django и импорт URL-ов (все представления), затем первая главная страница
+_PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+setup = time.perf_counter() - started
+sys.stderr.write(%(marker)r + "\n")
+sys.stderr.flush()
+from django.contrib.auth import get_user_model
+from django.test import Client
+client = Client()
+client.force_login(get_user_model().objects.get(pk=int(sys.argv[1])))
+response = client.get(sys.argv[2], HTTP_HOST=sys.argv[3], secure=True)
+dashboard = time.perf_counter() - started
+print(json.dumps({"setup": setup, "dashboard": dashboard, "status": response.status_code}))
+''' % {'marker': _MARKER}
+
+
+def _parse_importtime(stderr):
+    """
+    Разбирает вывод python -X importtime до метки готовности:
+    [(модуль, собственное время мкс, с вложенными мкс, уровень вложенности), ...]
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if line == _MARKER:
+            break
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            continue  # заголовок таблицы
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Время запуска в отдельных процессах (python -X importtime): запуск Django с импортом "
+        "представлений и первая главная страница. Медианы сравниваются с бюджетом; при "
+        "превышении или загрузке ReportLab/escpos/Pillow при запуске команда завершается с ошибкой."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Запусков (берется медиана)")
+        parser.add_argument(
+            '--budget-ms', type=float, default=1500,
+            help="Бюджет холодного запуска: процесс до загрузки Django и представлений, мс",
+        )
+        parser.add_argument(
+            '--dashboard-budget-ms', type=float, default=3000,
+            help="Бюджет до первой отрисовки главной страницы, мс",
+        )
+        parser.add_argument('--path', default='/dashboard/', help="Первая страница")
+        parser.add_argument('--host', default='localhost', help="Значение Host (из ALLOWED_HOSTS)")
+        parser.add_argument('--top', type=int, default=10, help="Сколько самых долгих импортов показать")
+        parser.add_argument(
+            '--web', action='store_true',
+            help="Настройки веб-сервера (без FLEKS_DESKTOP): PDF загружается при запуске, проверка LAZY_MODULES не выполняется",
+        )
+
+    def _run_probe(self, user_id, path, host, env):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', _PROBE, str(user_id), path, host],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, env=env,
+        )
+        process = time.perf_counter() - started
+        if result.returncode != 0:
+            raise CommandError(f"Дочерний процесс завершился с ошибкой:\n{result.stderr[-2000:]}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        return process, timings, _parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs должно быть больше нуля")
+
+        env = dict(os.environ)
+        if options['web']:
+            env.pop('FLEKS_DESKTOP', None)
+        else:
+            env['FLEKS_DESKTOP'] = '1'
+
+        # Временный сотрудник: главная страница доступна только персоналу
+        user = get_user_model().objects.create_user(
+            username=f'bench-{uuid.uuid4().hex[:8]}', is_staff=True,
+        )
+        setups, dashboards, cold_starts = [], [], []
+        try:
+            for _ in range(options['runs']):
+                process, timings, imports = self._run_probe(user.pk, options['path'], options['host'], env)
+                if timings['status'] != 200:
+                    raise CommandError(f"{options['path']} ответил {timings['status']}")
+                setups.append(timings['setup'] * 1000)
+                dashboards.append(timings['dashboard'] * 1000)
+                # Запуск интерпретатора + запуск Django: процесс целиком без первого запроса
+                cold_starts.append((process - timings['dashboard'] + timings['setup']) * 1000)
+        finally:
+            user.delete()
+
+        cold_start = statistics.median(cold_starts)
+        dashboard = statistics.median(dashboards)
+        self.stdout.write(f"Запусков: {options['runs']}, режим: {'веб-сервер' if options['web'] else 'настольная версия'}")
+        self.stdout.write(f"{'этап':<36}{'медиана, мс':>14}{'бюджет, мс':>12}")
+        self.stdout.write(f"{'холодный запуск (процесс)':<36}{cold_start:>14.0f}{options['budget_ms']:>12.0f}")
+        self.stdout.write(f"{'  из них django.setup() и URL-ы':<36}{statistics.median(setups):>14.0f}{'':>12}")
+        self.stdout.write(
+            f"{'первая главная страница':<36}{dashboard:>14.0f}{options['dashboard_budget_ms']:>12.0f}"
+        )
+
+        # Самые долгие импорты верхнего уровня последнего запуска
+        self.stdout.write(f"\n{'импорт при запуске':<48}{'мс':>8}")
+        top_level = sorted((item for item in imports if item[3] == 0), key=lambda item: item[2], reverse=True)
+        for name, _self_us, cumulative_us, _depth in top_level[:options['top']]:
+            self.stdout.write(f"{name:<48}{cumulative_us / 1000:>8.1f}")
+
+        problems = []
+        if cold_start > options['budget_ms']:
+            problems.append(f"холодный запуск {cold_start:.0f} мс > {options['budget_ms']:.0f} мс")
+        if dashboard > options['dashboard_budget_ms']:
+            problems.append(f"первая страница {dashboard:.0f} мс > {options['dashboard_budget_ms']:.0f} мс")
+        if not options['web']:
+            eager = sorted({
+                name.split('.')[0] for name, *_rest in imports if name.split('.')[0] in LAZY_MODULES
+            })
+            if eager:
+                problems.append(f"при запуске загружаются {', '.join(eager)} (должны загружаться при первом чеке)")
+        if problems:
+            raise CommandError("Бюджет запуска превышен: " + "; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Запуск укладывается в бюджет"))
@@ -0,0 +1,87 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounting.models import Transaction, ClientDeposit, ClientBalanceAdjustment
+from accounting.operations import filter_by_period, operations_union
+
+
+TRANSACTION_TABLE = Transaction._meta.db_table
+DEPOSIT_TABLE = ClientDeposit._meta.db_table
+ADJUSTMENT_TABLE = ClientBalanceAdjustment._meta.db_table
+
+
+def _explain(queryset):
+    """
+    План запроса. На PostgreSQL последовательное сканирование запрещается,
+    иначе на маленьких таблицах планировщик выберет его даже при наличии индекса:
+    проверяем, что индекс вообще может обслужить запрос.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.explain()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def _full_scans(plan, tables):
+    """Таблицы, которые читаются целиком"""
+    scanned = []
+    for table in tables:
+        if connection.vendor == 'postgresql':
+            pattern = rf'Seq Scan on {table}\b'
+        else:
+            # SQLite: "SCAN table" без индекса, "SEARCH table USING INDEX ..." с индексом
+            pattern = rf'\bSCAN (TABLE )?{table}\b(?! USING)'
+        if re.search(pattern, plan):
+            scanned.append(table)
+    return scanned
+
+
+class Command(BaseCommand):
+    help = "Проверяет через EXPLAIN, что запросы отчетов по периоду используют индексы по date_time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Длина проверяемого периода в днях")
+
+    def handle(self, *args, **options):
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=options['days'])
+
+        transactions_qs = filter_by_period(Transaction.objects.all(), start_date, end_date)
+        deposits_qs = filter_by_period(ClientDeposit.objects.all(), start_date, end_date)
+        adjustments_qs = filter_by_period(ClientBalanceAdjustment.objects.all(), start_date, end_date)
+
+        checks = [
+            ("Сеансы за период", transactions_qs.order_by('-date_time'), [TRANSACTION_TABLE]),
+            ("Сеансы клиента за период", transactions_qs.filter(client_id=0), [TRANSACTION_TABLE]),
+            ("Сеансы сотрудника за период", transactions_qs.filter(worker_id=0), [TRANSACTION_TABLE]),
+            ("Пополнения за период", deposits_qs.order_by('-date_time'), [DEPOSIT_TABLE]),
+            ("Пополнения клиента за период", deposits_qs.filter(client_id=0), [DEPOSIT_TABLE]),
+            ("Отмены пополнений за период", adjustments_qs.order_by('-date_time'), [ADJUSTMENT_TABLE]),
+            ("Отмены пополнений клиента за период", adjustments_qs.filter(client_id=0), [ADJUSTMENT_TABLE]),
+            (
+                "Страница журнала операций",
+                operations_union(transactions_qs, deposits_qs, adjustments_qs)[:100],
+                [TRANSACTION_TABLE, DEPOSIT_TABLE, ADJUSTMENT_TABLE],
+            ),
+        ]
+
+        failures = []
+        for label, queryset, tables in checks:
+            plan = _explain(queryset)
+            scanned = _full_scans(plan, tables)
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"--- {label}\n{plan}")
+            if scanned:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"{label}: полное сканирование {', '.join(scanned)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{label}: используется индекс"))
+
+        if failures:
+            raise CommandError(f"Запросы без индекса: {len(failures)}. Выполните: python manage.py migrate")
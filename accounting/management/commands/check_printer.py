@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounting.printer import TARGET_FILE, TARGET_NETWORK, PrinterManager
+
+
+def _write_test_page(printer):
+    printer.set(align='center', font='a', width=1, height=2)
+    printer.text("FLEKS\n")
+    printer.set(align='left', font='a', width=1, height=1)
+    printer.text(f"Test: {timezone.localtime().strftime('%d.%m.%Y %H:%M:%S')}\n")
+    printer.text("─" * 32 + "\n\n")
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает, какой принтер найден, и печатает тестовые чеки через менеджер принтера. "
+        "--path/--host позволяют проверить работу на файле или сокете-заглушке."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help="Печатать в этот файл/устройство вместо найденного принтера")
+        parser.add_argument('--host', help="Печатать на сетевой принтер (или сокет-заглушку) по этому адресу")
+        parser.add_argument('--port', type=int, default=9100, help="Порт сетевого принтера")
+        parser.add_argument('--count', type=int, default=1, help="Сколько тестовых чеков напечатать (0 - только показать принтер)")
+
+    def handle(self, *args, **options):
+        if options['path']:
+            manager = PrinterManager(target=(TARGET_FILE, options['path']))
+        elif options['host']:
+            manager = PrinterManager(target=(TARGET_NETWORK, (options['host'], options['port'])))
+        else:
+            manager = PrinterManager()
+
+        status = manager.status()
+        self.stdout.write(f"Принтер: {status['target']}")
+
+        printed = 0
+        for number in range(options['count']):
+            if manager.print_receipt(_write_test_page, f'test_{number + 1}.txt'):
+                printed += 1
+        status = manager.status()
+        self.stdout.write(f"Состояние: {status['state']}, напечатано: {printed} из {options['count']}")
+        if printed < options['count']:
+            raise CommandError(f"Ошибка печати: {status['last_error'] or 'принтер недоступен'}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from accounting import schema
+
+
+class Command(BaseCommand):
+    help = "Заново проверяет схему БД и выводит реестр возможностей (например, новые поля клиента)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        capabilities = schema.refresh(using=options['database'])
+        for name, enabled in sorted(capabilities.items()):
+            style = self.style.SUCCESS if enabled else self.style.WARNING
+            self.stdout.write(style(f"{name}: {'да' if enabled else 'нет'}"))
+        if not capabilities.get('new_client_fields'):
+            self.stdout.write("Выполните: python manage.py migrate")
@@ -0,0 +1,55 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.receipt_archive import (
+    ARCHIVE_FORMAT_ZIP, ARCHIVE_FORMATS, archive_querysets, archive_workers, count_receipts,
+    iter_rendered_receipts, stream_zip, write_multipage_pdf,
+)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Неверная дата {value!r}, ожидается YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Сохраняет все чеки за период (сеансы, пополнения, отмены пополнений) в ZIP или один PDF"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Файл результата (.zip или .pdf)")
+        parser.add_argument('--start', required=True, help="Первый день периода, YYYY-MM-DD")
+        parser.add_argument('--end', required=True, help="Последний день периода, YYYY-MM-DD")
+        parser.add_argument('--client', type=int, help="Только операции клиента с этим id")
+        parser.add_argument('--worker', type=int, help="Только сеансы сотрудника с этим id")
+        parser.add_argument('--format', choices=ARCHIVE_FORMATS, default=ARCHIVE_FORMAT_ZIP)
+        parser.add_argument('--workers', type=int, help="Процессов для генерации (по умолчанию по числу ядер)")
+
+    def handle(self, *args, **options):
+        start_date = _parse_date(options['start'])
+        end_date = _parse_date(options['end'])
+        if start_date > end_date:
+            raise CommandError("Начало периода позже конца")
+
+        querysets = archive_querysets(start_date, end_date, options['client'], options['worker'])
+        total = count_receipts(querysets)
+        workers = options['workers'] or archive_workers()
+        self.stdout.write(f"Чеков: {total}, процессов: {workers}")
+        started = time.perf_counter()
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{total}")
+
+        with open(options['output'], 'wb') as output:
+            if options['format'] == ARCHIVE_FORMAT_ZIP:
+                rendered = iter_rendered_receipts(querysets, workers=workers, progress=progress)
+                for block in stream_zip(rendered):
+                    output.write(block)
+            else:
+                write_multipage_pdf(querysets, output)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Готово: {options['output']} ({total} чеков за {elapsed:.1f} с)"))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounting.print_queue import POLL_INTERVAL, drain
+
+
+class Command(BaseCommand):
+    help = "Печатает чеки из очереди печати (PrintJob); без --once работает постоянно"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Обработать готовые задания и выйти")
+        parser.add_argument(
+            '--interval', type=float, default=POLL_INTERVAL,
+            help="Пауза между проверками очереди в секундах",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = drain()
+            if processed or options['once']:
+                self.stdout.write(f"Обработано заданий печати: {processed}")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
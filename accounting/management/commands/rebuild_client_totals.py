@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.ledger import check_client_totals, rebuild_client_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает итоги клиентов за все время (потрачено, пополнено, отменено, сеансы, последний визит) "
+        "по сеансам, пополнениям и отменам пополнений. С --check только сверяет итоги с операциями."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Только проверить: вывести расхождения и завершиться с ошибкой, если они есть",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = check_client_totals()
+            for client_id, field, stored, expected in mismatches:
+                self.stdout.write(f"Клиент {client_id}: {field} = {stored}, по операциям {expected}")
+            if mismatches:
+                raise CommandError(
+                    f"Итоги расходятся с операциями ({len(mismatches)}). "
+                    "Запустите: python manage.py rebuild_client_totals"
+                )
+            self.stdout.write(self.style.SUCCESS("Итоги клиентов совпадают с операциями."))
+            return
+
+        changed = rebuild_client_totals()
+        self.stdout.write(self.style.SUCCESS(f"Итоги клиентов пересчитаны: изменено {changed}."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounting.ledger import rebuild_daily_summary
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает таблицу дневных итогов (DailyLedgerSummary) по сеансам, пополнениям и отменам пополнений"
+
+    def handle(self, *args, **options):
+        created = rebuild_daily_summary()
+        self.stdout.write(self.style.SUCCESS(f"Дневные итоги пересчитаны: {created} строк."))
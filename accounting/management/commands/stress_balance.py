@@ -0,0 +1,147 @@
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounting.ledger import InsufficientFunds, credit_balance, debit_balance
+from accounting.models import Client
+
+
+START_BALANCE = Decimal('1000.00')
+STEP = Decimal('1.00')
+
+MODE_UNLOCKED = 'unlocked'
+MODE_LOCKED = 'locked'
+MODE_ATOMIC = 'atomic'
+MODES = (MODE_UNLOCKED, MODE_LOCKED, MODE_ATOMIC)
+
+
+def _unlocked_change(client_id, delta):
+    # Как раньше проводилось пополнение: чтение, изменение в Python, save() без блокировки
+    with transaction.atomic():
+        client = Client.objects.get(id=client_id)
+        if client.balance + delta < 0:
+            return False, 0.0
+        client.balance += delta
+        client.save(update_fields=['balance'])
+        locked_at = time.perf_counter()
+    return True, time.perf_counter() - locked_at
+
+
+def _locked_change(client_id, delta):
+    # Как раньше проводился сеанс: SELECT FOR UPDATE, изменение в Python, save()
+    with transaction.atomic():
+        client = Client.objects.select_for_update().get(id=client_id)
+        locked_at = time.perf_counter()
+        if client.balance + delta < 0:
+            return False, time.perf_counter() - locked_at
+        client.balance += delta
+        client.save(update_fields=['balance'])
+    return True, time.perf_counter() - locked_at
+
+
+def _atomic_change(client_id, delta):
+    # Сервис ledger: один условный UPDATE ... RETURNING
+    with transaction.atomic():
+        try:
+            if delta > 0:
+                credit_balance(client_id, delta)
+            else:
+                debit_balance(client_id, -delta)
+        except InsufficientFunds:
+            return False, 0.0
+        locked_at = time.perf_counter()
+    return True, time.perf_counter() - locked_at
+
+
+CHANGES = {
+    MODE_UNLOCKED: _unlocked_change,
+    MODE_LOCKED: _locked_change,
+    MODE_ATOMIC: _atomic_change,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочная проверка изменения баланса из нескольких потоков: потерянные обновления "
+        "и время удержания блокировки строки клиента для старого способа (чтение + save) и сервиса ledger. "
+        "Создает временного клиента и удаляет его после проверки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Количество параллельных потоков")
+        parser.add_argument('--operations', type=int, default=200, help="Операций на поток")
+        parser.add_argument('--mode', choices=MODES, action='append', help="Проверяемый способ (по умолчанию все)")
+
+    def _run(self, client_id, change, threads, operations):
+        results = []
+        lock = threading.Lock()
+
+        def worker(number):
+            local = {'credited': Decimal('0.00'), 'debited': Decimal('0.00'), 'errors': 0, 'holds': []}
+            try:
+                for index in range(operations):
+                    # Потоки чередуют зачисления и списания одинаковой суммы
+                    delta = STEP if (number + index) % 2 == 0 else -STEP
+                    try:
+                        applied, hold = change(client_id, delta)
+                    except Exception:
+                        local['errors'] += 1
+                        continue
+                    if applied:
+                        local['holds'].append(hold)
+                        if delta > 0:
+                            local['credited'] += delta
+                        else:
+                            local['debited'] -= delta
+            finally:
+                connection.close()
+            with lock:
+                results.append(local)
+
+        pool = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        credited = sum((item['credited'] for item in results), Decimal('0.00'))
+        debited = sum((item['debited'] for item in results), Decimal('0.00'))
+        holds = [hold * 1000 for item in results for hold in item['holds']]
+        return {
+            'expected': START_BALANCE + credited - debited,
+            'applied': len(holds),
+            'errors': sum(item['errors'] for item in results),
+            'elapsed': elapsed,
+            'hold_median': statistics.median(holds) if holds else 0.0,
+            'hold_p95': statistics.quantiles(holds, n=20)[-1] if len(holds) > 1 else 0.0,
+        }
+
+    def handle(self, *args, **options):
+        modes = options['mode'] or list(MODES)
+        client = Client.objects.create(full_name=f"stress-test {uuid.uuid4().hex[:8]}", balance=START_BALANCE)
+        self.stdout.write(
+            f"{'способ':<10}{'операций':>10}{'ошибок':>8}{'потеряно, AZN':>15}"
+            f"{'блокировка медиана, мс':>24}{'p95, мс':>10}{'операций/с':>12}"
+        )
+        try:
+            for mode in modes:
+                Client.objects.filter(id=client.id).update(balance=START_BALANCE)
+                stats = self._run(client.id, CHANGES[mode], options['threads'], options['operations'])
+                actual = Client.objects.values_list('balance', flat=True).get(id=client.id)
+                lost = stats['expected'] - Decimal(str(actual))
+                throughput = stats['applied'] / stats['elapsed'] if stats['elapsed'] else 0.0
+                self.stdout.write(
+                    f"{mode:<10}{stats['applied']:>10}{stats['errors']:>8}{lost:>15}"
+                    f"{stats['hold_median']:>24.3f}{stats['hold_p95']:>10.3f}{throughput:>12.1f}"
+                )
+                if mode == MODE_ATOMIC and lost:
+                    self.stderr.write(self.style.ERROR("Сервис ledger потерял обновления баланса"))
+        finally:
+            client.delete()
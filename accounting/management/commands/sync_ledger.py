@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.sync import PULL_DAYS, SYNC_BATCH_SIZE, SYNC_INTERVAL, SyncError, pull, sync_enabled, sync_once
+
+
+class Command(BaseCommand):
+    help = (
+        "Отправляет операции из локальной базы настольной версии (FLEKS_LOCAL_DB) в центральную БД "
+        "(DATABASE_URL); без --once работает постоянно. --pull - первичная загрузка данных из центральной БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Отправить очередь и выйти")
+        parser.add_argument(
+            '--interval', type=float, default=getattr(settings, 'LEDGER_SYNC_INTERVAL', SYNC_INTERVAL),
+            help="Пауза между отправками в секундах",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'LEDGER_SYNC_BATCH_SIZE', SYNC_BATCH_SIZE),
+            help="Записей в одной транзакции центральной БД",
+        )
+        parser.add_argument(
+            '--pull', action='store_true',
+            help="Заменить данные локальной базы копией центральной (только при пустой очереди)",
+        )
+        parser.add_argument('--days', type=int, default=PULL_DAYS, help="Операции за сколько дней копировать при --pull")
+
+    def handle(self, *args, **options):
+        if not sync_enabled():
+            raise CommandError("Синхронизация выключена: нужны FLEKS_LOCAL_DB и DATABASE_URL центральной БД")
+
+        if options['pull']:
+            try:
+                counts = pull(days=options['days'])
+            except SyncError as e:
+                raise CommandError(str(e))
+            for model, count in counts.items():
+                self.stdout.write(f"{model._meta.verbose_name_plural}: {count}")
+            return
+
+        while True:
+            processed = sync_once(options['batch_size'])
+            if processed is None:
+                self.stderr.write("Центральная БД недоступна")
+            elif processed or options['once']:
+                self.stdout.write(f"Отправлено записей: {processed}")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
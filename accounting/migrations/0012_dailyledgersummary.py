@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_summary(apps, schema_editor):
+    """
+    Копия accounting.ledger.rebuild_daily_summary на момент этой миграции:
+    правила подсчета в ledger.py могут меняться, а миграция должна давать прежний результат.
+    """
+    Summary = apps.get_model("accounting", "DailyLedgerSummary")
+    Transaction = apps.get_model("accounting", "Transaction")
+    ClientDeposit = apps.get_model("accounting", "ClientDeposit")
+    ClientBalanceAdjustment = apps.get_model("accounting", "ClientBalanceAdjustment")
+
+    rows = {}
+
+    def row_for(day, worker_id, client_type):
+        key = (day, worker_id, client_type)
+        if key not in rows:
+            rows[key] = Summary(date=day, worker_id=worker_id, client_type=client_type)
+        return rows[key]
+
+    # TruncDate считает дату в текущем часовом поясе (TIME_ZONE = Asia/Baku)
+    sessions = Transaction.objects.annotate(day=TruncDate("date_time")).values(
+        "day", "worker_id", "client__client_type",
+    ).annotate(count=Count("id"), amount=Sum("amount"), lessons=Sum("lessons_count")).order_by()
+    for item in sessions:
+        row = row_for(item["day"], item["worker_id"], item["client__client_type"])
+        row.sessions_count = item["count"]
+        row.sessions_amount = item["amount"] or Decimal("0.00")
+        row.sessions_lessons = item["lessons"] or 0
+
+    deposits = ClientDeposit.objects.annotate(day=TruncDate("date_time")).values(
+        "day", "client__client_type",
+    ).annotate(count=Count("id"), amount=Sum("amount")).order_by()
+    for item in deposits:
+        row = row_for(item["day"], None, item["client__client_type"])
+        row.deposits_count = item["count"]
+        row.deposits_amount = item["amount"] or Decimal("0.00")
+
+    adjustments = ClientBalanceAdjustment.objects.annotate(day=TruncDate("date_time")).values(
+        "day", "client__client_type",
+    ).annotate(count=Count("id"), amount=Sum("amount_removed")).order_by()
+    for item in adjustments:
+        row = row_for(item["day"], None, item["client__client_type"])
+        row.adjustments_count = item["count"]
+        row.adjustments_amount = item["amount"] or Decimal("0.00")
+
+    Summary.objects.all().delete()
+    Summary.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0011_client_default_session_amount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyLedgerSummary",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "client_type",
+                    models.CharField(
+                        choices=[("child", "Ребенок"), ("teenager", "Подросток"), ("adult", "Взрослый")],
+                        max_length=20,
+                        verbose_name="Тип клиента",
+                    ),
+                ),
+                ("sessions_count", models.PositiveIntegerField(default=0, verbose_name="Количество сеансов")),
+                ("sessions_amount", models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Сумма сеансов")),
+                ("sessions_lessons", models.PositiveIntegerField(default=0, verbose_name="Уроки в сеансах")),
+                ("deposits_count", models.PositiveIntegerField(default=0, verbose_name="Количество пополнений")),
+                ("deposits_amount", models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Сумма пополнений")),
+                ("adjustments_count", models.PositiveIntegerField(default=0, verbose_name="Количество отмен пополнений")),
+                ("adjustments_amount", models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Сумма отмен пополнений")),
+                (
+                    "worker",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=models.deletion.PROTECT,
+                        related_name="daily_summaries",
+                        to="accounting.worker",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Дневные итоги",
+                "verbose_name_plural": "Дневные итоги",
+                "ordering": ["-date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("worker__isnull", False)),
+                        fields=("date", "worker", "client_type"),
+                        name="daily_summary_unique_worker_day",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("worker__isnull", True)),
+                        fields=("date", "client_type"),
+                        name="daily_summary_unique_day",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_daily_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0012_dailyledgersummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["date_time"], name="acc_tx_date_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["client", "date_time"], name="acc_tx_client_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["worker", "date_time"], name="acc_tx_worker_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="clientdeposit",
+            index=models.Index(fields=["date_time"], name="acc_dep_date_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="clientdeposit",
+            index=models.Index(fields=["client", "date_time"], name="acc_dep_client_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="clientbalanceadjustment",
+            index=models.Index(fields=["date_time"], name="acc_adj_date_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="clientbalanceadjustment",
+            index=models.Index(fields=["client", "date_time"], name="acc_adj_client_date_idx"),
+        ),
+    ]
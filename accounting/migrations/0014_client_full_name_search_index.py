@@ -0,0 +1,40 @@
+from django.db import migrations, transaction
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        try:
+            # Расширение может быть недоступно без прав суперпользователя
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            return
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS acc_client_name_trgm_idx "
+            "ON accounting_client USING gin (UPPER(full_name) gin_trgm_ops)"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS acc_client_name_nocase_idx "
+            "ON accounting_client (full_name COLLATE NOCASE)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS acc_client_name_trgm_idx")
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute("DROP INDEX IF EXISTS acc_client_name_nocase_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0013_ledger_date_time_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,96 @@
+import re
+import unicodedata
+from importlib import import_module
+
+from django.db import migrations, models, transaction
+
+
+# Копия accounting.names.normalize_name на момент этой миграции: правила
+# нормализации могут меняться, а миграция должна давать прежний результат
+_CYRILLIC_TO_LATIN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo",
+    "ә": "e", "ж": "j", "з": "z", "и": "i", "ы": "i", "і": "i", "й": "y", "ј": "y",
+    "к": "k", "ҝ": "g", "л": "l", "м": "m", "н": "n", "о": "o", "ө": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ү": "u", "ф": "f", "х": "x", "һ": "h",
+    "ц": "ts", "ч": "c", "ҹ": "c", "ш": "s", "щ": "s", "ъ": "", "ь": "", "э": "e",
+    "ю": "yu", "я": "ya",
+})
+_LATIN_FOLD = str.maketrans({
+    "ə": "e", "ı": "i", "ß": "ss", "ø": "o", "æ": "ae", "đ": "d", "ł": "l",
+})
+_DIGRAPHS = (("sh", "s"), ("ch", "c"), ("zh", "j"), ("kh", "x"))
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(value):
+    if not value:
+        return ""
+    key = value.casefold().translate(_CYRILLIC_TO_LATIN).translate(_LATIN_FOLD)
+    key = "".join(
+        char for char in unicodedata.normalize("NFKD", key)
+        if not unicodedata.combining(char)
+    )
+    for digraph, letter in _DIGRAPHS:
+        key = key.replace(digraph, letter)
+    return _NON_ALNUM.sub(" ", key).strip()
+
+
+def fill_search_name(apps, schema_editor):
+    Client = apps.get_model("accounting", "Client")
+    clients = list(Client.objects.only("id", "full_name"))
+    for client in clients:
+        client.search_name = normalize_name(client.full_name)
+    Client.objects.bulk_update(clients, ["search_name"], batch_size=500)
+
+
+def create_search_name_index(apps, schema_editor):
+    """
+    Поиск по подстроке ключа на PostgreSQL - триграммный индекс по search_name.
+    Индексы по full_name из миграции 0014 больше не используются.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS acc_client_name_trgm_idx")
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            return
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS acc_client_search_trgm_idx "
+            "ON accounting_client USING gin (search_name gin_trgm_ops)"
+        )
+    elif connection.vendor == "sqlite":
+        schema_editor.execute("DROP INDEX IF EXISTS acc_client_name_nocase_idx")
+
+
+def drop_search_name_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS acc_client_search_trgm_idx")
+    previous = import_module("accounting.migrations.0014_client_full_name_search_index")
+    previous.create_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0014_client_full_name_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="search_name",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=200,
+                verbose_name="Ключ поиска",
+            ),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_search_name_index, drop_search_name_index),
+    ]
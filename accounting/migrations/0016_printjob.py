@@ -0,0 +1,33 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0015_client_search_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrintJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("session", "Сеанс"), ("deposit", "Пополнение")], max_length=20, verbose_name="Тип чека")),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="Номер операции")),
+                ("language", models.CharField(blank=True, max_length=10, verbose_name="Язык")),
+                ("status", models.CharField(choices=[("pending", "Ожидает печати"), ("done", "Напечатан"), ("failed", "Ошибка печати")], default="pending", max_length=20, verbose_name="Статус")),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="Попыток")),
+                ("last_error", models.TextField(blank=True, verbose_name="Последняя ошибка")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                ("available_at", models.DateTimeField(default=django.utils.timezone.now, verbose_name="Доступно с")),
+                ("printed_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата печати")),
+            ],
+            options={
+                "verbose_name": "Задание печати",
+                "verbose_name_plural": "Задания печати",
+                "ordering": ["-created_at"],
+                "indexes": [models.Index(fields=["status", "available_at"], name="acc_print_job_queue_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def fill_client_totals(apps, schema_editor):
+    """
+    Копия accounting.ledger.rebuild_client_totals на момент этой миграции:
+    правила подсчета в ledger.py могут меняться, а миграция должна давать прежний результат.
+    """
+    Client = apps.get_model("accounting", "Client")
+    Transaction = apps.get_model("accounting", "Transaction")
+    ClientDeposit = apps.get_model("accounting", "ClientDeposit")
+    ClientBalanceAdjustment = apps.get_model("accounting", "ClientBalanceAdjustment")
+
+    totals = {}
+
+    def totals_for(client_id):
+        if client_id not in totals:
+            totals[client_id] = {}
+        return totals[client_id]
+
+    sessions = Transaction.objects.values("client_id").annotate(
+        count=Count("id"), amount=Sum("amount"), last_visit=Max("date_time"),
+    ).order_by()
+    for item in sessions:
+        row = totals_for(item["client_id"])
+        row["total_spent"] = item["amount"] or Decimal("0.00")
+        row["total_sessions"] = item["count"]
+        row["last_visit_at"] = item["last_visit"]
+
+    deposits = ClientDeposit.objects.values("client_id").annotate(amount=Sum("amount")).order_by()
+    for item in deposits:
+        totals_for(item["client_id"])["total_deposited"] = item["amount"] or Decimal("0.00")
+
+    adjustments = ClientBalanceAdjustment.objects.values("client_id").annotate(
+        amount=Sum("amount_removed"),
+    ).order_by()
+    for item in adjustments:
+        totals_for(item["client_id"])["total_adjusted"] = item["amount"] or Decimal("0.00")
+
+    # Новые поля только что добавлены со значениями по умолчанию: обновляются клиенты с операциями
+    fields = ["total_spent", "total_deposited", "total_adjusted", "total_sessions", "last_visit_at"]
+    clients = list(Client.objects.filter(pk__in=list(totals)).only("id", *fields))
+    for client in clients:
+        for field, value in totals[client.pk].items():
+            setattr(client, field, value)
+    Client.objects.bulk_update(clients, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0016_printjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="total_spent",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14, verbose_name="Потрачено всего"
+            ),
+        ),
+        migrations.AddField(
+            model_name="client",
+            name="total_deposited",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14, verbose_name="Пополнено всего"
+            ),
+        ),
+        migrations.AddField(
+            model_name="client",
+            name="total_adjusted",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14, verbose_name="Отменено пополнений всего"
+            ),
+        ),
+        migrations.AddField(
+            model_name="client",
+            name="total_sessions",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Сеансов всего"),
+        ),
+        migrations.AddField(
+            model_name="client",
+            name="last_visit_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name="Последний визит"),
+        ),
+        migrations.RunPython(fill_client_totals, migrations.RunPython.noop),
+    ]
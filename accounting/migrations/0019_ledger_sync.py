@@ -0,0 +1,58 @@
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0018_client_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="sync_uid",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name="Ключ синхронизации"),
+        ),
+        migrations.AddField(
+            model_name="clientbalanceadjustment",
+            name="sync_uid",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name="Ключ синхронизации"),
+        ),
+        migrations.AddField(
+            model_name="clientdeposit",
+            name="sync_uid",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name="Ключ синхронизации"),
+        ),
+        migrations.AddField(
+            model_name="transaction",
+            name="sync_uid",
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name="Ключ синхронизации"),
+        ),
+        migrations.CreateModel(
+            name="LedgerSyncItem",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("uid", models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name="Ключ")),
+                ("kind", models.CharField(choices=[("client", "Новый клиент"), ("session", "Сеанс"), ("deposit", "Пополнение"), ("adjustment", "Отмена пополнения")], max_length=20, verbose_name="Тип")),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="Номер записи")),
+                ("client_id_local", models.PositiveBigIntegerField(verbose_name="Клиент (локальный номер)")),
+                ("balance_delta", models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name="Изменение баланса")),
+                ("status", models.CharField(choices=[("pending", "Ожидает отправки"), ("done", "Отправлено"), ("conflict", "Отправлено с конфликтом"), ("failed", "Ошибка")], default="pending", max_length=20, verbose_name="Статус")),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="Попыток")),
+                ("last_error", models.TextField(blank=True, verbose_name="Последняя ошибка или конфликт")),
+                ("central_id", models.PositiveBigIntegerField(blank=True, null=True, verbose_name="Номер в центральной БД")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                ("synced_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата отправки")),
+            ],
+            options={
+                "verbose_name": "Запись для синхронизации",
+                "verbose_name_plural": "Записи для синхронизации",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(fields=["status", "id"], name="acc_sync_queue_idx"),
+                    models.Index(fields=["kind", "object_id"], name="acc_sync_object_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0019_ledger_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clientbalanceadjustment',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='balance_adjustments', to='accounting.client'),
+        ),
+        migrations.AlterField(
+            model_name='clientdeposit',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='deposits', to='accounting.client'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+import re
+import unicodedata
+from importlib import import_module
+
+from django.db import migrations
+
+
+# Копия accounting.names.normalize_name на момент этой миграции:
+# азербайджанская ə (кириллическая ә) сводится к a, а не к e
+_CYRILLIC_TO_LATIN = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo",
+    "ә": "a", "ж": "j", "з": "z", "и": "i", "ы": "i", "і": "i", "й": "y", "ј": "y",
+    "к": "k", "ҝ": "g", "л": "l", "м": "m", "н": "n", "о": "o", "ө": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ү": "u", "ф": "f", "х": "x", "һ": "h",
+    "ц": "ts", "ч": "c", "ҹ": "c", "ш": "s", "щ": "s", "ъ": "", "ь": "", "э": "e",
+    "ю": "yu", "я": "ya",
+})
+_LATIN_FOLD = str.maketrans({
+    "ə": "a", "ı": "i", "ß": "ss", "ø": "o", "æ": "ae", "đ": "d", "ł": "l",
+})
+_DIGRAPHS = (("sh", "s"), ("ch", "c"), ("zh", "j"), ("kh", "x"))
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(value):
+    if not value:
+        return ""
+    key = value.casefold().translate(_CYRILLIC_TO_LATIN).translate(_LATIN_FOLD)
+    key = "".join(
+        char for char in unicodedata.normalize("NFKD", key)
+        if not unicodedata.combining(char)
+    )
+    for digraph, letter in _DIGRAPHS:
+        key = key.replace(digraph, letter)
+    return _NON_ALNUM.sub(" ", key).strip()
+
+
+def _refill(apps, normalize):
+    Client = apps.get_model("accounting", "Client")
+    changed = []
+    for client in Client.objects.only("id", "full_name", "search_name").iterator(chunk_size=1000):
+        search_name = normalize(client.full_name)
+        if search_name != client.search_name:
+            client.search_name = search_name
+            changed.append(client)
+    Client.objects.bulk_update(changed, ["search_name"], batch_size=500)
+
+
+def refill_search_name(apps, schema_editor):
+    _refill(apps, normalize_name)
+
+
+def restore_search_name(apps, schema_editor):
+    previous = import_module("accounting.migrations.0015_client_search_name")
+    _refill(apps, previous.normalize_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0020_protect_client_operations"),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_search_name, restore_search_name),
+    ]
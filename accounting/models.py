@@ -1,5 +1,10 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .names import normalize_name
 
 
 class Client(models.Model):
@@ -18,6 +23,16 @@ class Client(models.Model):
     )
 
     full_name = models.CharField(max_length=200, verbose_name="ФИО")
+
+    # Нормализованное имя (accounting/names.py) для поиска и проверки дубликатов
+    search_name = models.CharField(
+        max_length=200,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        verbose_name="Ключ поиска"
+    )
     
     date_of_birth = models.DateField(null=True, blank=True, verbose_name="Дата рождения")
     
@@ -61,12 +76,51 @@ class Client(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, null=True, verbose_name="Дата обновления")
 
+    # Итоги за все время. Меняются только в accounting/ledger.py (в транзакции операции),
+    # пересчет: python manage.py rebuild_client_totals
+    total_spent = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False, verbose_name="Потрачено всего"
+    )
+    total_deposited = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False, verbose_name="Пополнено всего"
+    )
+    total_adjusted = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False, verbose_name="Отменено пополнений всего"
+    )
+    total_sessions = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сеансов всего")
+    last_visit_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Последний визит")
+
+    # Ключ клиента, созданного в локальной базе настольной версии (accounting/sync.py)
+    sync_uid = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name="Ключ синхронизации")
+
+    LIFETIME_TOTAL_FIELDS = ('total_spent', 'total_deposited', 'total_adjusted', 'total_sessions', 'last_visit_at')
+
     def __str__(self):
         return self.full_name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.full_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'full_name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # Обычное сохранение не должно перезаписывать итоги устаревшими значениями из памяти
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.LIFETIME_TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Клиент"
         verbose_name_plural = "Клиенты"
+        # Сортировки списка клиентов с keyset-пагинацией (accounting/clients.py)
+        indexes = [
+            models.Index(fields=['full_name', 'id'], name='acc_client_name_id_idx'),
+            models.Index(fields=['balance', 'id'], name='acc_client_balance_idx'),
+            models.Index(fields=['last_visit_at', 'id'], name='acc_client_last_visit_idx'),
+            models.Index(fields=['created_at', 'id'], name='acc_client_created_idx'),
+        ]
 
 
 class Worker(models.Model):
@@ -127,6 +181,9 @@ class Transaction(models.Model):
 
     receipt_printed = models.BooleanField(default=False)
 
+    # Ключ операции, перенесенной из локальной базы настольной версии (accounting/sync.py)
+    sync_uid = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name="Ключ синхронизации")
+
     def __str__(self):
         return f"Сеанс {self.client.full_name} с {self.worker.user.username} на {self.amount}"
 
@@ -134,10 +191,17 @@ class Transaction(models.Model):
         verbose_name = "Транзакция/Сеанс"
         verbose_name_plural = "Транзакции/Сеансы"
         ordering = ['-date_time']
+        indexes = [
+            # Отчеты фильтруют по периоду, клиенту и сотруднику
+            models.Index(fields=['date_time'], name='acc_tx_date_time_idx'),
+            models.Index(fields=['client', 'date_time'], name='acc_tx_client_date_idx'),
+            models.Index(fields=['worker', 'date_time'], name='acc_tx_worker_date_idx'),
+        ]
 
 
 class ClientDeposit(models.Model):
-    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='deposits')
+    # Операции не удаляются вместе с клиентом: иначе дневные итоги и итоги клиента разойдутся с журналом
+    client = models.ForeignKey(Client, on_delete=models.PROTECT, related_name='deposits')
     amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Сумма пополнения")
     date_time = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время")
 
@@ -160,6 +224,9 @@ class ClientDeposit(models.Model):
         verbose_name="Lessons balance after"
     )
 
+    # Ключ операции, перенесенной из локальной базы настольной версии (accounting/sync.py)
+    sync_uid = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name="Ключ синхронизации")
+
     def __str__(self):
         return f"Пополнение {self.client.full_name} на {self.amount}"
 
@@ -167,10 +234,14 @@ class ClientDeposit(models.Model):
         verbose_name = "Пополнение клиента"
         verbose_name_plural = "Пополнения клиентов"
         ordering = ['-date_time']
+        indexes = [
+            models.Index(fields=['date_time'], name='acc_dep_date_time_idx'),
+            models.Index(fields=['client', 'date_time'], name='acc_dep_client_date_idx'),
+        ]
 
 
 class ClientBalanceAdjustment(models.Model):
-    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='balance_adjustments')
+    client = models.ForeignKey(Client, on_delete=models.PROTECT, related_name='balance_adjustments')
     amount_removed = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Списанная сумма")
     lessons_removed = models.PositiveIntegerField(default=0, verbose_name="Списанные уроки")
     date_time = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время")
@@ -188,6 +259,9 @@ class ClientBalanceAdjustment(models.Model):
         verbose_name="Lessons balance after"
     )
 
+    # Ключ операции, перенесенной из локальной базы настольной версии (accounting/sync.py)
+    sync_uid = models.UUIDField(null=True, blank=True, unique=True, editable=False, verbose_name="Ключ синхронизации")
+
     def __str__(self):
         return f"Отмена пополнения {self.client.full_name} на {self.amount_removed}"
 
@@ -195,3 +269,176 @@ class ClientBalanceAdjustment(models.Model):
         verbose_name = "Отмена пополнения"
         verbose_name_plural = "Отмены пополнений"
         ordering = ['-date_time']
+        indexes = [
+            models.Index(fields=['date_time'], name='acc_adj_date_time_idx'),
+            models.Index(fields=['client', 'date_time'], name='acc_adj_client_date_idx'),
+        ]
+
+
+class DailyLedgerSummary(models.Model):
+    """
+    Дневные итоги по операциям (дата по Asia/Baku, сотрудник, тип клиента).
+    Обновляется в той же транзакции, что и запись сеанса/пополнения/отмены,
+    чтобы итоги отчетов не пересчитывались по сырым таблицам.
+    """
+    date = models.DateField(verbose_name="Дата")
+    # У пополнений и отмен пополнений нет сотрудника
+    worker = models.ForeignKey(
+        Worker,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='daily_summaries'
+    )
+    client_type = models.CharField(
+        max_length=20,
+        choices=Client.CLIENT_TYPE_CHOICES,
+        verbose_name="Тип клиента"
+    )
+
+    sessions_count = models.PositiveIntegerField(default=0, verbose_name="Количество сеансов")
+    sessions_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Сумма сеансов")
+    sessions_lessons = models.PositiveIntegerField(default=0, verbose_name="Уроки в сеансах")
+
+    deposits_count = models.PositiveIntegerField(default=0, verbose_name="Количество пополнений")
+    deposits_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Сумма пополнений")
+
+    adjustments_count = models.PositiveIntegerField(default=0, verbose_name="Количество отмен пополнений")
+    adjustments_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Сумма отмен пополнений")
+
+    def __str__(self):
+        return f"Итоги {self.date} ({self.worker or '-'}, {self.client_type})"
+
+    class Meta:
+        verbose_name = "Дневные итоги"
+        verbose_name_plural = "Дневные итоги"
+        ordering = ['-date']
+        constraints = [
+            # NULL в worker не участвует в обычном уникальном ключе,
+            # поэтому строки без сотрудника ограничиваем отдельно
+            models.UniqueConstraint(
+                fields=['date', 'worker', 'client_type'],
+                condition=models.Q(worker__isnull=False),
+                name='daily_summary_unique_worker_day',
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'client_type'],
+                condition=models.Q(worker__isnull=True),
+                name='daily_summary_unique_day',
+            ),
+        ]
+
+
+class PrintJob(models.Model):
+    """
+    Задание на печать чека (outbox). Создается в той же транзакции, что и
+    операция, а печатает его фоновый обработчик (accounting/print_queue.py)
+    уже после фиксации - медленный принтер не держит блокировку клиента.
+    """
+    KIND_SESSION = 'session'
+    KIND_DEPOSIT = 'deposit'
+    KIND_CHOICES = [
+        (KIND_SESSION, 'Сеанс'),
+        (KIND_DEPOSIT, 'Пополнение'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает печати'),
+        (STATUS_DONE, 'Напечатан'),
+        (STATUS_FAILED, 'Ошибка печати'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Тип чека")
+    # id сеанса (Transaction) или пополнения (ClientDeposit)
+    object_id = models.PositiveBigIntegerField(verbose_name="Номер операции")
+    # Язык интерфейса на момент операции: чек печатается на нем
+    language = models.CharField(max_length=10, blank=True, verbose_name="Язык")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # Не раньше этого момента задание можно (снова) взять в работу
+    available_at = models.DateTimeField(default=timezone.now, verbose_name="Доступно с")
+    printed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата печати")
+
+    def __str__(self):
+        return f"Печать чека {self.get_kind_display()} #{self.object_id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Задание печати"
+        verbose_name_plural = "Задания печати"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='acc_print_job_queue_idx'),
+        ]
+
+
+class LedgerSyncItem(models.Model):
+    """
+    Запись локальной базы настольной версии, ожидающая отправки в центральную БД
+    (outbox, accounting/sync.py). Создается в транзакции самой операции.
+    """
+    KIND_CLIENT = 'client'
+    KIND_SESSION = 'session'
+    KIND_DEPOSIT = 'deposit'
+    KIND_ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (KIND_CLIENT, 'Новый клиент'),
+        (KIND_SESSION, 'Сеанс'),
+        (KIND_DEPOSIT, 'Пополнение'),
+        (KIND_ADJUSTMENT, 'Отмена пополнения'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_CONFLICT = 'conflict'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_DONE, 'Отправлено'),
+        (STATUS_CONFLICT, 'Отправлено с конфликтом'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    # Ключ записи в центральной БД: повторная отправка не создаст дубликат
+    uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="Ключ")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Тип")
+    # id записи в локальной базе (клиента или операции)
+    object_id = models.PositiveBigIntegerField(verbose_name="Номер записи")
+    client_id_local = models.PositiveBigIntegerField(verbose_name="Клиент (локальный номер)")
+    # Изменение баланса клиента этой записью (для сверки с центральной БД)
+    balance_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Изменение баланса")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка или конфликт")
+    # id записи в центральной БД после отправки
+    central_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Номер в центральной БД")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    synced_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    def __str__(self):
+        return f"Синхронизация {self.get_kind_display()} #{self.object_id} ({self.status})"
+
+    class Meta:
+        verbose_name = "Запись для синхронизации"
+        verbose_name_plural = "Записи для синхронизации"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='acc_sync_queue_idx'),
+            models.Index(fields=['kind', 'object_id'], name='acc_sync_object_idx'),
+        ]
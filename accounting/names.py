@@ -0,0 +1,55 @@
+"""
+Нормализованный ключ имени клиента для поиска и проверки дубликатов.
+
+Имена вводятся азербайджанской латиницей, кириллицей и ASCII, поэтому
+"Əli Məmmədov", "Ali Mammadov" и "Али Маммадов" должны давать один ключ:
+регистр снимается, кириллица транслитерируется в латиницу, диакритика
+и азербайджанские буквы сводятся к ASCII (ə - к a, как в английской записи
+имен: Məmmədov - Mammadov), пробелы схлопываются.
+Ключ хранится в Client.search_name и индексируется; после изменения правил
+ключи существующих клиентов пересчитываются миграцией.
+"""
+import re
+import unicodedata
+
+
+# Кириллица -> латиница (азербайджанский алфавит; диакритика снимается ниже)
+_CYRILLIC_TO_LATIN = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'ғ': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ә': 'a', 'ж': 'j', 'з': 'z', 'и': 'i', 'ы': 'i', 'і': 'i', 'й': 'y', 'ј': 'y',
+    'к': 'k', 'ҝ': 'g', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'ө': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ү': 'u', 'ф': 'f', 'х': 'x', 'һ': 'h',
+    'ц': 'ts', 'ч': 'c', 'ҹ': 'c', 'ш': 's', 'щ': 's', 'ъ': '', 'ь': '', 'э': 'e',
+    'ю': 'yu', 'я': 'ya',
+})
+
+# Буквы, которые не раскладываются NFKD на базовую букву и диакритику
+_LATIN_FOLD = str.maketrans({
+    'ə': 'a', 'ı': 'i', 'ß': 'ss', 'ø': 'o', 'æ': 'ae', 'đ': 'd', 'ł': 'l',
+})
+
+# Английская запись звуков, которые в азербайджанской латинице пишутся одной буквой
+_DIGRAPHS = (
+    ('sh', 's'),
+    ('ch', 'c'),
+    ('zh', 'j'),
+    ('kh', 'x'),
+)
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(value):
+    """
+    Ключ поиска для имени: только [a-z0-9], слова разделены одним пробелом.
+    """
+    if not value:
+        return ''
+    key = value.casefold().translate(_CYRILLIC_TO_LATIN).translate(_LATIN_FOLD)
+    key = ''.join(
+        char for char in unicodedata.normalize('NFKD', key)
+        if not unicodedata.combining(char)
+    )
+    for digraph, letter in _DIGRAPHS:
+        key = key.replace(digraph, letter)
+    return _NON_ALNUM.sub(' ', key).strip()
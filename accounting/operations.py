@@ -0,0 +1,288 @@
+"""
+Единый журнал операций (сеансы, пополнения, отмены пополнений).
+
+Журнал собирается одним запросом UNION ALL на стороне БД и листается
+keyset-курсором по (date_time, kind, id), поэтому стоимость страницы
+не зависит от размера выбранного периода.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import CharField, F, Q, Value
+from django.utils import timezone
+
+from .models import Transaction, ClientDeposit, ClientBalanceAdjustment
+
+
+KIND_TRANSACTION = 'transaction'
+KIND_DEPOSIT = 'deposit'
+KIND_ADJUSTMENT = 'adjustment'
+OPERATION_KINDS = (KIND_ADJUSTMENT, KIND_DEPOSIT, KIND_TRANSACTION)
+
+# Строка журнала: только колонки, которые нужны для вывода
+Operation = namedtuple('Operation', [
+    'kind', 'id', 'date_time', 'client_id', 'client_name', 'worker_name', 'amount', 'lessons',
+])
+
+_OPERATION_COLUMNS = (
+    'op_kind', 'op_id', 'op_date_time', 'op_client_id',
+    'op_client_name', 'op_worker_name', 'op_amount', 'op_lessons',
+)
+_ORDERING = ('-op_date_time', '-op_kind', '-op_id')
+_CURSOR_SEPARATOR = '~'
+
+
+def day_bounds(start_date, end_date):
+    """
+    Полуоткрытый интервал [начало start_date, начало дня после end_date)
+    в текущем часовом поясе. В отличие от date_time__date, такое условие
+    сравнивает саму колонку и обслуживается индексом по date_time.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def filter_by_period(queryset, start_date, end_date):
+    """Оставляет операции с датой (по местному времени) от start_date до end_date включительно"""
+    start, end = day_bounds(start_date, end_date)
+    return queryset.filter(date_time__gte=start, date_time__lt=end)
+
+
+def encode_cursor(operation):
+    """Курсор на операцию для следующей страницы"""
+    return _CURSOR_SEPARATOR.join([
+        operation.date_time.isoformat(),
+        operation.kind,
+        str(operation.id),
+    ])
+
+
+def decode_cursor(value):
+    """
+    Разбирает курсор из GET-параметра. Возвращает (date_time, kind, id) или None.
+    """
+    if not value:
+        return None
+    try:
+        date_str, kind, op_id = value.rsplit(_CURSOR_SEPARATOR, 2)
+        date_time = datetime.fromisoformat(date_str)
+        op_id = int(op_id)
+    except ValueError:
+        return None
+    if kind not in OPERATION_KINDS or date_time.tzinfo is None:
+        return None
+    return date_time, kind, op_id
+
+
+def _before_cursor(kind, cursor):
+    """
+    Условие (date_time, kind, id) < cursor для ветки с постоянным kind.
+    Сравнение kind вычисляется в Python, в SQL остаются только date_time и id,
+    что позволяет использовать индекс по date_time.
+    """
+    cursor_dt, cursor_kind, cursor_id = cursor
+    if kind < cursor_kind:
+        return Q(date_time__lte=cursor_dt)
+    if kind > cursor_kind:
+        return Q(date_time__lt=cursor_dt)
+    return Q(date_time__lt=cursor_dt) | Q(date_time=cursor_dt, id__lt=cursor_id)
+
+
+def _project(queryset, kind, client_name, worker_name, amount, lessons, cursor):
+    if cursor is not None:
+        queryset = queryset.filter(_before_cursor(kind, cursor))
+    return queryset.order_by().annotate(
+        op_kind=Value(kind, output_field=CharField()),
+        op_id=F('id'),
+        op_date_time=F('date_time'),
+        op_client_id=F('client_id'),
+        op_client_name=client_name,
+        op_worker_name=worker_name,
+        op_amount=amount,
+        op_lessons=lessons,
+    ).values_list(*_OPERATION_COLUMNS)
+
+
+def _projected_parts(transactions_qs, deposits_qs, adjustments_qs, cursor=None):
+    """Три QuerySet'а с одинаковым набором колонок (_OPERATION_COLUMNS)"""
+    no_worker = Value(None, output_field=CharField())
+    return [
+        _project(
+            transactions_qs, KIND_TRANSACTION,
+            client_name=F('client__full_name'),
+            worker_name=F('worker__user__username'),
+            amount=F('amount'),
+            lessons=F('lessons_count'),
+            cursor=cursor,
+        ),
+        _project(
+            deposits_qs, KIND_DEPOSIT,
+            client_name=F('client__full_name'),
+            worker_name=no_worker,
+            amount=F('amount'),
+            lessons=F('lessons_added'),
+            cursor=cursor,
+        ),
+        _project(
+            adjustments_qs, KIND_ADJUSTMENT,
+            client_name=F('client__full_name'),
+            worker_name=no_worker,
+            amount=F('amount_removed'),
+            lessons=F('lessons_removed'),
+            cursor=cursor,
+        ),
+    ]
+
+
+def operations_union(transactions_qs, deposits_qs, adjustments_qs, cursor=None):
+    """
+    Объединяет уже отфильтрованные QuerySet'ы в один UNION ALL,
+    отсортированный от новых операций к старым.
+    """
+    first, *rest = _projected_parts(transactions_qs, deposits_qs, adjustments_qs, cursor=cursor)
+    return first.union(*rest, all=True).order_by(*_ORDERING)
+
+
+def _page_result(operations, limit):
+    next_cursor = None
+    if len(operations) > limit:
+        operations = operations[:limit]
+        next_cursor = encode_cursor(operations[-1])
+    return operations, next_cursor
+
+
+def operations_page(transactions_qs, deposits_qs, adjustments_qs, cursor=None, limit=50):
+    """
+    Одна страница журнала. Возвращает (operations, next_cursor);
+    next_cursor равен None, если более старых операций нет.
+    """
+    rows = operations_union(transactions_qs, deposits_qs, adjustments_qs, cursor=cursor)[:limit + 1]
+    return _page_result([Operation._make(row) for row in rows], limit)
+
+
+async def aoperations_page(transactions_qs, deposits_qs, adjustments_qs, cursor=None, limit=50):
+    """operations_page() для асинхронных представлений"""
+    # Страница ограничена limit строками: QuerySet читается целиком в потоке запроса.
+    # (aiterator() для values_list() с UNION выполняет SQL в цикле событий и не подходит)
+    rows = operations_union(transactions_qs, deposits_qs, adjustments_qs, cursor=cursor)[:limit + 1]
+    return _page_result([Operation._make(row) async for row in rows], limit)
+
+
+def iter_operations(transactions_qs, deposits_qs, adjustments_qs, batch_size=2000):
+    """
+    Проходит весь журнал страницами по batch_size строк (для экспорта),
+    не держа в памяти больше одной страницы.
+    """
+    cursor = None
+    while True:
+        operations, next_cursor = operations_page(
+            transactions_qs, deposits_qs, adjustments_qs, cursor=cursor, limit=batch_size,
+        )
+        yield from operations
+        if next_cursor is None:
+            return
+        last = operations[-1]
+        cursor = (last.date_time, last.kind, last.id)
+
+
+async def aiter_operations(transactions_qs, deposits_qs, adjustments_qs, batch_size=2000):
+    """iter_operations() для асинхронных представлений"""
+    cursor = None
+    while True:
+        operations, next_cursor = await aoperations_page(
+            transactions_qs, deposits_qs, adjustments_qs, cursor=cursor, limit=batch_size,
+        )
+        for operation in operations:
+            yield operation
+        if next_cursor is None:
+            return
+        last = operations[-1]
+        cursor = (last.date_time, last.kind, last.id)
+
+
+def _ledger_querysets(client_id=None):
+    querysets = (
+        Transaction.objects.all(),
+        ClientDeposit.objects.all(),
+        ClientBalanceAdjustment.objects.all(),
+    )
+    if client_id is not None:
+        querysets = tuple(qs.filter(client_id=client_id) for qs in querysets)
+    return querysets
+
+
+def _latest_per_kind_parts(transactions_qs, deposits_qs, adjustments_qs, limit):
+    """
+    Последние limit операций каждого типа одним UNION ALL
+    (каждая ветка со своими ORDER BY ... LIMIT). SQLite не допускает LIMIT
+    внутри составного запроса - там выполняются три отдельных запроса.
+    Возвращает список QuerySet'ов.
+    """
+    parts = [
+        part.order_by('-op_date_time', '-op_id')[:limit]
+        for part in _projected_parts(transactions_qs, deposits_qs, adjustments_qs)
+    ]
+    if not connection.features.supports_slicing_ordering_in_compound:
+        return parts
+    first, *rest = parts
+    return [first.union(*rest, all=True)]
+
+
+def _group_by_kind(rows):
+    grouped = {kind: [] for kind in OPERATION_KINDS}
+    for row in rows:
+        operation = Operation._make(row)
+        grouped[operation.kind].append(operation)
+    # Порядок строк внутри ветки UNION ALL не гарантирован
+    for operations in grouped.values():
+        operations.sort(key=lambda op: (op.date_time, op.id), reverse=True)
+    return grouped
+
+
+class OperationsFeed:
+    """
+    Лента последних операций. Результаты запоминаются на время обработки запроса,
+    поэтому несколько обращений к ленте в одном запросе стоят одного запроса к БД.
+    """
+
+    def __init__(self, request=None):
+        self._cache = getattr(request, '_operations_feed_cache', None)
+        if self._cache is None:
+            self._cache = {}
+            if request is not None:
+                request._operations_feed_cache = self._cache
+
+    def page(self, limit=20, cursor=None, client_id=None):
+        """
+        Последние limit операций (от новых к старым), старше cursor, если он задан.
+        Возвращает (operations, next_cursor) - next_cursor для ссылки "Загрузить еще".
+        """
+        key = ('page', limit, cursor, client_id)
+        if key not in self._cache:
+            self._cache[key] = operations_page(
+                *_ledger_querysets(client_id), cursor=cursor, limit=limit,
+            )
+        return self._cache[key]
+
+    def latest_by_kind(self, client_id, limit=10):
+        """
+        Последние limit операций каждого типа для клиента одним запросом.
+        Возвращает словарь {kind: [Operation, ...]}.
+        """
+        key = ('by_kind', limit, client_id)
+        if key not in self._cache:
+            parts = _latest_per_kind_parts(*_ledger_querysets(client_id), limit=limit)
+            self._cache[key] = _group_by_kind(row for part in parts for row in part)
+        return self._cache[key]
+
+    async def alatest_by_kind(self, client_id, limit=10):
+        """latest_by_kind() для асинхронных представлений"""
+        key = ('by_kind', limit, client_id)
+        if key not in self._cache:
+            rows = []
+            for part in _latest_per_kind_parts(*_ledger_querysets(client_id), limit=limit):
+                rows.extend([row async for row in part])
+            self._cache[key] = _group_by_kind(rows)
+        return self._cache[key]
@@ -0,0 +1,99 @@
+"""
+Реестр шрифтов для PDF (отчеты и чеки).
+
+Шрифт с поддержкой азербайджанских и кириллических символов ищется и
+регистрируется в ReportLab один раз на процесс (при запуске приложения,
+см. AccountingConfig.ready), после чего pdf_font_names() только возвращает
+готовые имена. Если ни один системный шрифт не найден, используется
+DejaVu Sans из папки accounting/fonts, поставляемый вместе с приложением.
+Настольная версия регистрирует шрифт при первом PDF (см. PDF_PRELOAD).
+
+ReportLab встраивает TTF-шрифты подмножеством: в PDF попадают только
+использованные в документе символы, а не весь файл шрифта.
+"""
+import logging
+import os
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts')
+
+# Порядок важен: сначала Windows (текущий проект), затем Unix, затем шрифт из поставки.
+FONT_CANDIDATES = [
+    {
+        'normal': r'C:\Windows\Fonts\arial.ttf',
+        'bold': r'C:\Windows\Fonts\arialbd.ttf',
+        'normal_name': 'FleksArial',
+        'bold_name': 'FleksArialBold',
+    },
+    {
+        'normal': r'C:\Windows\Fonts\segoeui.ttf',
+        'bold': r'C:\Windows\Fonts\segoeuib.ttf',
+        'normal_name': 'FleksSegoeUI',
+        'bold_name': 'FleksSegoeUIBold',
+    },
+    {
+        'normal': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+        'bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+        'normal_name': 'FleksDejaVuSans',
+        'bold_name': 'FleksDejaVuSansBold',
+    },
+    {
+        'normal': os.path.join(BUNDLED_FONTS_DIR, 'DejaVuSans.ttf'),
+        'bold': os.path.join(BUNDLED_FONTS_DIR, 'DejaVuSans-Bold.ttf'),
+        'normal_name': 'FleksDejaVuSans',
+        'bold_name': 'FleksDejaVuSansBold',
+    },
+]
+
+# Встроенные шрифты ReportLab (без азербайджанских символов) - если не загрузился ни один TTF
+BUILTIN_FONTS = ('Helvetica', 'Helvetica-Bold')
+
+_lock = threading.Lock()
+_font_names = None
+
+
+def _register(candidate):
+    from reportlab.lib.fonts import addMapping
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    normal_name = candidate['normal_name']
+    bold_name = candidate['bold_name']
+    pdfmetrics.registerFont(TTFont(normal_name, candidate['normal']))
+    if os.path.exists(candidate['bold']):
+        pdfmetrics.registerFont(TTFont(bold_name, candidate['bold']))
+    else:
+        bold_name = normal_name
+    # <b> в Paragraph должен переключать на жирный TTF, а не на Helvetica-Bold
+    addMapping(normal_name, 0, 0, normal_name)
+    addMapping(normal_name, 0, 1, normal_name)
+    addMapping(normal_name, 1, 0, bold_name)
+    addMapping(normal_name, 1, 1, bold_name)
+    return normal_name, bold_name
+
+
+def _resolve():
+    for candidate in FONT_CANDIDATES:
+        if not os.path.exists(candidate['normal']):
+            continue
+        try:
+            return _register(candidate)
+        except Exception as e:
+            logger.warning("Не удалось загрузить шрифт %s: %s", candidate['normal'], e)
+    return BUILTIN_FONTS
+
+
+def pdf_font_names():
+    """
+    (обычный, жирный) - имена зарегистрированных шрифтов для PDF.
+    Поиск и загрузка TTF выполняются только при первом вызове.
+    """
+    global _font_names
+    if _font_names is None:
+        with _lock:
+            if _font_names is None:
+                _font_names = _resolve()
+    return _font_names
@@ -0,0 +1,181 @@
+"""
+Очередь печати чеков (outbox).
+
+enqueue_receipt() записывает PrintJob в транзакции самой операции. После
+фиксации транзакции фоновый поток процесса печатает чек уже без блокировок
+и без открытой транзакции; неудачная печать повторяется с растущей паузой.
+Очередь можно разбирать и отдельным процессом: python manage.py process_print_queue
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone, translation
+
+from .models import ClientDeposit, PrintJob, Transaction
+from .receipt_utils import print_to_thermal_printer, print_to_thermal_printer_deposit
+from .request_timing import track
+
+
+logger = logging.getLogger(__name__)
+
+PRINT_MAX_ATTEMPTS = 5
+# Пауза перед повтором: 5, 10, 20, ... секунд, но не больше RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 300
+# Взятое в работу задание скрыто от других обработчиков на это время;
+# если процесс упал во время печати, задание вернется в очередь
+LEASE_SECONDS = 120
+# Как часто фоновый поток проверяет очередь без явного сигнала
+POLL_INTERVAL = 30
+CLAIM_BATCH_SIZE = 10
+
+
+def _print_session(object_id):
+    record = Transaction.objects.select_related('client', 'worker__user').get(id=object_id)
+    if not print_to_thermal_printer(record):
+        return False
+    Transaction.objects.filter(id=record.id).update(receipt_printed=True)
+    return True
+
+
+def _print_deposit(object_id):
+    deposit = ClientDeposit.objects.select_related('client').get(id=object_id)
+    return print_to_thermal_printer_deposit(deposit)
+
+
+_PRINTERS = {
+    PrintJob.KIND_SESSION: _print_session,
+    PrintJob.KIND_DEPOSIT: _print_deposit,
+}
+
+
+def enqueue_receipt(kind, object_id):
+    """
+    Ставит чек в очередь печати. Вызывается внутри transaction.atomic() операции:
+    задание появится в очереди только вместе с самой операцией.
+    """
+    job = PrintJob.objects.create(
+        kind=kind,
+        object_id=object_id,
+        language=translation.get_language() or '',
+    )
+    transaction.on_commit(wake_worker)
+    return job
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def _claim_jobs(limit):
+    """
+    Берет в работу до limit готовых заданий. На PostgreSQL параллельные
+    обработчики пропускают чужие заблокированные строки (SKIP LOCKED).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = PrintJob.objects.filter(
+            status=PrintJob.STATUS_PENDING,
+            available_at__lte=now,
+        ).order_by('available_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            jobs = jobs.select_for_update(skip_locked=True)
+        claimed = list(jobs[:limit])
+        if claimed:
+            PrintJob.objects.filter(id__in=[job.id for job in claimed]).update(
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=LEASE_SECONDS),
+            )
+    for job in claimed:
+        job.attempts += 1
+    return claimed
+
+
+def _run_job(job):
+    """Печатает одно задание и записывает результат"""
+    retry = True
+    try:
+        with translation.override(job.language or settings.LANGUAGE_CODE), track(f'print_queue:{job.kind}'):
+            printed = _PRINTERS[job.kind](job.object_id)
+        error = '' if printed else "Принтер недоступен или вернул ошибку"
+    except (Transaction.DoesNotExist, ClientDeposit.DoesNotExist):
+        printed, retry = False, False
+        error = "Операция не найдена"
+    except Exception as e:
+        printed = False
+        error = str(e)
+
+    now = timezone.now()
+    if printed:
+        PrintJob.objects.filter(id=job.id).update(
+            status=PrintJob.STATUS_DONE, printed_at=now, last_error='',
+        )
+    elif retry and job.attempts < PRINT_MAX_ATTEMPTS:
+        PrintJob.objects.filter(id=job.id).update(
+            available_at=now + _retry_delay(job.attempts), last_error=error,
+        )
+    else:
+        logger.error("Чек %s #%s не напечатан: %s", job.kind, job.object_id, error)
+        PrintJob.objects.filter(id=job.id).update(status=PrintJob.STATUS_FAILED, last_error=error)
+    return printed
+
+
+def drain(limit=None):
+    """
+    Печатает все готовые задания (не больше limit, если задан).
+    Возвращает количество обработанных заданий.
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        batch_size = CLAIM_BATCH_SIZE if limit is None else min(CLAIM_BATCH_SIZE, limit - processed)
+        jobs = _claim_jobs(batch_size)
+        if not jobs:
+            break
+        for job in jobs:
+            _run_job(job)
+        processed += len(jobs)
+    return processed
+
+
+class _PrintWorker(threading.Thread):
+    """Фоновый поток, разбирающий очередь по сигналу или раз в POLL_INTERVAL секунд"""
+
+    def __init__(self):
+        super().__init__(name='print-queue', daemon=True)
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(POLL_INTERVAL)
+            self.wakeup.clear()
+            close_old_connections()
+            try:
+                drain()
+            except Exception as e:
+                logger.exception("Ошибка очереди печати: %s", e)
+            finally:
+                # Не держим соединение с БД, пока поток простаивает
+                connection.close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    """
+    Будит фоновый поток печати (запуская его при первом обращении).
+    С PRINT_QUEUE_WORKER_THREAD = False очередь разбирает только команда process_print_queue.
+    """
+    global _worker
+    if not getattr(settings, 'PRINT_QUEUE_WORKER_THREAD', True):
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = _PrintWorker()
+            _worker.start()
+    _worker.wakeup.set()
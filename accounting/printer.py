@@ -0,0 +1,239 @@
+"""
+Менеджер термопринтера.
+
+Устройство определяется один раз на процесс, соединение с ним держится
+открытым и перед печатью проверяется. После ошибки соединение закрывается,
+а новая попытка подключения делается не раньше, чем через растущую паузу.
+Задания печатаются строго по одному (общая блокировка).
+
+Порядок поиска устройства:
+  RECEIPT_PRINTER_PATH (файл или устройство) ->
+  /dev/usb/lp0 ->
+  COM-порт RECEIPT_PRINTER_PORT (Windows) ->
+  RECEIPT_PRINTER_IP[:RECEIPT_PRINTER_NETWORK_PORT] ->
+  файлы в папке receipts/ (для тестирования).
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .request_timing import STAGE_PRINTER, timed
+
+
+logger = logging.getLogger(__name__)
+
+USB_PRINTER_DEVICE = '/dev/usb/lp0'
+DEFAULT_NETWORK_PORT = 9100
+NETWORK_TIMEOUT = 10
+
+# Пауза перед повторным подключением после ошибки: 1, 2, 4, ... секунд
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+TARGET_FILE = 'file'
+TARGET_SERIAL = 'serial'
+TARGET_NETWORK = 'network'
+TARGET_SPOOL = 'spool'
+
+STATE_IDLE = 'idle'
+STATE_READY = 'ready'
+STATE_OFFLINE = 'offline'
+STATE_SPOOL = 'spool'
+STATE_UNAVAILABLE = 'unavailable'
+
+
+def discover_target():
+    """
+    Определяет, куда печатать. Возвращает (тип, адрес).
+    """
+    printer_path = getattr(settings, 'RECEIPT_PRINTER_PATH', None)
+    if printer_path:
+        return TARGET_FILE, printer_path
+    if os.path.exists(USB_PRINTER_DEVICE):
+        return TARGET_FILE, USB_PRINTER_DEVICE
+    if os.name == 'nt':
+        # По умолчанию COM1, можно настроить в settings
+        return TARGET_SERIAL, getattr(settings, 'RECEIPT_PRINTER_PORT', 'COM1')
+    if getattr(settings, 'RECEIPT_PRINTER_IP', None):
+        port = getattr(settings, 'RECEIPT_PRINTER_NETWORK_PORT', DEFAULT_NETWORK_PORT)
+        return TARGET_NETWORK, (settings.RECEIPT_PRINTER_IP, int(port))
+    # Файловый вывод (для тестирования): отдельный файл на каждый чек
+    return TARGET_SPOOL, os.path.join(settings.BASE_DIR, 'receipts')
+
+
+def _describe(target):
+    kind, address = target
+    if kind == TARGET_NETWORK:
+        return f"{address[0]}:{address[1]}"
+    return str(address)
+
+
+class PrinterUnavailable(Exception):
+    pass
+
+
+class PrinterManager:
+    """
+    Долгоживущее соединение с принтером. Один экземпляр на процесс: printer_manager.
+    target можно передать явно (например, файл или сокет-заглушку при проверке).
+    """
+
+    def __init__(self, target=None):
+        self._lock = threading.Lock()
+        self._target = target
+        self._printer = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._last_error = ''
+        self._last_printed_at = None
+        self._escpos_missing = False
+
+    @property
+    def target(self):
+        if self._target is None:
+            self._target = discover_target()
+        return self._target
+
+    def _open(self):
+        from escpos.printer import File, Network, Serial
+
+        kind, address = self.target
+        if kind == TARGET_FILE:
+            printer = File(address)
+        elif kind == TARGET_SERIAL:
+            printer = Serial(address, baudrate=9600)
+        else:
+            printer = Network(address[0], port=address[1], timeout=NETWORK_TIMEOUT)
+        printer.open()
+        return printer
+
+    def _is_healthy(self):
+        """Дешевая проверка, что открытое соединение еще живо"""
+        kind, address = self.target
+        # _device, а не device: свойство device само открывает закрытое соединение
+        device = getattr(self._printer, '_device', None)
+        if not device:
+            return False
+        if kind == TARGET_FILE:
+            return not device.closed and os.path.exists(address)
+        if kind == TARGET_SERIAL:
+            return getattr(device, 'is_open', True)
+        # Сокет: если он "читаем", а данных нет - принтер закрыл соединение
+        try:
+            readable, _, _ = select.select([device], [], [], 0)
+            if readable:
+                return device.recv(1, socket.MSG_PEEK) != b''
+        except OSError:
+            return False
+        return True
+
+    def _disconnect(self):
+        if self._printer is not None:
+            try:
+                self._printer.close()
+            except Exception:
+                pass
+            self._printer = None
+
+    def _connection(self):
+        if self._printer is not None and not self._is_healthy():
+            self._disconnect()
+        if self._printer is None:
+            if time.monotonic() < self._retry_at:
+                raise PrinterUnavailable(self._last_error or "Принтер недоступен")
+            self._printer = self._open()
+        return self._printer
+
+    def _record_failure(self, error):
+        self._disconnect()
+        self._failures += 1
+        delay = min(RECONNECT_BASE_DELAY * 2 ** (self._failures - 1), RECONNECT_MAX_DELAY)
+        self._retry_at = time.monotonic() + delay
+        self._last_error = str(error)
+
+    def _record_success(self):
+        self._failures = 0
+        self._retry_at = 0.0
+        self._last_error = ''
+        self._last_printed_at = timezone.now()
+
+    def print_receipt(self, render, spool_name):
+        """
+        Печатает чек: render(printer) выводит содержимое через API python-escpos.
+        spool_name - имя файла, если принтер не найден и чеки пишутся в receipts/.
+        Возвращает True при успехе; ошибки не выбрасываются.
+        """
+        with self._lock, timed(STAGE_PRINTER):
+            kind, address = self.target
+            try:
+                if kind == TARGET_SPOOL:
+                    self._print_to_spool(render, os.path.join(address, spool_name))
+                else:
+                    printer = self._connection()
+                    render(printer)
+                    printer.cut()
+            except ImportError:
+                self._escpos_missing = True
+                logger.error("python-escpos не установлен. Чек не может быть напечатан на принтере.")
+                return False
+            except PrinterUnavailable as e:
+                logger.warning("Принтер недоступен, повторное подключение позже: %s", e)
+                return False
+            except Exception as e:
+                self._record_failure(e)
+                logger.error("Ошибка при печати на принтер: %s", e)
+                return False
+            self._record_success()
+            return True
+
+    def _print_to_spool(self, render, receipt_file):
+        from escpos.printer import File
+
+        os.makedirs(os.path.dirname(receipt_file), exist_ok=True)
+        printer = File(receipt_file)
+        try:
+            render(printer)
+            printer.cut()
+        finally:
+            printer.close()
+
+    def status(self):
+        """
+        Состояние принтера для интерфейса (без обращения к устройству).
+        state: idle | ready | offline | spool | unavailable
+        """
+        kind, _address = self.target
+        if kind == TARGET_SPOOL:
+            state = STATE_SPOOL
+        elif self._escpos_missing:
+            state = STATE_UNAVAILABLE
+        elif self._printer is not None:
+            state = STATE_READY
+        elif self._failures:
+            state = STATE_OFFLINE
+        else:
+            state = STATE_IDLE
+        return {
+            'state': state,
+            'target': _describe(self.target),
+            'last_error': self._last_error,
+            'last_printed_at': self._last_printed_at,
+        }
+
+    def reset(self):
+        """Закрывает соединение и заново определит устройство при следующей печати"""
+        with self._lock:
+            self._disconnect()
+            self._target = None
+            self._failures = 0
+            self._retry_at = 0.0
+            self._last_error = ''
+
+
+printer_manager = PrinterManager()
@@ -0,0 +1,204 @@
+"""
+Архив чеков за период: ZIP с отдельными PDF или один многостраничный PDF.
+
+Операции читаются из БД пачками, чеки одной пачки рендерятся в дочернем
+процессе (ProcessPoolExecutor), а готовые файлы сразу уходят в поток ответа.
+Одновременно в работе не больше двух пачек на процесс, поэтому память
+не зависит от длины периода.
+"""
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import translation
+
+from .async_support import aiter_sync
+from .exports import _ChunkBuffer
+from .models import Transaction, ClientDeposit, ClientBalanceAdjustment
+from .operations import filter_by_period
+from .receipt_engine import (
+    KIND_ADJUSTMENT, KIND_DEPOSIT, KIND_SESSION, RECEIPT_LAYOUTS, init_render_worker, receipt_data,
+    render_pdf_chunk,
+)
+
+
+ARCHIVE_FORMAT_ZIP = 'zip'
+ARCHIVE_FORMAT_PDF = 'pdf'
+ARCHIVE_FORMATS = (ARCHIVE_FORMAT_ZIP, ARCHIVE_FORMAT_PDF)
+
+# Чеков в одной пачке, которую получает дочерний процесс
+ARCHIVE_CHUNK_SIZE = 50
+
+_ARCHIVE_FOLDERS = {
+    KIND_SESSION: 'sessions',
+    KIND_DEPOSIT: 'deposits',
+    KIND_ADJUSTMENT: 'adjustments',
+}
+
+
+def archive_workers():
+    """Количество процессов: RECEIPT_ARCHIVE_WORKERS или число ядер; 1 - без пула процессов"""
+    workers = getattr(settings, 'RECEIPT_ARCHIVE_WORKERS', None) or os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def archive_querysets(start_date=None, end_date=None, client_id=None, worker_id=None):
+    """
+    [(kind, queryset), ...] операций за период (даты включительно) с фильтрами.
+    У пополнений и отмен пополнений нет сотрудника: с фильтром по сотруднику остаются только сеансы.
+    """
+    querysets = [
+        (KIND_SESSION, Transaction.objects.select_related('client', 'worker__user')),
+        (KIND_DEPOSIT, ClientDeposit.objects.select_related('client')),
+        (KIND_ADJUSTMENT, ClientBalanceAdjustment.objects.select_related('client')),
+    ]
+    if start_date and end_date:
+        querysets = [(kind, filter_by_period(qs, start_date, end_date)) for kind, qs in querysets]
+    if client_id:
+        querysets = [(kind, qs.filter(client_id=client_id)) for kind, qs in querysets]
+    if worker_id:
+        querysets = [(KIND_SESSION, querysets[0][1].filter(worker_id=worker_id))]
+    return querysets
+
+
+def count_receipts(querysets):
+    return sum(queryset.count() for _kind, queryset in querysets)
+
+
+def _iter_items(querysets, chunk_size):
+    """Пачки [(kind, data, filename), ...] в порядке типов и дат"""
+    batch = []
+    for kind, queryset in querysets:
+        # Серверный курсор PostgreSQL живет только внутри транзакции
+        with transaction.atomic():
+            for record in queryset.order_by('date_time', 'id').iterator(chunk_size=chunk_size):
+                filename = f'{_ARCHIVE_FOLDERS[kind]}/{kind}_{record.id}.pdf'
+                batch.append((kind, receipt_data(kind, record), filename))
+                if len(batch) >= chunk_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def iter_rendered_receipts(querysets, workers=None, chunk_size=ARCHIVE_CHUNK_SIZE, progress=None):
+    """
+    Генератор (filename, pdf) по всем операциям querysets ([(kind, queryset), ...]).
+    progress(done) вызывается после каждой пачки.
+    """
+    workers = workers or archive_workers()
+    language = translation.get_language() or settings.LANGUAGE_CODE
+    chunks = _iter_items(querysets, chunk_size)
+    done = 0
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from render_pdf_chunk(language, chunk)
+            done += len(chunk)
+            if progress:
+                progress(done)
+        return
+
+    # spawn, а не fork: дочерний процесс не наследует соединения с БД и потоки веб-сервера
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_render_worker,
+    )
+    with executor:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(render_pdf_chunk, language, chunk))
+                while len(pending) >= workers * 2:
+                    rendered = pending.popleft().result()
+                    yield from rendered
+                    done += len(rendered)
+                    if progress:
+                        progress(done)
+            while pending:
+                rendered = pending.popleft().result()
+                yield from rendered
+                done += len(rendered)
+                if progress:
+                    progress(done)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def stream_zip(rendered):
+    """ZIP-архив из (filename, pdf) частями по мере готовности файлов"""
+    buffer = _ChunkBuffer()
+    # PDF уже сжаты, повторное сжатие только тратит время
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for filename, pdf in rendered:
+            archive.writestr(filename, pdf)
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def write_multipage_pdf(querysets, output):
+    """
+    Один PDF, по странице на чек. Страницы рисуются по одной и элементы чека
+    сразу освобождаются, но ReportLab держит готовые страницы до сохранения
+    документа, поэтому для больших периодов лучше ZIP (он же и параллелится).
+    """
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Frame
+
+    from .receipt_pdf import PDF_MARGIN, PDF_PAGE_SIZE, pdf_flowables
+
+    pdf = canvas.Canvas(output, pagesize=PDF_PAGE_SIZE)
+    width, height = PDF_PAGE_SIZE
+    for chunk in _iter_items(querysets, ARCHIVE_CHUNK_SIZE):
+        for kind, data, _filename in chunk:
+            story = []
+            for element in RECEIPT_LAYOUTS[kind]:
+                story.extend(pdf_flowables(element, data))
+            frame = Frame(
+                PDF_MARGIN, PDF_MARGIN, width - 2 * PDF_MARGIN, height - 2 * PDF_MARGIN,
+                leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0,
+            )
+            frame.addFromList(story, pdf)
+            pdf.showPage()
+    pdf.save()
+
+
+def _stream_file(fileobj, block_size=64 * 1024):
+    fileobj.seek(0)
+    try:
+        while True:
+            block = fileobj.read(block_size)
+            if not block:
+                return
+            yield block
+    finally:
+        fileobj.close()
+
+
+def receipts_archive_response(querysets, archive_format, filename='receipts', asynchronous=False):
+    """
+    StreamingHttpResponse с архивом чеков (zip) или многостраничным PDF (pdf).
+    asynchronous - ответ для ASGI-сервера (см. exports.stream_operations_export).
+    """
+    if archive_format == ARCHIVE_FORMAT_ZIP:
+        content = stream_zip(iter_rendered_receipts(querysets))
+        content_type = 'application/zip'
+    else:
+        # Готовый документ до 16 МБ остается в памяти, больший - во временном файле
+        output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        write_multipage_pdf(querysets, output)
+        content = _stream_file(output)
+        content_type = 'application/pdf'
+    if asynchronous:
+        content = aiter_sync(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{archive_format}"'
+    return response
@@ -0,0 +1,72 @@
+"""
+Кэш готовых PDF-чеков.
+
+Чек не меняется после создания операции (баланс берется из снимка balance_after),
+поэтому PDF рендерится один раз и хранится в кэше 'receipts' (файловый кэш
+с ограничением числа записей, см. CACHES в settings).
+
+Ключ - хэш всего, что попадает в чек: тип и номер операции, язык, версия шаблона
+и выводимые значения (в т.ч. имя клиента, которое можно отредактировать).
+Этот же хэш отдается как ETag, поэтому повторный просмотр чека отвечает 304
+без ReportLab и без чтения PDF из кэша. Last-Modified не отдается: время
+операции не меняется при переименовании клиента, и по If-Modified-Since
+браузер получил бы 304 на устаревший чек.
+"""
+import hashlib
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+
+
+# Увеличить при любом изменении оформления PDF-чеков: старые записи кэша станут недоступны
+RECEIPT_TEMPLATE_VERSION = 3
+
+RECEIPT_CACHE_ALIAS = 'receipts'
+
+
+def _receipt_cache():
+    try:
+        return caches[RECEIPT_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def receipt_fingerprint(kind, object_id, content):
+    """
+    Хэш содержимого чека. content - последовательность выводимых в чек значений.
+    """
+    parts = [kind, str(object_id), translation.get_language() or '', str(RECEIPT_TEMPLATE_VERSION)]
+    parts += [str(value) for value in content]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def cached_receipt_pdf(fingerprint, render):
+    """PDF из кэша или render() с сохранением результата"""
+    cache = _receipt_cache()
+    key = f'receipt_pdf:{fingerprint}'
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render()
+        cache.set(key, pdf)
+    return pdf
+
+
+def receipt_pdf_response(request, kind, obj, content, render, filename, as_attachment=False):
+    """
+    HttpResponse с PDF-чеком: ETag, 304 при повторной проверке,
+    PDF из кэша или свежесгенерированный.
+    """
+    fingerprint = receipt_fingerprint(kind, obj.id, content)
+    etag = f'"{fingerprint[:32]}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(cached_receipt_pdf(fingerprint, render), content_type='application/pdf')
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    response['ETag'] = etag
+    # Данные клиента: только браузер сотрудника, и всегда с перепроверкой
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,214 @@
+"""
+Единый движок чеков: сеансы, пополнения, отмены пополнений.
+
+Содержимое чека описано декларативно (RECEIPT_LAYOUTS), а выводится двумя способами:
+  render_pdf()    - PDF через ReportLab (receipt_pdf, загружается при первом PDF);
+  render_escpos() - готовый буфер команд ESC/POS, который уходит на принтер
+                    одной записью вместо десятков вызовов printer.text().
+
+ReportLab и python-escpos импортируются при первом чеке, а не при запуске:
+модуль загружается вместе с представлениями и очередью печати.
+"""
+from collections import namedtuple
+
+from django.utils.translation import gettext as _, gettext_noop
+
+
+KIND_SESSION = 'session'
+KIND_DEPOSIT = 'deposit'
+KIND_ADJUSTMENT = 'adjustment'
+
+# Элементы макета чека
+Title = namedtuple('Title', ['text'])
+# Строка "Подпись: значение"; large - крупный шрифт на термопринтере
+Field = namedtuple('Field', ['label', 'key', 'suffix', 'large'], defaults=['', False])
+# Строка с переводимым значением (например, тип операции)
+Caption = namedtuple('Caption', ['label', 'value'])
+Rule = namedtuple('Rule', [])
+# Текст по центру (благодарность)
+Note = namedtuple('Note', ['text'])
+# Номер операции в конце чека
+Reference = namedtuple('Reference', ['label', 'key'])
+
+RECEIPT_LAYOUTS = {
+    KIND_SESSION: (
+        Title("FLEKS"),
+        Field(gettext_noop('Date'), 'date'),
+        Rule(),
+        Field(gettext_noop('Client'), 'client'),
+        Field(gettext_noop('Worker'), 'worker'),
+        Rule(),
+        Field(gettext_noop('Amount'), 'amount', ' AZN', large=True),
+        Field(gettext_noop('Lessons'), 'lessons'),
+        Rule(),
+        Field(gettext_noop('Balance'), 'balance', ' AZN'),
+        Rule(),
+        Note(gettext_noop('Thank you!')),
+        Reference(gettext_noop('Transaction #'), 'number'),
+    ),
+    KIND_DEPOSIT: (
+        Title("FLEKS"),
+        Field(gettext_noop('Date'), 'date'),
+        Rule(),
+        Field(gettext_noop('Client'), 'client'),
+        Rule(),
+        Caption(gettext_noop('Operation type'), gettext_noop('Top-up')),
+        Rule(),
+        Field(gettext_noop('Amount'), 'amount', ' AZN', large=True),
+        Rule(),
+        Field(gettext_noop('Balance'), 'balance', ' AZN'),
+        Rule(),
+        Note(gettext_noop('Thank you!')),
+        Reference(gettext_noop('Deposit #'), 'number'),
+    ),
+    KIND_ADJUSTMENT: (
+        Title("FLEKS"),
+        Field(gettext_noop('Date'), 'date'),
+        Rule(),
+        Field(gettext_noop('Client'), 'client'),
+        Rule(),
+        Caption(gettext_noop('Operation type'), gettext_noop('Top-up cancellation')),
+        Rule(),
+        Field(gettext_noop('Amount'), 'amount', ' AZN', large=True),
+        Field(gettext_noop('Lessons'), 'lessons'),
+        Rule(),
+        Field(gettext_noop('Balance'), 'balance', ' AZN'),
+        Rule(),
+        Note(gettext_noop('Thank you!')),
+        Reference(gettext_noop('Adjustment #'), 'number'),
+    ),
+}
+
+
+def _balance(record):
+    return record.balance_after if record.balance_after is not None else record.client.balance
+
+
+def session_data(transaction):
+    return {
+        'date': transaction.date_time.strftime('%d.%m.%Y %H:%M:%S'),
+        'client': transaction.client.full_name,
+        'worker': transaction.worker.user.get_full_name() or transaction.worker.user.username,
+        'amount': transaction.amount,
+        'lessons': transaction.lessons_count,
+        'balance': _balance(transaction),
+        'number': transaction.id,
+    }
+
+
+def deposit_data(deposit):
+    return {
+        'date': deposit.date_time.strftime('%d.%m.%Y %H:%M:%S'),
+        'client': deposit.client.full_name,
+        'amount': deposit.amount,
+        'balance': _balance(deposit),
+        'number': deposit.id,
+    }
+
+
+def adjustment_data(adjustment):
+    return {
+        'date': adjustment.date_time.strftime('%d.%m.%Y %H:%M:%S'),
+        'client': adjustment.client.full_name,
+        'amount': adjustment.amount_removed,
+        'lessons': adjustment.lessons_removed,
+        'balance': _balance(adjustment),
+        'number': adjustment.id,
+    }
+
+
+RECEIPT_DATA = {
+    KIND_SESSION: session_data,
+    KIND_DEPOSIT: deposit_data,
+    KIND_ADJUSTMENT: adjustment_data,
+}
+
+
+def receipt_data(kind, record):
+    """Значения, которые выводятся в чек операции (общие для PDF и ESC/POS)"""
+    return RECEIPT_DATA[kind](record)
+
+
+# --- PDF ---
+
+def render_pdf(kind, data):
+    """PDF-чек по макету kind и данным из receipt_data() (см. receipt_pdf)"""
+    from .receipt_pdf import render_pdf as render
+
+    return render(kind, data)
+
+
+def preload_pdf():
+    """Загружает ReportLab, шрифты и стили чеков заранее, до первого PDF"""
+    from . import receipt_pdf  # noqa: F401
+
+
+# --- ESC/POS ---
+
+ESCPOS_RULE = "─" * 32
+
+
+def _escpos_commands(printer, kind, data):
+    for element in RECEIPT_LAYOUTS[kind]:
+        if isinstance(element, Title):
+            printer.set(align='center', font='a', width=1, height=2)
+            printer.text(f"{element.text}\n")
+            printer.set(align='left', font='a', width=1, height=1)
+            printer.text("\n")
+        elif isinstance(element, Field):
+            if element.large:
+                printer.set(align='left', font='a', width=2, height=2)
+            printer.text(f"{_(element.label)}: {data[element.key]}{element.suffix}\n")
+            if element.large:
+                printer.set(align='left', font='a', width=1, height=1)
+        elif isinstance(element, Caption):
+            printer.text(f"{_(element.label)}: {_(element.value)}\n")
+        elif isinstance(element, Rule):
+            printer.text(ESCPOS_RULE + "\n\n")
+        elif isinstance(element, Note):
+            printer.set(align='center', font='a', width=1, height=1)
+            printer.text(f"{_(element.text)}\n\n")
+        else:
+            printer.text(f"{_(element.label)}: {data[element.key]}\n\n")
+
+
+def render_escpos(kind, data):
+    """
+    Буфер команд ESC/POS (без отрезки) для отправки на принтер одной записью.
+    Команды собираются виртуальным принтером python-escpos (Dummy), поэтому
+    кодовые страницы для кириллицы и псевдографики выбираются так же, как при печати напрямую.
+    """
+    from escpos.printer import Dummy
+
+    printer = Dummy()
+    _escpos_commands(printer, kind, data)
+    return printer.output
+
+
+def send_escpos(printer, commands):
+    """Отправляет готовый буфер на принтер python-escpos одной записью"""
+    printer._raw(commands)
+
+
+# --- Параллельная генерация (ProcessPoolExecutor) ---
+# Функции для дочерних процессов лежат здесь, а не рядом с моделями:
+# модуль импортируется без готового реестра приложений Django.
+
+def init_render_worker():
+    """Инициализация дочернего процесса (нужна при запуске процессов через spawn: Windows, macOS)"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def render_pdf_chunk(language, items):
+    """
+    PDF для пачки чеков. items - [(kind, data, filename), ...];
+    возвращает [(filename, pdf), ...] в том же порядке.
+    """
+    from django.utils import translation
+
+    with translation.override(language):
+        return [(filename, render_pdf(kind, data)) for kind, data, filename in items]
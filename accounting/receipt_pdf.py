@@ -0,0 +1,87 @@
+"""
+PDF-чеки через ReportLab по макетам receipt_engine.RECEIPT_LAYOUTS.
+
+Модуль загружается при первом PDF-чеке (receipt_engine.render_pdf), а на
+веб-сервере - при запуске (AccountingConfig.ready): импорт ReportLab,
+регистрация шрифтов и создание стилей выполняются один раз на процесс.
+"""
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.utils.translation import gettext as _
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from .pdf_fonts import pdf_font_names
+from .receipt_engine import RECEIPT_LAYOUTS, Caption, Field, Note, Rule, Title
+from .request_timing import STAGE_PDF, timed
+
+
+PDF_PAGE_SIZE = (80 * mm, 200 * mm)  # Размер чека (80mm ширина, 200mm высота)
+PDF_MARGIN = 5 * mm
+# Шрифт с азербайджанскими и кириллическими символами (Helvetica их не содержит)
+PDF_FONT, PDF_BOLD_FONT = pdf_font_names()
+
+_sample_styles = getSampleStyleSheet()
+PDF_TITLE_STYLE = ParagraphStyle(
+    'ReceiptTitle',
+    parent=_sample_styles['Heading1'],
+    fontSize=14,
+    textColor=colors.black,
+    spaceAfter=6,
+    alignment=TA_CENTER,
+    fontName=PDF_BOLD_FONT,
+)
+PDF_NORMAL_STYLE = ParagraphStyle(
+    'ReceiptNormal',
+    parent=_sample_styles['Normal'],
+    fontSize=10,
+    textColor=colors.black,
+    alignment=TA_LEFT,
+    fontName=PDF_FONT,
+)
+PDF_CENTER_STYLE = ParagraphStyle(
+    'ReceiptCenter',
+    parent=PDF_NORMAL_STYLE,
+    alignment=TA_CENTER,
+)
+PDF_RULE = "─" * 30
+
+
+def pdf_flowables(element, data):
+    """Flowable-элементы ReportLab для одного элемента макета"""
+    if isinstance(element, Title):
+        return [Paragraph(escape(element.text), PDF_TITLE_STYLE), Spacer(1, 3 * mm)]
+    if isinstance(element, Field):
+        text = f"<b>{escape(_(element.label))}:</b> {escape(str(data[element.key]))}{element.suffix}"
+        return [Paragraph(text, PDF_NORMAL_STYLE), Spacer(1, 2 * mm)]
+    if isinstance(element, Caption):
+        text = f"<b>{escape(_(element.label))}:</b> {escape(_(element.value))}"
+        return [Paragraph(text, PDF_NORMAL_STYLE), Spacer(1, 2 * mm)]
+    if isinstance(element, Rule):
+        return [Paragraph(PDF_RULE, PDF_CENTER_STYLE), Spacer(1, 2 * mm)]
+    if isinstance(element, Note):
+        return [Paragraph(escape(_(element.text)), PDF_CENTER_STYLE), Spacer(1, 2 * mm)]
+    return [Paragraph(f"{escape(_(element.label))}: {data[element.key]}", PDF_NORMAL_STYLE)]
+
+
+def render_pdf(kind, data):
+    """PDF-чек по макету kind и данным из receipt_data()"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=PDF_PAGE_SIZE,
+        rightMargin=PDF_MARGIN,
+        leftMargin=PDF_MARGIN,
+        topMargin=PDF_MARGIN,
+        bottomMargin=PDF_MARGIN,
+    )
+    story = []
+    for element in RECEIPT_LAYOUTS[kind]:
+        story.extend(pdf_flowables(element, data))
+    with timed(STAGE_PDF):
+        doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,120 @@
+"""
+Справочники для страниц: список сотрудников и имена клиентов.
+
+Главная страница и отчеты выводят список сотрудников при каждой отрисовке, а
+он меняется редко. Поэтому список хранится в кэше 'reference' (см. CACHES в
+settings; общий файловый кэш, чтобы сброс доходил до всех воркеров gunicorn)
+и сбрасывается сигналами post_save/post_delete Worker и User. Имя клиента для
+фильтра отчетов кэшируется по id и сбрасывается при сохранении или удалении
+этого клиента.
+
+Балансы в справочники не попадают: они меняются UPDATE-ом без сигналов (ledger.py).
+Записи, созданные в обход сигналов (bulk_create в sync.pull), сбрасываются clear().
+"""
+from django.contrib.auth.models import User
+from django.core.cache import InvalidCacheBackendError, caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Client, Worker
+
+
+REFERENCE_CACHE_ALIAS = 'reference'
+
+WORKERS_KEY = 'reference:workers'
+
+
+def _reference_cache():
+    try:
+        return caches[REFERENCE_CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _client_key(client_id):
+    return f'reference:client:{client_id}'
+
+
+def _worker_row(worker):
+    user = worker.user
+    return {
+        'id': worker.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'display_name': user.get_full_name() or user.username,
+    }
+
+
+def workers():
+    """
+    Сотрудники по логину: [{'id', 'username', 'first_name', 'last_name', 'display_name'}, ...].
+    Без запросов к БД, пока список не изменился.
+    """
+    cache = _reference_cache()
+    rows = cache.get(WORKERS_KEY)
+    if rows is None:
+        rows = [
+            _worker_row(worker)
+            for worker in Worker.objects.select_related('user').order_by('user__username')
+        ]
+        cache.set(WORKERS_KEY, rows)
+    return rows
+
+
+def filter_workers(rows, query):
+    """Сотрудники, у которых логин, имя или фамилия содержат query (без учета регистра)"""
+    query = query.casefold()
+    return [
+        row for row in rows
+        if any(query in row[field].casefold() for field in ('username', 'first_name', 'last_name'))
+    ]
+
+
+def worker_by_id(worker_id):
+    """Строка справочника сотрудника или None"""
+    return next((row for row in workers() if row['id'] == worker_id), None)
+
+
+def client_name(client_id):
+    """Имя клиента по id или None, если клиента нет"""
+    cache = _reference_cache()
+    key = _client_key(client_id)
+    name = cache.get(key)
+    if name is None:
+        name = Client.objects.filter(id=client_id).values_list('full_name', flat=True).first()
+        if name is not None:
+            cache.set(key, name)
+    return name
+
+
+def clear():
+    """Сбрасывает список сотрудников (после изменений в обход сигналов)"""
+    _reference_cache().delete(WORKERS_KEY)
+
+
+def _delete(key, using):
+    cache = _reference_cache()
+    cache.delete(key)
+    # Повторно после фиксации: иначе параллельный запрос успеет закэшировать старые данные
+    transaction.on_commit(lambda: cache.delete(key), using=using)
+
+
+def _workers_changed(sender, using, update_fields=None, **kwargs):
+    if sender is User and update_fields and set(update_fields) <= {'last_login'}:
+        return  # вход в систему: справочник не меняется
+    _delete(WORKERS_KEY, using)
+
+
+def _client_changed(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields and 'full_name' not in update_fields:
+        return
+    _delete(_client_key(instance.pk), using)
+
+
+def connect_signals():
+    for model in (Worker, User):
+        post_save.connect(_workers_changed, sender=model, dispatch_uid=f'reference_workers_save_{model.__name__}')
+        post_delete.connect(_workers_changed, sender=model, dispatch_uid=f'reference_workers_delete_{model.__name__}')
+    post_save.connect(_client_changed, sender=Client, dispatch_uid='reference_client_save')
+    post_delete.connect(_client_changed, sender=Client, dispatch_uid='reference_client_delete')
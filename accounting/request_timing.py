@@ -0,0 +1,284 @@
+"""
+Замер времени запросов: SQL, шаблоны, PDF и принтер.
+
+RequestTimingMiddleware для каждого запроса к представлению считает:
+  db       - число SQL-запросов и их суммарное время (обертка execute_wrappers
+             на всех соединениях, в т.ч. в потоках sync_to_async);
+  template - отрисовку шаблонов (бэкенд TimedDjangoTemplates, см. TEMPLATES);
+             запросы, выполненные во время отрисовки, входят и в db;
+  pdf      - формирование PDF (ReportLab);
+  printer  - обмен с термопринтером.
+
+Результат уходит в заголовок Server-Timing (вкладка Network в браузере), в
+строку журнала 'accounting.request_timing' (key=value) и в статистику по
+представлениям за последние REQUEST_TIMING_WINDOW секунд (страница
+performance/, только для персонала). Печать идет в фоновом потоке очереди,
+поэтому задания печати замеряются отдельно (track) и видны там же.
+
+Статистика хранится в памяти процесса: у каждого воркера gunicorn своя.
+"""
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+
+logger = logging.getLogger('accounting.request_timing')
+
+# Этапы в порядке вывода
+STAGE_DB = 'db'
+STAGE_TEMPLATE = 'template'
+STAGE_PDF = 'pdf'
+STAGE_PRINTER = 'printer'
+STAGES = (STAGE_DB, STAGE_TEMPLATE, STAGE_PDF, STAGE_PRINTER)
+
+# Окно статистики по умолчанию (секунды) и предел замеров на одно представление
+WINDOW_SECONDS = 15 * 60
+MAX_SAMPLES_PER_VIEW = 2000
+
+PERCENTILES = (50, 90, 99)
+
+
+class _Timings:
+    __slots__ = ('db_count', 'durations')
+
+    def __init__(self):
+        self.db_count = 0
+        self.durations = dict.fromkeys(STAGES, 0.0)
+
+
+# Замер текущего запроса; вне запроса (команды, фоновые потоки) - None
+_current = ContextVar('fleks_request_timing', default=None)
+
+
+@contextmanager
+def timed(stage):
+    """Добавляет время блока к этапу stage текущего запроса (вне запроса ничего не делает)"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[stage] += time.perf_counter() - started
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_count += 1
+        timings.durations[STAGE_DB] += time.perf_counter() - started
+
+
+def _install_sql_wrapper(connection):
+    # Объект соединения потока переиспользуется после закрытия: обертка добавляется один раз
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install_sql_wrapper(connection)
+
+
+def connect_signals():
+    """Обертка SQL добавляется к каждому новому соединению (AccountingConfig.ready)"""
+    if getattr(settings, 'REQUEST_TIMING', True):
+        connection_created.connect(_on_connection_created, dispatch_uid='request_timing_sql')
+
+
+# --- Шаблоны ---
+
+class _TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed(STAGE_TEMPLATE):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates с замером времени отрисовки (этап template)"""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# --- Статистика ---
+
+def _percentile(values, percent):
+    """Процентиль по ближайшему рангу; values отсортированы"""
+    index = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+class _Stats:
+    """Замеры по представлениям: (время, всего мс, SQL-запросов, мс по этапам...)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES_PER_VIEW))
+
+    def add(self, name, total, timings):
+        sample = (time.monotonic(), total * 1000, timings.db_count) + tuple(
+            timings.durations[stage] * 1000 for stage in STAGES
+        )
+        with self._lock:
+            self._samples[name].append(sample)
+
+    def summary(self, window):
+        """
+        Статистика за последние window секунд, самые медленные представления первыми:
+        [{'name', 'count', 'total': {'p50': мс, 'p90': мс, 'p99': мс}, 'max', 'db_count', <этап>: {...}}, ...]
+        """
+        cutoff = time.monotonic() - window
+        with self._lock:
+            samples = {name: [s for s in rows if s[0] >= cutoff] for name, rows in self._samples.items()}
+
+        result = []
+        for name, rows in samples.items():
+            if not rows:
+                continue
+            totals = sorted(row[1] for row in rows)
+            item = {
+                'name': name,
+                'count': len(rows),
+                'total': {f'p{p}': _percentile(totals, p) for p in PERCENTILES},
+                'max': totals[-1],
+                'db_count': sum(row[2] for row in rows) / len(rows),
+            }
+            for offset, stage in enumerate(STAGES, start=3):
+                values = sorted(row[offset] for row in rows)
+                item[stage] = {f'p{p}': _percentile(values, p) for p in PERCENTILES}
+            result.append(item)
+        result.sort(key=lambda item: item['total']['p90'], reverse=True)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+stats = _Stats()
+
+
+def window_seconds():
+    return getattr(settings, 'REQUEST_TIMING_WINDOW', WINDOW_SECONDS)
+
+
+def _log(name, total, timings, **fields):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    parts = [f'view={name}'] + [f'{key}={value}' for key, value in fields.items()]
+    parts.append(f'total_ms={total * 1000:.1f}')
+    parts.append(f'db_queries={timings.db_count}')
+    parts += [f'{stage}_ms={timings.durations[stage] * 1000:.1f}' for stage in STAGES]
+    logger.info(' '.join(parts))
+
+
+@contextmanager
+def track(name):
+    """
+    Замер работы вне запроса (например, задания печати в фоновом потоке):
+    этапы считаются так же, как в запросе, и попадают в статистику под именем name.
+    """
+    if not getattr(settings, 'REQUEST_TIMING', True) or _current.get() is not None:
+        yield
+        return
+    for connection in connections.all(initialized_only=True):
+        _install_sql_wrapper(connection)
+    timings = _Timings()
+    token = _current.set(timings)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        total = time.perf_counter() - started
+        stats.add(name, total, timings)
+        _log(name, total, timings)
+
+
+def server_timing(total, timings):
+    """Значение заголовка Server-Timing"""
+    durations = timings.durations
+    parts = [f'{STAGE_DB};dur={durations[STAGE_DB] * 1000:.1f};desc="SQL x{timings.db_count}"']
+    parts += [f'{stage};dur={durations[stage] * 1000:.1f}' for stage in STAGES[1:]]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class RequestTimingMiddleware:
+    """Замер запросов к представлениям: Server-Timing, журнал и статистика (REQUEST_TIMING)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # Под ASGI middleware работает в цикле событий, без перехода в поток
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Соединения этого потока, открытые до подключения сигнала
+        for connection in connections.all(initialized_only=True):
+            _install_sql_wrapper(connection)
+        timings = _Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # Запросы к БД выполняются в потоках sync_to_async: туда замер передается через контекст
+        timings = _Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, time.perf_counter() - started)
+
+    def _finish(self, request, response, timings, total):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # Статика и несуществующие адреса
+            return response
+        # Для потоковых ответов (выгрузки, архивы) - время до начала передачи
+        value = server_timing(total, timings)
+        if response.has_header('Server-Timing'):
+            value = f"{response['Server-Timing']}, {value}"
+        response['Server-Timing'] = value
+        stats.add(match.view_name, total, timings)
+        _log(match.view_name, total, timings, method=request.method, path=request.path, status=response.status_code)
+        return response
@@ -0,0 +1,66 @@
+"""
+Реестр возможностей схемы БД.
+
+Проверка наличия колонок выполняется один раз на процесс (и заново после
+migrate через сигнал post_migrate), а представления читают готовый флаг
+без запросов к БД.
+"""
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+CLIENT_TABLE = 'accounting_client'
+# Колонка, появившаяся вместе с новыми полями клиента (миграция 0006)
+NEW_CLIENT_FIELDS_COLUMN = 'date_of_birth'
+
+# Пока миграция не применена, перепроверяем не чаще, чем раз в RECHECK_INTERVAL секунд:
+# migrate мог быть выполнен из другого процесса
+RECHECK_INTERVAL = 60
+
+_lock = threading.Lock()
+_capabilities = {}
+_checked_at = None
+
+
+def _probe(using):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if CLIENT_TABLE not in connection.introspection.table_names(cursor):
+            return {'new_client_fields': False}
+        columns = {
+            column.name
+            for column in connection.introspection.get_table_description(cursor, CLIENT_TABLE)
+        }
+    return {'new_client_fields': NEW_CLIENT_FIELDS_COLUMN in columns}
+
+
+def refresh(using=DEFAULT_DB_ALIAS):
+    """
+    Заново проверяет схему и обновляет реестр. Возвращает словарь возможностей.
+    """
+    global _capabilities, _checked_at
+    try:
+        capabilities = _probe(using)
+    except Exception:
+        capabilities = {'new_client_fields': False}
+    with _lock:
+        _capabilities = capabilities
+        _checked_at = time.monotonic()
+    return capabilities
+
+
+def has_new_client_fields():
+    """Применена ли миграция с новыми полями клиента"""
+    if _checked_at is None or (
+        not _capabilities.get('new_client_fields')
+        and time.monotonic() - _checked_at > RECHECK_INTERVAL
+    ):
+        refresh()
+    return _capabilities.get('new_client_fields', False)
+
+
+def refresh_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Обработчик post_migrate"""
+    refresh(using=using)
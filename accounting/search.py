@@ -0,0 +1,95 @@
+"""
+Поиск клиентов для подсказок при вводе (typeahead).
+
+Поиск идет по нормализованному ключу Client.search_name (accounting/names.py),
+поэтому "Əli", "Eli" и "Эли" находят одного и того же клиента.
+Сначала ищутся совпадения с начала имени (B-tree индекс по search_name),
+затем совпадения в середине (на PostgreSQL - триграммный GIN-индекс, миграция 0015).
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from .models import Client
+from .names import normalize_name
+
+
+CLIENT_SEARCH_LIMIT = 20
+CLIENT_SEARCH_MAX_LIMIT = 50
+# Короткий кэш: в подсказке показывается баланс, он не должен долго устаревать
+CLIENT_SEARCH_CACHE_TIMEOUT = 10
+
+_SEARCH_FIELDS = ('id', 'full_name', 'balance', 'lessons_balance', 'default_session_amount')
+
+
+def _cache_key(key, limit):
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return f'client_search:{limit}:{digest}'
+
+
+def _serialize(row):
+    return {
+        'id': row['id'],
+        'full_name': row['full_name'],
+        'balance': str(row['balance']),
+        'lessons_balance': row['lessons_balance'],
+        'default_session_amount': (
+            str(row['default_session_amount']) if row['default_session_amount'] is not None else ''
+        ),
+    }
+
+
+def search_clients(query, limit=CLIENT_SEARCH_LIMIT):
+    """
+    Возвращает до limit клиентов, чье имя начинается с query или содержит его.
+    """
+    search_key = normalize_name(query)
+    limit = max(1, min(int(limit), CLIENT_SEARCH_MAX_LIMIT))
+    if not search_key:
+        return []
+
+    key = _cache_key(search_key, limit)
+    results = cache.get(key)
+    if results is not None:
+        return results
+
+    prefix_rows = list(
+        Client.objects.filter(search_name__startswith=search_key)
+        .order_by('full_name', 'id')
+        .values(*_SEARCH_FIELDS)[:limit]
+    )
+    rows = prefix_rows
+    if len(rows) < limit:
+        found_ids = [row['id'] for row in prefix_rows]
+        rows += list(
+            Client.objects.filter(search_name__contains=search_key)
+            .exclude(id__in=found_ids)
+            .order_by('full_name', 'id')
+            .values(*_SEARCH_FIELDS)[:limit - len(rows)]
+        )
+
+    results = [_serialize(row) for row in rows]
+    cache.set(key, results, CLIENT_SEARCH_CACHE_TIMEOUT)
+    return results
+
+
+def find_client_by_name(name):
+    """
+    Клиент по введенному имени: точное совпадение ключа, иначе единственный
+    клиент, чей ключ содержит введенное имя. Возвращает Client или None.
+    """
+    search_key = normalize_name(name)
+    if not search_key:
+        return None
+    candidates = list(Client.objects.filter(search_name=search_key)[:2])
+    if not candidates:
+        candidates = list(Client.objects.filter(search_name__contains=search_key)[:2])
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def client_name_taken(full_name, exclude_id=None):
+    """Есть ли уже клиент с таким же (после нормализации) именем"""
+    clients = Client.objects.filter(search_name=normalize_name(full_name))
+    if exclude_id is not None:
+        clients = clients.exclude(id=exclude_id)
+    return clients.exists()
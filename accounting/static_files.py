@@ -0,0 +1,41 @@
+"""
+WhiteNoise для ASGI.
+
+WhiteNoiseMiddleware 6.x работает только в синхронном режиме: под ASGI
+Django переносил бы ради нее каждый запрос в отдельный поток и обратно.
+Эта версия в асинхронном режиме ищет файл так же, как WhiteNoise, отдает
+его из потока, а остальные запросы передает дальше без перехода в поток.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .async_support import aiter_sync
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+            if response.streaming:
+                # Файл читается частями, а не собирается в памяти целиком
+                response.streaming_content = aiter_sync(response.streaming_content)
+            return response
+        return await self.get_response(request)
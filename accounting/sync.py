@@ -0,0 +1,436 @@
+"""
+Синхронизация локальной базы настольной версии с центральной БД.
+
+В локальном режиме (FLEKS_LOCAL_DB, см. settings) операции проводятся в
+SQLite на компьютере ресепшена и не зависят от интернета. Каждая операция
+и каждый новый клиент в той же транзакции записываются в очередь
+LedgerSyncItem (outbox). Фоновый поток, когда центральная БД доступна,
+отправляет очередь пачками: пачка - одна транзакция центральной БД,
+каждая запись - своя точка сохранения.
+
+Повторная отправка безопасна: запись создается в центральной БД с
+sync_uid = LedgerSyncItem.uid, и уже отправленная запись не дублируется.
+
+Конфликты балансов. Пока ресепшен работал без связи, баланс клиента могли
+изменить в центральной БД. Операция, уже проведенная на ресепшене, все равно
+проводится (списание допускает отрицательный баланс), а запись очереди
+получает статус "конфликт" с описанием - ее разбирают вручную в админке.
+После каждой пачки баланс клиента в локальной базе пересчитывается как
+баланс центральной БД плюс еще не отправленные локальные операции.
+
+Первичная загрузка (pull): пользователи, сотрудники, клиенты, дневные итоги
+и операции за последние дни копируются из центральной БД с теми же id.
+
+Проверка на двух локальных базах:
+    FLEKS_LOCAL_DB=local.sqlite3 DATABASE_URL=sqlite:///central.sqlite3 python manage.py sync_ledger --once
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import InterfaceError, OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import reference
+from .ledger import credit_balance, debit_balance, record_adjustment, record_deposit, record_session
+from .models import (
+    Client, ClientBalanceAdjustment, ClientDeposit, DailyLedgerSummary, LedgerSyncItem, PrintJob, Transaction,
+    Worker,
+)
+
+
+logger = logging.getLogger(__name__)
+
+CENTRAL_ALIAS = 'central'
+
+SYNC_BATCH_SIZE = 100
+SYNC_INTERVAL = 60
+# После стольких неудачных попыток запись получает статус "ошибка" и больше не отправляется
+SYNC_MAX_ATTEMPTS = 10
+# Операции за сколько последних дней копируются при первичной загрузке
+PULL_DAYS = 90
+PULL_BATCH_SIZE = 1000
+
+# Ошибки связи: пачка откатывается целиком и будет отправлена позже
+CONNECTION_ERRORS = (OperationalError, InterfaceError)
+
+_OPERATION_MODELS = {
+    LedgerSyncItem.KIND_SESSION: Transaction,
+    LedgerSyncItem.KIND_DEPOSIT: ClientDeposit,
+    LedgerSyncItem.KIND_ADJUSTMENT: ClientBalanceAdjustment,
+}
+
+# Поля клиента, которые не переносятся при создании клиента в центральной БД
+_CLIENT_SKIP_FIELDS = ('id', 'user', 'balance', 'sync_uid', *Client.LIFETIME_TOTAL_FIELDS)
+
+
+class SyncError(Exception):
+    """Запись нельзя отправить (но связь с центральной БД есть)"""
+
+
+def sync_enabled():
+    return CENTRAL_ALIAS in settings.DATABASES
+
+
+def central_available():
+    """Есть ли связь с центральной БД"""
+    if not sync_enabled():
+        return False
+    try:
+        connections[CENTRAL_ALIAS].ensure_connection()
+    except CONNECTION_ERRORS:
+        connections[CENTRAL_ALIAS].close()
+        return False
+    return True
+
+
+# Очередь
+
+def queue_sync(kind, object_id, client_id, balance_delta):
+    """
+    Ставит запись в очередь отправки. Вызывается внутри transaction.atomic()
+    операции (accounting/ledger.py); без центральной БД ничего не делает.
+    """
+    if not sync_enabled():
+        return None
+    item = LedgerSyncItem.objects.create(
+        kind=kind,
+        object_id=object_id,
+        client_id_local=client_id,
+        balance_delta=balance_delta,
+    )
+    model = Client if kind == LedgerSyncItem.KIND_CLIENT else _OPERATION_MODELS[kind]
+    model.objects.filter(pk=object_id).update(sync_uid=item.uid)
+    transaction.on_commit(wake_worker)
+    return item
+
+
+def queue_client_sync(client):
+    """Новый клиент: создается в центральной БД с начальным балансом"""
+    return queue_sync(LedgerSyncItem.KIND_CLIENT, client.pk, client.pk, client.balance)
+
+
+# Отправка
+
+def _central_client_id(client_id_local, mapping):
+    """
+    id клиента в центральной БД. Клиент, созданный локально, берется из его
+    записи очереди; клиенты из первичной загрузки имеют те же id.
+    """
+    if client_id_local not in mapping:
+        item = LedgerSyncItem.objects.filter(
+            kind=LedgerSyncItem.KIND_CLIENT, object_id=client_id_local,
+        ).values('status', 'central_id').first()
+        if item is None:
+            mapping[client_id_local] = client_id_local
+        elif item['central_id'] is not None:
+            mapping[client_id_local] = item['central_id']
+        else:
+            raise SyncError(f"Клиент #{client_id_local} еще не отправлен в центральную БД")
+    return mapping[client_id_local]
+
+
+def _push_client(item, mapping):
+    existing = Client.objects.using(CENTRAL_ALIAS).filter(sync_uid=item.uid).values_list('id', flat=True).first()
+    if existing is not None:
+        return existing, ''
+
+    client = Client.objects.get(pk=item.object_id)
+    # Клиенты никогда не объединяются по имени: однофамильцы - разные люди, и деньги
+    # одного не должны попасть на баланс другого. Совпадение имени только отмечается
+    # для проверки вручную
+    namesake = (
+        Client.objects.using(CENTRAL_ALIAS).filter(search_name=client.search_name)
+        .order_by('id').values_list('id', flat=True).first()
+    )
+    central = Client.objects.db_manager(CENTRAL_ALIAS).create(
+        **{
+            field.attname: getattr(client, field.attname)
+            for field in Client._meta.concrete_fields
+            if field.name not in _CLIENT_SKIP_FIELDS
+        },
+        balance=0,
+        sync_uid=item.uid,
+    )
+    Client.objects.using(CENTRAL_ALIAS).filter(pk=central.pk).update(created_at=client.created_at)
+    conflict = ''
+    if namesake is not None:
+        conflict = (
+            f"Клиент с таким именем уже есть в центральной БД (#{namesake}); создан отдельный клиент "
+            f"#{central.pk}, проверьте, не дубликат ли это"
+        )
+    if item.balance_delta:
+        credit_balance(central.pk, item.balance_delta, using=CENTRAL_ALIAS)
+    mapping[item.object_id] = central.pk
+    return central.pk, conflict
+
+
+def _push_operation(item, mapping):
+    model = _OPERATION_MODELS[item.kind]
+    existing = model.objects.using(CENTRAL_ALIAS).filter(sync_uid=item.uid).values_list('id', flat=True).first()
+    if existing is not None:
+        return existing, ''
+
+    try:
+        record = model.objects.get(pk=item.object_id)
+    except model.DoesNotExist:
+        raise SyncError("Операция удалена из локальной базы")
+    client_id = _central_client_id(item.client_id_local, mapping)
+
+    if item.kind == LedgerSyncItem.KIND_DEPOSIT:
+        balance, lessons_balance = credit_balance(client_id, record.amount, using=CENTRAL_ALIAS)
+        values = {'amount': record.amount, 'lessons_added': record.lessons_added}
+    else:
+        amount = record.amount if item.kind == LedgerSyncItem.KIND_SESSION else record.amount_removed
+        # Операция уже проведена на ресепшене: списываем даже при нехватке средств
+        balance, lessons_balance = debit_balance(client_id, amount, using=CENTRAL_ALIAS, allow_overdraft=True)
+        if item.kind == LedgerSyncItem.KIND_SESSION:
+            values = {
+                'worker_id': record.worker_id,
+                'amount': record.amount,
+                'lessons_count': record.lessons_count,
+                'receipt_printed': record.receipt_printed,
+            }
+        else:
+            values = {'amount_removed': record.amount_removed, 'lessons_removed': record.lessons_removed}
+
+    central = model.objects.db_manager(CENTRAL_ALIAS).create(
+        client_id=client_id,
+        balance_after=balance,
+        lessons_balance_after=lessons_balance,
+        sync_uid=item.uid,
+        **values,
+    )
+    # Время операции - когда она проведена на ресепшене, а не когда отправлена
+    model.objects.using(CENTRAL_ALIAS).filter(pk=central.pk).update(date_time=record.date_time)
+    central.date_time = record.date_time
+
+    if item.kind == LedgerSyncItem.KIND_SESSION:
+        record_session(central, using=CENTRAL_ALIAS)
+    elif item.kind == LedgerSyncItem.KIND_DEPOSIT:
+        record_deposit(central, using=CENTRAL_ALIAS)
+    else:
+        record_adjustment(central, using=CENTRAL_ALIAS)
+
+    conflict = ''
+    if balance < 0:
+        conflict = f"Баланс клиента в центральной БД после операции отрицательный: {balance}"
+    return central.pk, conflict
+
+
+def _push_item(item, mapping):
+    if item.kind == LedgerSyncItem.KIND_CLIENT:
+        return _push_client(item, mapping)
+    return _push_operation(item, mapping)
+
+
+def _reconcile_balances(client_ids):
+    """
+    Баланс клиента в локальной базе = баланс центральной БД + еще не отправленные
+    локальные операции. client_ids - {локальный id: id в центральной БД}.
+    """
+    central_balances = dict(
+        Client.objects.using(CENTRAL_ALIAS)
+        .filter(pk__in=set(client_ids.values()))
+        .values_list('id', 'balance')
+    )
+    with transaction.atomic():
+        pending = dict(
+            LedgerSyncItem.objects.filter(
+                status=LedgerSyncItem.STATUS_PENDING, client_id_local__in=list(client_ids),
+            ).values('client_id_local').annotate(total=Sum('balance_delta')).values_list('client_id_local', 'total')
+        )
+        for local_id, central_id in client_ids.items():
+            if central_id not in central_balances:
+                continue
+            Client.objects.filter(pk=local_id).update(
+                balance=central_balances[central_id] + (pending.get(local_id) or 0),
+            )
+
+
+def push_batch(batch_size=SYNC_BATCH_SIZE, after_id=0):
+    """
+    Отправляет одну пачку очереди (записи с id больше after_id).
+    Возвращает обработанные записи; при потере связи пачка откатывается
+    и исключение пробрасывается.
+    """
+    items = list(
+        LedgerSyncItem.objects.filter(status=LedgerSyncItem.STATUS_PENDING, id__gt=after_id)
+        .order_by('id')[:batch_size]
+    )
+    if not items:
+        return items
+
+    mapping = {}
+    results = []
+    with transaction.atomic(using=CENTRAL_ALIAS):
+        for item in items:
+            try:
+                with transaction.atomic(using=CENTRAL_ALIAS):
+                    central_id, conflict = _push_item(item, mapping)
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                results.append((item, None, str(e)))
+            else:
+                results.append((item, central_id, conflict))
+
+    # Центральная БД зафиксирована; если отметки ниже не запишутся,
+    # повторная отправка найдет записи по sync_uid
+    now = timezone.now()
+    touched = {}
+    with transaction.atomic():
+        for item, central_id, message in results:
+            if central_id is None:
+                attempts = item.attempts + 1
+                LedgerSyncItem.objects.filter(pk=item.pk).update(
+                    attempts=attempts,
+                    last_error=message,
+                    status=LedgerSyncItem.STATUS_FAILED if attempts >= SYNC_MAX_ATTEMPTS else item.status,
+                )
+                if attempts >= SYNC_MAX_ATTEMPTS:
+                    logger.error("Синхронизация %s #%s не удалась: %s", item.kind, item.object_id, message)
+                continue
+            LedgerSyncItem.objects.filter(pk=item.pk).update(
+                status=LedgerSyncItem.STATUS_CONFLICT if message else LedgerSyncItem.STATUS_DONE,
+                attempts=item.attempts + 1,
+                last_error=message,
+                central_id=central_id,
+                synced_at=now,
+            )
+            touched[item.client_id_local] = (
+                central_id if item.kind == LedgerSyncItem.KIND_CLIENT else mapping.get(item.client_id_local)
+            )
+
+    _reconcile_balances({local_id: central_id for local_id, central_id in touched.items() if central_id})
+    return items
+
+
+def sync_once(batch_size=SYNC_BATCH_SIZE):
+    """
+    Отправляет всю очередь, если центральная БД доступна.
+    Возвращает количество обработанных записей или None без связи.
+    """
+    if not central_available():
+        return None
+    processed = 0
+    last_id = 0
+    try:
+        while True:
+            # Записи с ошибкой остаются в очереди: в этом проходе они повторно не отправляются
+            items = push_batch(batch_size, after_id=last_id)
+            processed += len(items)
+            if len(items) < batch_size:
+                break
+            last_id = items[-1].id
+    except CONNECTION_ERRORS as e:
+        logger.warning("Связь с центральной БД потеряна: %s", e)
+        connections[CENTRAL_ALIAS].close()
+    return processed
+
+
+# Первичная загрузка
+
+def _copy(model, queryset, batch_size, upsert=False):
+    """Копирует строки центральной БД в локальную с теми же id"""
+    fields = [field for field in model._meta.concrete_fields]
+    update_fields = [field.name for field in fields if not field.primary_key]
+    rows = []
+    copied = 0
+    for values in queryset.values(*[field.attname for field in fields]).iterator(chunk_size=batch_size):
+        rows.append(model(**values))
+        if len(rows) >= batch_size:
+            copied += _insert(model, rows, upsert, update_fields)
+            rows = []
+    if rows:
+        copied += _insert(model, rows, upsert, update_fields)
+    return copied
+
+
+def _insert(model, rows, upsert, update_fields):
+    if upsert:
+        model.objects.bulk_create(rows, update_conflicts=True, unique_fields=['id'], update_fields=update_fields)
+    else:
+        model.objects.bulk_create(rows)
+    return len(rows)
+
+
+def pull(days=PULL_DAYS, batch_size=PULL_BATCH_SIZE):
+    """
+    Заменяет данные локальной базы копией центральной: пользователи и сотрудники
+    (обновляются), клиенты, дневные итоги и операции за последние days дней.
+    Возвращает {модель: количество строк}. Только при пустой очереди отправки и печати:
+    иначе локальные операции или их чеки были бы потеряны.
+    """
+    if LedgerSyncItem.objects.filter(status=LedgerSyncItem.STATUS_PENDING).exists():
+        raise SyncError("В очереди есть неотправленные операции: сначала выполните синхронизацию")
+    if PrintJob.objects.filter(status=PrintJob.STATUS_PENDING).exists():
+        raise SyncError("В очереди печати есть чеки: дождитесь их печати")
+
+    since = timezone.now() - timedelta(days=days)
+    central = {model: model.objects.using(CENTRAL_ALIAS) for model in (
+        User, Worker, Client, DailyLedgerSummary, Transaction, ClientDeposit, ClientBalanceAdjustment,
+    )}
+    counts = {}
+    with transaction.atomic():
+        for model in (Transaction, ClientDeposit, ClientBalanceAdjustment, DailyLedgerSummary):
+            model.objects.all().delete()
+        LedgerSyncItem.objects.all().delete()
+        Client.objects.all().delete()
+
+        counts[User] = _copy(User, central[User].order_by('id'), batch_size, upsert=True)
+        counts[Worker] = _copy(Worker, central[Worker].order_by('id'), batch_size, upsert=True)
+        counts[Client] = _copy(Client, central[Client].order_by('id'), batch_size)
+        counts[DailyLedgerSummary] = _copy(DailyLedgerSummary, central[DailyLedgerSummary].order_by('id'), batch_size)
+        for model in (Transaction, ClientDeposit, ClientBalanceAdjustment):
+            counts[model] = _copy(model, central[model].filter(date_time__gte=since).order_by('id'), batch_size)
+    # Сотрудники скопированы без сигналов: кэш справочника сбрасывается вручную
+    reference.clear()
+    return counts
+
+
+# Фоновый поток
+
+class _SyncWorker(threading.Thread):
+    """Отправляет очередь по сигналу или раз в LEDGER_SYNC_INTERVAL секунд"""
+
+    def __init__(self):
+        super().__init__(name='ledger-sync', daemon=True)
+        self.wakeup = threading.Event()
+
+    def run(self):
+        interval = getattr(settings, 'LEDGER_SYNC_INTERVAL', SYNC_INTERVAL)
+        batch_size = getattr(settings, 'LEDGER_SYNC_BATCH_SIZE', SYNC_BATCH_SIZE)
+        while True:
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+            close_old_connections()
+            try:
+                sync_once(batch_size)
+            except Exception as e:
+                logger.exception("Ошибка синхронизации с центральной БД: %s", e)
+            finally:
+                connection.close()
+                connections[CENTRAL_ALIAS].close()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    """
+    Будит фоновый поток синхронизации (запуская его при первом обращении).
+    С LEDGER_SYNC_WORKER_THREAD = False очередь отправляет только команда sync_ledger.
+    """
+    global _worker
+    if not sync_enabled() or not getattr(settings, 'LEDGER_SYNC_WORKER_THREAD', True):
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = _SyncWorker()
+            _worker.start()
+    _worker.wakeup.set()
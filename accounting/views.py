@@ -1,8 +1,11 @@
+import logging
+
 from django.db.models import Sum, Q
-from django.shortcuts import render, redirect, get_object_or_404
-from django.db import transaction, connection
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.db import connection, transaction
 from django.db.utils import ProgrammingError
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.urls import reverse
@@ -11,35 +14,47 @@ from django.utils.translation import gettext_lazy as _, gettext
 from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
 from io import BytesIO
-import os
-from .models import Client, Worker, Transaction, ClientDeposit, ClientBalanceAdjustment
+from .models import Client, Worker, Transaction, ClientDeposit, ClientBalanceAdjustment, PrintJob
 from django.contrib.auth.decorators import login_required, user_passes_test
-from .receipt_utils import generate_pdf_receipt, print_to_thermal_printer, generate_receipt_response, print_receipt_for_deposit
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-def _has_new_client_fields():
-    """Проверяет, существуют ли новые поля в таблице Client"""
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='accounting_client' AND column_name='date_of_birth'
-            """)
-            return cursor.fetchone() is not None
-    except Exception:
-        return False
+from django.views.decorators.cache import never_cache
+from .clients import (
+    CLIENT_SORTS, DEFAULT_SORT, clients_page, decode_cursor as decode_client_cursor, estimated_count,
+    filter_clients,
+)
+from .async_support import arender, is_asgi, run_in_render_pool
+from .db_routing import replica_reads
+from .exports import EXPORT_FORMATS, stream_operations_export
+from .ledger import InsufficientFunds, asummary_totals, post_adjustment, post_deposit, post_session
+from .pdf_fonts import pdf_font_names
+from .operations import (
+    KIND_ADJUSTMENT, KIND_DEPOSIT, KIND_TRANSACTION, OperationsFeed, aiter_operations, aoperations_page,
+    decode_cursor, filter_by_period, operations_union,
+)
+from .schema import has_new_client_fields
+from .search import CLIENT_SEARCH_LIMIT, client_name_taken, find_client_by_name, search_clients
+from .sync import queue_client_sync
+from .print_queue import enqueue_receipt
+from . import reference
+from .printer import printer_manager
+from .receipt_archive import ARCHIVE_FORMATS, receipts_archive_response
+from . import receipt_engine
+from .request_timing import STAGE_PDF, stats as timing_stats, timed, window_seconds
+from .receipt_utils import generate_receipt_response, receipt_pdf_response_for, session_receipt_pdf_response
+
+logger = logging.getLogger(__name__)
+
+# Количество операций на одной странице отчета
+REPORTS_PAGE_SIZE = 100
+# Количество операций в ленте на главной странице
+DASHBOARD_FEED_SIZE = 20
+# Сколько последних операций каждого типа показывать в профиле клиента
+CLIENT_HISTORY_SIZE = 10
+
 
 def deposit_funds(request, client_id, amount):
     try:
         client = Client.objects.get(id=client_id)
-        client.balance += Decimal(amount)
-        client.save()
+        post_deposit(client, Decimal(amount))
         messages.success(request, f"Баланс клиента {client.full_name} пополнен на {amount}.")
     except Client.DoesNotExist:
         messages.error(request, "Клиент не найден.")
@@ -52,34 +67,24 @@ def process_session_payment(request, client_id, worker_id, session_cost, lessons
     lessons_count = int(lessons_count or 0)
 
     try:
-        client = Client.objects.select_for_update().get(id=client_id)
+        client = Client.objects.get(id=client_id)
         worker = Worker.objects.get(id=worker_id)
 
         if lessons_count < 0:
             messages.error(request, "Error: Lessons count cannot be negative.")
             return HttpResponse("Error: Invalid lessons count", status=400)
 
-        if client.balance < session_cost:
+        # taking money from balance of a client
+        try:
+            transaction_record = post_session(client, worker, session_cost, lessons_count)
+        except InsufficientFunds:
             messages.error(request, f"????????????: ???????????????????????? ?????????????? ???? ?????????????? ?????????????? {client.full_name}.")
             return HttpResponse("Error: Insufficient funds", status=400)
 
-        # taking money from balance of a client
-        client.balance -= session_cost
-        client.save()
-        transaction_record = Transaction.objects.create(
-            client=client,
-            worker=worker,
-            amount=session_cost,
-            receipt_printed=False,
-            lessons_count=lessons_count,
-            balance_after=client.balance,
-            lessons_balance_after=client.lessons_balance
-        )
-
         messages.success(request, "Оплата сеанса прошла успешно.")
 
-        # not implemented yet
-        print_receipt_for_session(transaction_record)
+        # Чек печатается фоновым обработчиком после фиксации транзакции
+        enqueue_receipt(PrintJob.KIND_SESSION, transaction_record.id)
 
         return HttpResponse("Payment successful and receipt printed", status=200)
 
@@ -91,43 +96,18 @@ def process_session_payment(request, client_id, worker_id, session_cost, lessons
         messages.error(request, f"Произошла непредвиденная ошибка: {e}")
         return HttpResponse(f"Server Error: {e}", status=500)
 
-def print_receipt_for_session(transaction_record):
+@never_cache
+def ready(request):
     """
-    Печатает чек для транзакции на принтер и обновляет статус
+    Проверка готовности: приложение загружено и БД отвечает.
+    run_app.py открывает браузер, как только она ответит; доступна без входа.
     """
     try:
-        # Пытаемся напечатать на термопринтер
-        print_success = print_to_thermal_printer(transaction_record)
-        
-        if not print_success:
-            # Если печать на принтер не удалась, выводим в консоль для отладки
-            balance_display = transaction_record.balance_after if transaction_record.balance_after is not None else transaction_record.client.balance
-            receipt_data = f"""
-*** ПСИХОЛОГИЧЕСКИЙ ЦЕНТР ***
-Дата: {transaction_record.date_time.strftime('%Y-%m-%d %H:%M:%S')}
----
-Клиент: {transaction_record.client.full_name}
-Сотрудник: {transaction_record.worker.user.get_full_name() or transaction_record.worker.user.username}
----
-Услуга: Сеанс психолога
-Сумма: {transaction_record.amount} AZN
-Уроки: {transaction_record.lessons_count}
----
-Баланс клиента: {balance_display} AZN
----
-Спасибо!
-"""
-            print("\n" + "=" * 40)
-            print("--- ПЕЧАТЬ ЧЕКА ---")
-            print(receipt_data)
-            print("=" * 40 + "\n")
-        
-        transaction_record.receipt_printed = True
-        transaction_record.save()
-        
+        connection.ensure_connection()
     except Exception as e:
-        print(f"Ошибка при печати чека: {e}")
-        # Не помечаем как напечатанный, если произошла ошибка
+        logger.warning("Проверка готовности: БД недоступна: %s", e)
+        return HttpResponse('database unavailable', status=503, content_type='text/plain')
+    return HttpResponse('ok', content_type='text/plain')
 
 
 def is_staff_user(user):
@@ -144,63 +124,56 @@ def logout_user(request):
     return redirect('/admin/login/')
 
 
-def _get_reports_pdf_font_names():
+def _operation_log_event(operation):
     """
-    Возвращает шрифты для PDF с поддержкой азербайджанских символов.
+    Преобразует строку журнала операций в событие для шаблона/PDF отчета.
     """
-    # Порядок важен: сначала Windows (текущий проект), затем Unix fallback.
-    font_candidates = [
-        {
-            'normal': r'C:\Windows\Fonts\arial.ttf',
-            'bold': r'C:\Windows\Fonts\arialbd.ttf',
-            'normal_name': 'FleksArial',
-            'bold_name': 'FleksArialBold',
-        },
-        {
-            'normal': r'C:\Windows\Fonts\segoeui.ttf',
-            'bold': r'C:\Windows\Fonts\segoeuib.ttf',
-            'normal_name': 'FleksSegoeUI',
-            'bold_name': 'FleksSegoeUIBold',
-        },
-        {
-            'normal': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-            'bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
-            'normal_name': 'FleksDejaVuSans',
-            'bold_name': 'FleksDejaVuSansBold',
-        },
-    ]
-
-    for candidate in font_candidates:
-        normal_path = candidate['normal']
-        bold_path = candidate['bold']
-        normal_name = candidate['normal_name']
-        bold_name = candidate['bold_name']
-
-        if not os.path.exists(normal_path):
-            continue
-
-        try:
-            registered_fonts = pdfmetrics.getRegisteredFontNames()
-            if normal_name not in registered_fonts:
-                pdfmetrics.registerFont(TTFont(normal_name, normal_path))
-
-            if os.path.exists(bold_path):
-                if bold_name not in registered_fonts:
-                    pdfmetrics.registerFont(TTFont(bold_name, bold_path))
-                return normal_name, bold_name
-
-            return normal_name, normal_name
-        except Exception:
-            continue
-
-    # Fallback: если TTF не удалось загрузить.
-    return 'Helvetica', 'Helvetica-Bold'
+    event = {
+        'date_time': operation.date_time,
+        'amount_positive': None,
+        'amount_negative': None,
+        'is_deposit': False,
+        'is_adjustment': False,
+    }
+    if operation.kind == KIND_DEPOSIT:
+        event.update({
+            'event_type': gettext('Top-up'),
+            'description': gettext('Client: %(client_name)s') % {'client_name': operation.client_name},
+            'amount_positive': operation.amount,
+            'css_class': 'deposit',
+            'deposit_id': operation.id,
+            'is_deposit': True,
+        })
+    elif operation.kind == KIND_ADJUSTMENT:
+        event.update({
+            'event_type': gettext('Top-up cancellation'),
+            'description': gettext('Client: %(client_name)s') % {'client_name': operation.client_name},
+            'amount_negative': operation.amount,
+            'css_class': 'payout',
+            'adjustment_id': operation.id,
+            'is_adjustment': True,
+        })
+    else:
+        event.update({
+            'event_type': gettext('Session (Income)'),
+            'description': f"{operation.client_name} -> {operation.worker_name}",
+            'amount_positive': operation.amount,
+            'css_class': 'income',
+            'transaction_id': operation.id,
+        })
+    return event
 
 
 def _generate_reports_pdf_response(context, as_attachment=False):
     """
     Генерирует PDF-отчет на основе уже подготовленного контекста страницы отчетов.
     """
+    # ReportLab загружается при первом отчете, а не при запуске приложения
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
     buffer = BytesIO()
     doc = SimpleDocTemplate(
         buffer,
@@ -211,7 +184,7 @@ def _generate_reports_pdf_response(context, as_attachment=False):
         bottomMargin=24,
     )
 
-    normal_font, bold_font = _get_reports_pdf_font_names()
+    normal_font, bold_font = pdf_font_names()
 
     styles = getSampleStyleSheet()
     title_style = ParagraphStyle(
@@ -303,7 +276,8 @@ def _generate_reports_pdf_response(context, as_attachment=False):
     else:
         story.append(Paragraph(gettext('No operations found for the selected period.'), normal_style))
 
-    doc.build(story)
+    with timed(STAGE_PDF):
+        doc.build(story)
     pdf = buffer.getvalue()
     buffer.close()
 
@@ -331,11 +305,7 @@ def dashboard(request):
                     if display_name:
                         # strip balance info if present e.g. "Name (10 AZN / Lessons: 3)"
                         name_only = display_name.split(' (', 1)[0].strip()
-                        candidate = Client.objects.filter(full_name__iexact=name_only).first()
-                        if not candidate:
-                            candidates = list(Client.objects.filter(full_name__icontains=name_only))
-                            if len(candidates) == 1:
-                                candidate = candidates[0]
+                        candidate = find_client_by_name(name_only)
                         if candidate:
                             client_id = str(candidate.id)
                 # Accept commas/whitespace
@@ -358,18 +328,10 @@ def dashboard(request):
                 client = Client.objects.get(id=client_id)
 
                 with transaction.atomic():
-                    client.balance += amount
-                    client.save()
-                    deposit = ClientDeposit.objects.create(
-                        client=client,
-                        amount=amount,
-                        lessons_added=0,
-                        balance_after=client.balance,
-                        lessons_balance_after=client.lessons_balance
-                    )
-                    
-                    # Печатаем чек для пополнения
-                    print_receipt_for_deposit(deposit)
+                    deposit = post_deposit(client, amount)
+
+                    # Чек печатается фоновым обработчиком после фиксации транзакции
+                    enqueue_receipt(PrintJob.KIND_DEPOSIT, deposit.id)
 
                 messages.success(request, gettext("Client %(client_name)s balance successfully topped up by %(amount)s.") % {
                     'client_name': client.full_name,
@@ -390,11 +352,7 @@ def dashboard(request):
                     display_name = (request.POST.get('client_session_display') or '').strip()
                     if display_name:
                         name_only = display_name.split(' (', 1)[0].strip()
-                        candidate = Client.objects.filter(full_name__iexact=name_only).first()
-                        if not candidate:
-                            candidates = list(Client.objects.filter(full_name__icontains=name_only))
-                            if len(candidates) == 1:
-                                candidate = candidates[0]
+                        candidate = find_client_by_name(name_only)
                         if candidate:
                             client_id = str(candidate.id)
 
@@ -434,32 +392,21 @@ def dashboard(request):
                     messages.error(request, gettext("Session error: Data is incorrect."))
                     return redirect('dashboard')
 
-                with transaction.atomic():
-                    client = Client.objects.select_for_update().get(id=client_id)
-                    worker = Worker.objects.select_for_update().get(id=worker_id)
+                client = Client.objects.get(id=client_id)
+                worker = Worker.objects.get(id=worker_id)
 
-                    if client.balance < session_cost:
+                with transaction.atomic():
+                    try:
+                        transaction_record = post_session(client, worker, session_cost, lessons_count)
+                    except InsufficientFunds:
                         messages.error(request, gettext("Error: Client %(client_name)s has insufficient funds.") % {
                             'client_name': client.full_name
                         })
                         return redirect('dashboard')
 
-                    client.balance -= session_cost
-                    client.save()
-
-
-                    transaction_record = Transaction.objects.create(
-                        client=client,
-                        worker=worker,
-                        amount=session_cost,
-                        receipt_printed=False,
-                        lessons_count=lessons_count,
-                        balance_after=client.balance,
-                        lessons_balance_after=client.lessons_balance
-                    )
+                    enqueue_receipt(PrintJob.KIND_SESSION, transaction_record.id)
 
-                    messages.success(request, gettext("Session payment processed successfully."))
-                    print_receipt_for_session(transaction_record)
+                messages.success(request, gettext("Session payment processed successfully."))
 
             except Client.DoesNotExist:
                 messages.error(request, gettext("Error: Client not found."))
@@ -474,71 +421,40 @@ def dashboard(request):
             return redirect(f"{request.path}?client_q={client_q}&worker_q={worker_q}")
         return redirect(f"{request.path}?client_q={client_q}&worker_q={worker_q}")
     else:
-        if _has_new_client_fields():
-            clients_qs = Client.objects.all().order_by('full_name')
-            workers_qs = Worker.objects.all().order_by('user__username')
-            # Получаем последние транзакции, депозиты и отмены пополнений
-            recent_transactions = Transaction.objects.select_related('client', 'worker__user').order_by('-date_time')[:20]
-            recent_deposits = ClientDeposit.objects.select_related('client').order_by('-date_time')[:20]
-            recent_adjustments = ClientBalanceAdjustment.objects.select_related('client').order_by('-date_time')[:20]
-            
-            # Объединяем в один список с пометкой типа
-            recent_operations = []
-            for tx in recent_transactions:
-                recent_operations.append({
-                    'type': 'transaction',
-                    'date_time': tx.date_time,
-                    'transaction': tx,
-                    'deposit': None
-                })
-            for dep in recent_deposits:
-                recent_operations.append({
-                    'type': 'deposit',
-                    'date_time': dep.date_time,
-                    'transaction': None,
-                    'deposit': dep
-                })
-            for adj in recent_adjustments:
-                recent_operations.append({
-                    'type': 'adjustment',
-                    'date_time': adj.date_time,
-                    'transaction': None,
-                    'deposit': None,
-                    'adjustment': adj
-                })
-            # Сортируем по дате и берем последние 20
-            recent_operations = sorted(recent_operations, key=lambda x: x['date_time'], reverse=True)[:20]
+        # Справочник сотрудников из кэша (accounting/reference.py), без запросов к БД
+        workers = reference.workers()
+        if has_new_client_fields():
+            # Лента последних операций: один UNION ALL, "Загрузить еще" по курсору
+            ops_cursor = decode_cursor((request.GET.get('ops_cursor') or '').strip())
+            recent_operations, ops_next_cursor = OperationsFeed(request).page(
+                limit=DASHBOARD_FEED_SIZE, cursor=ops_cursor,
+            )
         else:
             # Используем только существующие поля до применения миграции
             messages.warning(request, gettext("Database migration required. Please run: python manage.py migrate"))
-            clients_qs = []
-            workers_qs = Worker.objects.all().order_by('user__username')
-            recent_transactions = []
             recent_operations = []
+            ops_cursor = ops_next_cursor = None
 
-        if client_q:
-            clients_qs = clients_qs.filter(full_name__icontains=client_q).order_by('full_name')
         if worker_q:
-            workers_qs = workers_qs.filter(
-                Q(user__username__icontains=worker_q) |  # Поиск по логину
-                Q(user__first_name__icontains=worker_q) |  # Поиск по имени
-                Q(user__last_name__icontains=worker_q)  # Поиск по фамилии
-            ).order_by('user__username')
+            # Поиск по логину, имени и фамилии
+            workers = reference.filter_workers(workers, worker_q)
 
         context = {
-            'clients': clients_qs,
-            'workers': workers_qs,
-            'recent_transactions': recent_transactions,
-            'recent_operations': recent_operations if _has_new_client_fields() else [],
+            'workers': workers,
+            'recent_operations': recent_operations,
+            'ops_next_cursor': ops_next_cursor,
+            'ops_is_first_page': ops_cursor is None,
             'client_q': client_q,
             'worker_q': worker_q,
+            'printer_status': printer_manager.status(),
         }
         return render(request, 'accounting/dashboard.html', context)
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
-def reports(request):
-    # all reports
+async def reports(request):
+    # all reports (асинхронное представление: запросы через асинхронный ORM, PDF - в пуле потоков)
     context = {
         'current_filter_desc': gettext('all time'),
         'start_date_input': '',
@@ -555,8 +471,8 @@ def reports(request):
     selected_client_display = request.GET.get('client_display', '').strip()
     selected_worker_display = request.GET.get('worker_display', '').strip()
 
-    # date filtration
-    now = timezone.now().date()
+    # date filtration (дни считаются по местному времени, TIME_ZONE)
+    now = timezone.localdate()
     start_date = None
     end_date = None
     preset = (request.GET.get('preset') or '').strip()
@@ -596,7 +512,7 @@ def reports(request):
             messages.error(request, gettext("Invalid date format. Use: YYYY-MM-DD."))
 
     # basic QuerySets
-    if _has_new_client_fields():
+    if await sync_to_async(has_new_client_fields)():
         transactions_qs = Transaction.objects.select_related('client', 'worker__user').all()
         deposits_qs = ClientDeposit.objects.select_related('client').all()
         adjustments_qs = ClientBalanceAdjustment.objects.select_related('client').all()
@@ -604,25 +520,30 @@ def reports(request):
         # Если новые поля не существуют, показываем сообщение
         messages.error(request, gettext("Database migration required. Please run: python manage.py migrate"))
         context['unified_log'] = []
-        context['clients'] = []
-        context['workers'] = Worker.objects.select_related('user').all()
+        context['workers'] = await sync_to_async(reference.workers)()
         context['selected_client_id'] = selected_client_id or ''
         context['selected_worker_id'] = selected_worker_id or ''
-        return render(request, 'accounting/reports.html', context)
+        return await arender(request, 'accounting/reports.html', context)
     if start_date and end_date:
-        transactions_qs = transactions_qs.filter(date_time__date__gte=start_date, date_time__date__lte=end_date)
-        deposits_qs = deposits_qs.filter(date_time__date__gte=start_date, date_time__date__lte=end_date)
-        adjustments_qs = adjustments_qs.filter(date_time__date__gte=start_date, date_time__date__lte=end_date)
+        transactions_qs = filter_by_period(transactions_qs, start_date, end_date)
+        deposits_qs = filter_by_period(deposits_qs, start_date, end_date)
+        adjustments_qs = filter_by_period(adjustments_qs, start_date, end_date)
+
+    # Какие фильтры реально применены: от них зависит, можно ли брать итоги из дневной сводки
+    client_filter_applied = False
+    worker_filter_id = None
+    transaction_filter_applied = False
 
     if selected_client_id:
         try:
             transactions_qs = transactions_qs.filter(client_id=int(selected_client_id))
             deposits_qs = deposits_qs.filter(client_id=int(selected_client_id))
             adjustments_qs = adjustments_qs.filter(client_id=int(selected_client_id))
-            selected_client = Client.objects.filter(id=int(selected_client_id)).first()
-            if selected_client:
-                selected_client_name = selected_client.full_name
-                selected_client_display = selected_client.full_name
+            client_filter_applied = True
+            client_name = await sync_to_async(reference.client_name)(int(selected_client_id))
+            if client_name:
+                selected_client_name = client_name
+                selected_client_display = client_name
         except ValueError:
             messages.error(request, gettext("Invalid client identifier."))
 
@@ -633,9 +554,10 @@ def reports(request):
             # показываем только сеансы конкретного сотрудника.
             deposits_qs = deposits_qs.none()
             adjustments_qs = adjustments_qs.none()
-            selected_worker = Worker.objects.select_related('user').filter(id=int(selected_worker_id)).first()
+            worker_filter_id = int(selected_worker_id)
+            selected_worker = await sync_to_async(reference.worker_by_id)(int(selected_worker_id))
             if selected_worker:
-                selected_worker_name = selected_worker.user.get_full_name() or selected_worker.user.username
+                selected_worker_name = selected_worker['display_name']
                 selected_worker_display = selected_worker_name
         except ValueError:
             messages.error(request, gettext("Invalid worker identifier."))
@@ -647,12 +569,41 @@ def reports(request):
             transactions_qs = transactions_qs.filter(id=transaction_id_int)
             deposits_qs = deposits_qs.filter(id=transaction_id_int)
             adjustments_qs = adjustments_qs.filter(id=transaction_id_int)
+            transaction_filter_applied = True
         except ValueError:
             messages.error(request, gettext("Invalid transaction number. Please enter a valid number."))
 
-    total_income = transactions_qs.aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_deposits = deposits_qs.aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_adjustments = adjustments_qs.aggregate(Sum('amount_removed'))['amount_removed__sum'] or Decimal('0.00')
+    # Таблицы выгружаются потоком, итоги и страница журнала для них не нужны
+    export_format = (request.GET.get('export') or '').lower()
+    if export_format in EXPORT_FORMATS:
+        return stream_operations_export(
+            operations_union(transactions_qs, deposits_qs, adjustments_qs),
+            export_format,
+            asynchronous=is_asgi(request),
+        )
+    # Архив всех чеков за выбранный период с теми же фильтрами
+    if export_format.startswith('receipts_') and export_format[len('receipts_'):] in ARCHIVE_FORMATS:
+        # Многостраничный PDF собирается до ответа - в потоке запроса, а не в цикле событий
+        return await sync_to_async(receipts_archive_response)(
+            [
+                (receipt_engine.KIND_SESSION, transactions_qs),
+                (receipt_engine.KIND_DEPOSIT, deposits_qs),
+                (receipt_engine.KIND_ADJUSTMENT, adjustments_qs),
+            ],
+            export_format[len('receipts_'):],
+            asynchronous=is_asgi(request),
+        )
+
+    if client_filter_applied or transaction_filter_applied:
+        # По одному клиенту или номеру операции строк немного, считаем по сырым таблицам
+        total_income = (await transactions_qs.aaggregate(Sum('amount')))['amount__sum'] or Decimal('0.00')
+        total_deposits = (await deposits_qs.aaggregate(Sum('amount')))['amount__sum'] or Decimal('0.00')
+        total_adjustments = (
+            (await adjustments_qs.aaggregate(Sum('amount_removed')))['amount_removed__sum'] or Decimal('0.00')
+        )
+    else:
+        period = (start_date, end_date) if start_date and end_date else (None, None)
+        total_income, total_deposits, total_adjustments = await asummary_totals(*period, worker_id=worker_filter_id)
 
     context['total_income'] = total_income
     context['total_payouts'] = Decimal('0.00')
@@ -661,57 +612,17 @@ def reports(request):
     context['net_profit'] = total_income + total_deposits - total_adjustments
 
 
-    unified_log = []
-
-    for tx in transactions_qs:
-        unified_log.append({
-            'date_time': tx.date_time,
-            'event_type': gettext('Session (Income)'),
-            'description': f"{tx.client.full_name} -> {tx.worker.user.username}",
-            'amount_positive': tx.amount,
-            'amount_negative': None,
-            'css_class': 'income',
-            'transaction_id': tx.id,
-            'is_deposit': False
-        })
-
-    for deposit in deposits_qs:
-        unified_log.append({
-            'date_time': deposit.date_time,
-            'event_type': gettext('Top-up'),
-            'description': gettext('Client: %(client_name)s') % {'client_name': deposit.client.full_name},
-            'amount_positive': deposit.amount,
-            'amount_negative': None,
-            'css_class': 'deposit',
-            'deposit_id': deposit.id,
-            'is_deposit': True,
-            'is_adjustment': False
-        })
-
-    for adjustment in adjustments_qs:
-        unified_log.append({
-            'date_time': adjustment.date_time,
-            'event_type': gettext('Top-up cancellation'),
-            'description': gettext('Client: %(client_name)s') % {'client_name': adjustment.client.full_name},
-            'amount_positive': None,
-            'amount_negative': adjustment.amount_removed,
-            'css_class': 'payout',
-            'adjustment_id': adjustment.id,
-            'is_deposit': False,
-            'is_adjustment': True
-        })
-
-
-
-    context['unified_log'] = sorted(unified_log, key=lambda e: e['date_time'], reverse=True)
-
-
-    if _has_new_client_fields():
-        context['clients'] = Client.objects.all().order_by('full_name')
-    else:
-        context['clients'] = []
+    # Журнал операций: одна страница UNION ALL с keyset-курсором
+    cursor_param = (request.GET.get('cursor') or '').strip()
+    cursor = decode_cursor(cursor_param)
+    operations, next_cursor = await aoperations_page(
+        transactions_qs, deposits_qs, adjustments_qs,
+        cursor=cursor, limit=REPORTS_PAGE_SIZE,
+    )
+    context['unified_log'] = [_operation_log_event(op) for op in operations]
+    context['is_first_page'] = cursor is None
 
-    context['workers'] = Worker.objects.select_related('user').all().order_by('user__username')
+    context['workers'] = await sync_to_async(reference.workers)()
     context['selected_client_id'] = selected_client_id or ''
     context['selected_worker_id'] = selected_worker_id or ''
     context['selected_client_display'] = selected_client_display
@@ -728,6 +639,7 @@ def reports(request):
     preset_base_params.pop('end_date', None)
     preset_base_params.pop('export', None)
     preset_base_params.pop('download', None)
+    preset_base_params.pop('cursor', None)
 
     all_time_query = preset_base_params.urlencode()
     context['all_time_query_string'] = all_time_query
@@ -747,109 +659,179 @@ def reports(request):
     query_params = request.GET.copy()
     query_params.pop('export', None)
     query_params.pop('download', None)
+    query_params.pop('cursor', None)
     export_query = query_params.urlencode()
+    context['first_page_query_string'] = export_query
+    if next_cursor:
+        next_page_params = query_params.copy()
+        next_page_params['cursor'] = next_cursor
+        context['next_page_query_string'] = next_page_params.urlencode()
     export_pdf_base_query = f"{export_query}&export=pdf" if export_query else "export=pdf"
     context['export_pdf_download_query_string'] = f"{export_pdf_base_query}&download=1"
     context['export_pdf_print_query_string'] = export_pdf_base_query
+    context['export_csv_query_string'] = f"{export_query}&export=csv" if export_query else "export=csv"
+    context['export_xlsx_query_string'] = f"{export_query}&export=xlsx" if export_query else "export=xlsx"
+    context['export_receipts_zip_query_string'] = f"{export_query}&export=receipts_zip" if export_query else "export=receipts_zip"
+    context['export_receipts_pdf_query_string'] = f"{export_query}&export=receipts_pdf" if export_query else "export=receipts_pdf"
 
-    if (request.GET.get('export') or '').lower() == 'pdf':
+    if export_format == 'pdf':
         as_attachment = (request.GET.get('download') or '').lower() in ('1', 'true', 'yes')
-        return _generate_reports_pdf_response(context, as_attachment=as_attachment)
+        # В PDF попадает весь период, а не только текущая страница
+        context['unified_log'] = [
+            _operation_log_event(op)
+            async for op in aiter_operations(transactions_qs, deposits_qs, adjustments_qs)
+        ]
+        return await run_in_render_pool(_generate_reports_pdf_response, context, as_attachment=as_attachment)
 
-    return render(request, 'accounting/reports.html', context)
+    return await arender(request, 'accounting/reports.html', context)
 
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def clients_list(request):
     """
-    Отдельная страница со всеми клиентами и поиском
+    Отдельная страница со списком клиентов: поиск, фильтры, сортировка и постраничный вывод
     """
     query = request.GET.get('q', '').strip()
+    client_type = request.GET.get('client_type', '').strip()
+    if client_type not in dict(Client.CLIENT_TYPE_CHOICES):
+        client_type = ''
+    low_balance = request.GET.get('low_balance') == '1'
+    sort = request.GET.get('sort', DEFAULT_SORT)
+    if sort not in CLIENT_SORTS:
+        sort = DEFAULT_SORT
+
+    clients_qs = filter_clients(Client.objects.all(), query, client_type, low_balance)
+    cursor = decode_client_cursor(sort, (request.GET.get('cursor') or '').strip())
+    clients, next_cursor = clients_page(clients_qs, sort=sort, cursor=cursor)
+    clients_count, clients_count_is_estimate = estimated_count(clients_qs)
 
-    all_clients_qs = Client.objects.all().order_by('full_name')
-    clients_qs = all_clients_qs
-
-    if query:
-        clients_qs = clients_qs.filter(
-            Q(full_name__icontains=query) |
-            Q(phone__icontains=query)
-        )
+    query_params = request.GET.copy()
+    query_params.pop('cursor', None)
+    next_page_query_string = ''
+    if next_cursor:
+        next_page_params = query_params.copy()
+        next_page_params['cursor'] = next_cursor
+        next_page_query_string = next_page_params.urlencode()
 
     context = {
-        'clients': clients_qs,
-        'all_clients': all_clients_qs,
+        'clients': clients,
         'query': query,
+        'client_type': client_type,
+        'low_balance': low_balance,
+        'sort': sort,
+        'sort_choices': [(key, spec.label) for key, spec in CLIENT_SORTS.items()],
+        'client_types': Client.CLIENT_TYPE_CHOICES,
+        'clients_count': clients_count,
+        'clients_count_is_estimate': clients_count_is_estimate,
+        'is_first_page': cursor is None,
+        'first_page_query_string': query_params.urlencode(),
+        'next_page_query_string': next_page_query_string,
     }
     return render(request, 'accounting/clients_list.html', context)
 
+@replica_reads
+@login_required(login_url='/admin/login/')
+@user_passes_test(is_staff_user, login_url='/admin/login/')
+def client_search(request):
+    """
+    JSON-поиск клиентов для подсказок при вводе (dashboard, список клиентов, отчеты)
+    """
+    try:
+        limit = int(request.GET.get('limit') or CLIENT_SEARCH_LIMIT)
+    except ValueError:
+        limit = CLIENT_SEARCH_LIMIT
+    return JsonResponse({'results': search_clients(request.GET.get('q', ''), limit)})
+
+
+@login_required(login_url='/admin/login/')
+@user_passes_test(is_staff_user, login_url='/admin/login/')
+def performance(request):
+    """
+    Время ответа по представлениям за последние REQUEST_TIMING_WINDOW секунд
+    (процентили, SQL, шаблоны, PDF, принтер; см. accounting/request_timing.py)
+    """
+    window = window_seconds()
+    return render(request, 'accounting/performance.html', {
+        'rows': timing_stats.summary(window),
+        'window_minutes': window // 60,
+    })
+
+
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
 def print_receipt(request, transaction_id):
     """
     Печатает чек на физический принтер (если настроен)
     """
-    transaction_record = get_object_or_404(Transaction.objects.select_related('client', 'worker__user'), id=transaction_id)
+    transaction_record = get_object_or_404(Transaction.objects.only('id'), id=transaction_id)
     try:
-        print_receipt_for_session(transaction_record)
-        messages.success(request, gettext("Receipt sent to printer successfully."))
+        enqueue_receipt(PrintJob.KIND_SESSION, transaction_record.id)
+        messages.success(request, gettext("Receipt added to the print queue."))
     except Exception as e:
         messages.error(request, gettext("Failed to print receipt: %(error)s") % {'error': e})
     next_url = request.META.get('HTTP_REFERER') or 'dashboard'
     return redirect(next_url)
 
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
-def view_receipt(request, transaction_id, format='html'):
+async def view_receipt(request, transaction_id, format='html'):
     """
     Просмотр чека в браузере (HTML или PDF)
     """
-    transaction_record = get_object_or_404(
+    transaction_record = await aget_object_or_404(
         Transaction.objects.select_related('client', 'worker__user'), 
         id=transaction_id
     )
     
     if format == 'pdf':
-        return generate_receipt_response(transaction_record, format='pdf', request=request)
+        return await run_in_render_pool(generate_receipt_response, transaction_record, format='pdf', request=request)
     else:
-        return generate_receipt_response(transaction_record, format='html', request=request)
+        return await sync_to_async(generate_receipt_response)(transaction_record, format='html', request=request)
 
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
-def download_receipt_pdf(request, transaction_id):
+async def download_receipt_pdf(request, transaction_id):
     """
     Скачивание чека в формате PDF
     """
-    transaction_record = get_object_or_404(
+    transaction_record = await aget_object_or_404(
         Transaction.objects.select_related('client', 'worker__user'), 
         id=transaction_id
     )
     
-    pdf = generate_pdf_receipt(transaction_record)
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="receipt_{transaction_record.id}.pdf"'
-    return response
+    return await run_in_render_pool(session_receipt_pdf_response, request, transaction_record, as_attachment=True)
 
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
-def view_deposit_receipt(request, deposit_id, format='html'):
+async def view_deposit_receipt(request, deposit_id, format='html'):
     """
-    Просмотр чека пополнения баланса в браузере (HTML)
+    Просмотр чека пополнения баланса в браузере (HTML или PDF)
     """
-    deposit = get_object_or_404(
+    deposit = await aget_object_or_404(
         ClientDeposit.objects.select_related('client'), 
         id=deposit_id
     )
+
+    if format == 'pdf':
+        return await run_in_render_pool(
+            receipt_pdf_response_for, request, receipt_engine.KIND_DEPOSIT, deposit,
+            f'deposit_{deposit.id}.pdf',
+        )
     
     context = {
         'deposit': deposit,
         'date_str': deposit.date_time.strftime('%d.%m.%Y %H:%M:%S'),
     }
     
-    return render(request, 'accounting/deposit_receipt.html', context)
+    return await arender(request, 'accounting/deposit_receipt.html', context)
 
 
 @login_required(login_url='/admin/login/')
@@ -879,39 +861,33 @@ def adjust_client_balance(request, client_id):
         messages.error(request, gettext("Enter amount to remove."))
         return redirect('view_client', client_id=client.id)
 
-    with transaction.atomic():
-        client_locked = Client.objects.select_for_update().get(id=client.id)
-
-        if client_locked.balance < amount_removed:
-            messages.error(request, gettext("Client has insufficient balance for this cancellation."))
-            return redirect('view_client', client_id=client.id)
-
-        client_locked.balance -= amount_removed
-        client_locked.save()
-
-        adjustment = ClientBalanceAdjustment.objects.create(
-            client=client_locked,
-            amount_removed=amount_removed,
-            lessons_removed=0,
-            balance_after=client_locked.balance,
-            lessons_balance_after=client_locked.lessons_balance,
-        )
+    try:
+        adjustment = post_adjustment(client, amount_removed)
+    except InsufficientFunds:
+        messages.error(request, gettext("Client has insufficient balance for this cancellation."))
+        return redirect('view_client', client_id=client.id)
 
     messages.success(request, gettext("Top-up cancellation completed successfully."))
     return redirect(f"{reverse('view_adjustment_receipt', args=[adjustment.id])}?print=1")
 
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
-def view_adjustment_receipt(request, adjustment_id):
+async def view_adjustment_receipt(request, adjustment_id, format='html'):
     """
-    Просмотр чека отмены пополнения.
+    Просмотр чека отмены пополнения (HTML или PDF).
     """
-    adjustment = get_object_or_404(ClientBalanceAdjustment.objects.select_related('client'), id=adjustment_id)
+    adjustment = await aget_object_or_404(ClientBalanceAdjustment.objects.select_related('client'), id=adjustment_id)
+    if format == 'pdf':
+        return await run_in_render_pool(
+            receipt_pdf_response_for, request, receipt_engine.KIND_ADJUSTMENT, adjustment,
+            f'adjustment_{adjustment.id}.pdf',
+        )
     context = {
         'adjustment': adjustment,
     }
-    return render(request, 'accounting/adjustment_receipt.html', context)
+    return await arender(request, 'accounting/adjustment_receipt.html', context)
 
 
 @login_required(login_url='/admin/login/')
@@ -920,10 +896,10 @@ def print_deposit_receipt(request, deposit_id):
     """
     Печатает чек пополнения на физический принтер (если настроен)
     """
-    deposit = get_object_or_404(ClientDeposit.objects.select_related('client'), id=deposit_id)
+    deposit = get_object_or_404(ClientDeposit.objects.only('id'), id=deposit_id)
     try:
-        print_receipt_for_deposit(deposit)
-        messages.success(request, gettext("Receipt sent to printer successfully."))
+        enqueue_receipt(PrintJob.KIND_DEPOSIT, deposit.id)
+        messages.success(request, gettext("Receipt added to the print queue."))
     except Exception as e:
         messages.error(request, gettext("Failed to print receipt: %(error)s") % {'error': e})
     next_url = request.META.get('HTTP_REFERER') or 'dashboard'
@@ -955,7 +931,7 @@ def create_client(request):
                 })
 
             # Проверяем, нет ли уже клиента с таким именем
-            if Client.objects.filter(full_name=full_name).exists():
+            if client_name_taken(full_name):
                 messages.error(request, gettext("Error: A client with this name already exists."))
                 return render(request, 'accounting/create_client.html', {
                     'client_types': Client.CLIENT_TYPE_CHOICES,
@@ -993,17 +969,20 @@ def create_client(request):
                     })
 
             # Создаем нового клиента
-            new_client = Client.objects.create(
-                full_name=full_name,
-                date_of_birth=date_of_birth,
-                address=address,
-                phone=phone,
-                referral_source=referral_source,
-                client_type=client_type,
-                balance=initial_balance,
-                default_session_amount=default_session_amount,
-                lessons_balance=0
-            )
+            with transaction.atomic():
+                new_client = Client.objects.create(
+                    full_name=full_name,
+                    date_of_birth=date_of_birth,
+                    address=address,
+                    phone=phone,
+                    referral_source=referral_source,
+                    client_type=client_type,
+                    balance=initial_balance,
+                    default_session_amount=default_session_amount,
+                    lessons_balance=0
+                )
+                # Локальная база настольной версии: клиент уйдет в центральную БД вместе с операциями
+                queue_client_sync(new_client)
 
             messages.success(request, gettext("Client %(client_name)s created successfully.") % {
                 'client_name': new_client.full_name
@@ -1022,46 +1001,38 @@ def create_client(request):
         })
 
 
+@replica_reads
 @login_required(login_url='/admin/login/')
 @user_passes_test(is_staff_user, login_url='/admin/login/')
-def view_client(request, client_id):
+async def view_client(request, client_id):
     """
     Просмотр информации о клиенте
     """
     # Проверяем наличие новых полей перед загрузкой
-    if _has_new_client_fields():
-        client = get_object_or_404(
-            Client.objects.prefetch_related('transactions_as_client', 'deposits', 'balance_adjustments'),
-            id=client_id
-        )
+    if await sync_to_async(has_new_client_fields)():
+        client = await aget_object_or_404(Client, id=client_id)
     else:
         # Если новые поля не существуют, показываем сообщение
         messages.error(request, gettext("Database migration required. Please run: python manage.py migrate"))
         return redirect('dashboard')
     
-    # Получаем последние транзакции и пополнения
-    recent_transactions = client.transactions_as_client.select_related('worker__user').order_by('-date_time')[:10]
-    recent_deposits = client.deposits.order_by('-date_time')[:10]
-    recent_adjustments = client.balance_adjustments.order_by('-date_time')[:10]
-    
-    # Вычисляем статистику
-    total_spent = client.transactions_as_client.aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_deposited = client.deposits.aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
-    total_adjusted = client.balance_adjustments.aggregate(Sum('amount_removed'))['amount_removed__sum'] or Decimal('0.00')
-    total_sessions = client.transactions_as_client.count()
+    # Последние операции каждого типа - одним запросом
+    history = await OperationsFeed(request).alatest_by_kind(client.id, limit=CLIENT_HISTORY_SIZE)
     
+    # Статистика - из итогов клиента (accounting/ledger.py), без агрегатов по всем операциям
     context = {
         'client': client,
-        'recent_transactions': recent_transactions,
-        'recent_deposits': recent_deposits,
-        'recent_adjustments': recent_adjustments,
-        'total_spent': total_spent,
-        'total_deposited': total_deposited,
-        'total_adjusted': total_adjusted,
-        'total_sessions': total_sessions,
+        'recent_transactions': history[KIND_TRANSACTION],
+        'recent_deposits': history[KIND_DEPOSIT],
+        'recent_adjustments': history[KIND_ADJUSTMENT],
+        'total_spent': client.total_spent,
+        'total_deposited': client.total_deposited,
+        'total_adjusted': client.total_adjusted,
+        'total_sessions': client.total_sessions,
+        'last_visit_at': client.last_visit_at,
     }
     
-    return render(request, 'accounting/view_client.html', context)
+    return await arender(request, 'accounting/view_client.html', context)
 
 
 @login_required(login_url='/admin/login/')
@@ -1091,7 +1062,7 @@ def edit_client(request, client_id):
                 })
 
             # Проверяем уникальность имени (кроме текущего клиента)
-            if Client.objects.filter(full_name=full_name).exclude(id=client.id).exists():
+            if client_name_taken(full_name, exclude_id=client.id):
                 messages.error(request, gettext("Error: A client with this name already exists."))
                 return render(request, 'accounting/edit_client.html', {
                     'client_types': Client.CLIENT_TYPE_CHOICES,
@@ -1141,7 +1112,11 @@ def edit_client(request, client_id):
             else:
                 client.default_session_amount = None
 
-            client.save()
+            # Только поля формы: баланс мог измениться параллельной операцией
+            client.save(update_fields=[
+                'full_name', 'date_of_birth', 'address', 'phone', 'referral_source',
+                'client_type', 'default_session_amount', 'updated_at',
+            ])
 
             messages.success(request, gettext("Client %(client_name)s updated successfully.") % {
                 'client_name': client.full_name
@@ -1173,8 +1148,12 @@ def delete_client(request, client_id):
     if request.method != 'POST':
         return redirect('view_client', client_id=client.id)
 
-    # Не даём удалить клиента, если есть операции
-    if client.transactions_as_client.exists() or client.deposits.exists():
+    # Не даём удалить клиента, если есть операции (модели операций защищены PROTECT)
+    if (
+        client.transactions_as_client.exists()
+        or client.deposits.exists()
+        or client.balance_adjustments.exists()
+    ):
         messages.error(request, gettext("Error: Cannot delete client with existing sessions or deposits."))
         return redirect('view_client', client_id=client.id)
 
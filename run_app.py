@@ -1,29 +1,139 @@
+import time
+
+# Время запуска процесса - для замера времени старта (до импорта Django)
+STARTED_AT = time.perf_counter()
+
+import argparse
+import multiprocessing
 import os
 import sys
 import threading
 import webbrowser
-from time import sleep
+from urllib.error import URLError
+from urllib.request import urlopen
 
 import django
+from django.conf import settings
 from django.core.management import execute_from_command_line
 
 # Указываем настройки Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject1.settings')
+# Настольная версия: статика через WhiteNoise из папок приложений (см. settings)
+os.environ.setdefault('FLEKS_DESKTOP', '1')
 django.setup()
 
-def run_server():
-    # Запускаем dev-сервер на 127.0.0.1:8000 без авто-перезапуска (reloader),
-    # иначе Django пытается работать с сигналами не из главного потока.
-    execute_from_command_line([sys.argv[0], 'runserver', '127.0.0.1:8000', '--noreload'])
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+# Потоков обработки запросов: печать чека или отчет не задерживают остальные страницы
+SERVER_THREADS = 8
+# Сколько ждать ответа проверки готовности и как часто ее опрашивать
+READY_TIMEOUT = 60
+READY_POLL_INTERVAL = 0.05
+
+
+def make_server(host, port, threads):
+    """
+    Многопоточный WSGI-сервер для приложения Django (статика - через WhiteNoise
+    в middleware). waitress, если установлен; иначе сервер стандартной
+    библиотеки с потоком на запрос. Возвращает функцию, обслуживающую запросы
+    до завершения процесса.
+    """
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    try:
+        from waitress.server import create_server
+    except ImportError:
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server as make_wsgiref_server
+
+        class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        return make_wsgiref_server(host, port, application, ThreadingWSGIServer, QuietHandler).serve_forever
+
+    return create_server(application, host=host, port=port, threads=threads, ident='FleksControlPanel').run
+
+
+def wait_until_ready(url, timeout=READY_TIMEOUT):
+    """Ждет ответа 200 от проверки готовности. Возвращает True, если дождались"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (URLError, OSError):
+            # Сервер еще не слушает порт или БД пока недоступна (503)
+            pass
+        time.sleep(READY_POLL_INTERVAL)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleks Control Panel")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS, help="Потоков обработки запросов")
+    parser.add_argument('--no-browser', action='store_true', help="Не открывать браузер")
+    parser.add_argument(
+        '--measure-startup', action='store_true',
+        help="Вывести время запуска и завершить работу, как только сервер будет готов",
+    )
+    args = parser.parse_args()
+
+    base_url = f'http://{HOST}:{args.port}'
+    ready_url = f'{base_url}/ready/'
+    timings = [('загрузка Django', time.perf_counter() - STARTED_AT)]
+
+    # Локальная база (FLEKS_LOCAL_DB): создаем/обновляем ее схему и отправляем
+    # накопленные без связи операции в центральную БД
+    if settings.FLEKS_LOCAL_DB:
+        from accounting.sync import wake_worker
+        execute_from_command_line([sys.argv[0], 'migrate', '--noinput', '--verbosity', '0'])
+        wake_worker()
+        timings.append(('миграции локальной базы', time.perf_counter() - STARTED_AT))
+
+    try:
+        run = make_server(HOST, args.port, args.threads)
+    except OSError as e:
+        # Порт занят: возможно, приложение уже запущено - тогда просто открываем его
+        if wait_until_ready(ready_url, timeout=2):
+            print(f"Приложение уже запущено: {base_url}")
+            if not args.no_browser and not args.measure_startup:
+                webbrowser.open(f'{base_url}/dashboard/')
+            return
+        print(f"Не удалось запустить сервер на {base_url}: {e}")
+        sys.exit(1)
 
-if __name__ == '__main__':
     # Стартуем сервер в отдельном потоке
-    t = threading.Thread(target=run_server, daemon=True)
+    t = threading.Thread(target=run, name='http-server', daemon=True)
     t.start()
 
-    # Немного ждём, чтобы сервер поднялся, и открываем браузер
-    sleep(2)
-    webbrowser.open('http://127.0.0.1:8000/dashboard/')
+    # Браузер открывается, как только приложение ответит на проверку готовности
+    if not wait_until_ready(ready_url):
+        print(f"Сервер не ответил за {READY_TIMEOUT} с: {ready_url}")
+    timings.append(('сервер готов', time.perf_counter() - STARTED_AT))
+    print("Время запуска: " + ", ".join(f"{label} {seconds:.2f} с" for label, seconds in timings))
+
+    if args.measure_startup:
+        return
+    if not args.no_browser:
+        webbrowser.open(f'{base_url}/dashboard/')
+    if not getattr(settings, 'PDF_PRELOAD', True):
+        # ReportLab и шрифты нужны только для чеков и отчетов: грузим их в фоне,
+        # пока открывается главная страница
+        from accounting.receipt_engine import preload_pdf
+        threading.Thread(target=preload_pdf, name='pdf-preload', daemon=True).start()
 
     # Чтобы окно не закрывалось сразу (если запуск через двойной клик)
-    t.join()
\ No newline at end of file
+    t.join()
+
+
+if __name__ == '__main__':
+    # Собранное приложение (PyInstaller): дочерние процессы архива чеков запускаются через spawn
+    multiprocessing.freeze_support()
+    main()